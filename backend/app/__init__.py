@@ -1,38 +1,161 @@
 from flask import Flask
 import os
+from app.utils.startup import run_startup_tasks, start_startup_tasks, startup
+from app.config import Config
 from app.extensions import db, migrate, socketio
-from app.services.sync_manager import SyncManager
+from app.services.sync_manager import HttpPushTransport, SyncManager
+from app.services.admission import AdmissionController, init_admission_control
 from app.services.conflict_resolver import ConflictResolver
+from app.services.idempotency import IdempotencyIndex
+from app.services.merge import MergeEngine
+from app.services.flow_control import FlushController
+from app.services.group_commit import GroupCommitWriter
+from app.services.device_registry import create_device_registry
+from app.services.event_log import EventLogStore
+from app.services.event_partitions import EventPartitions, events_cli
+from app.services.event_trace import EventTracer
+from app.services.invoice_import import invoices_cli
+from app.services.event_watermark import create_event_watermark, install_watermark_listeners
+from app.services.message_bus import create_message_bus
+from app.services.reporting_db import ReportingDatabase, enable_wal
+from app.services.status_cache import StatusCache, install_status_cache_listeners
+from app.services.sync_metrics import init_metrics
+from app.utils.db_offload import BlockingPool, OffloadedWSGI
+from app.utils.event_encoding import SocketIOJSON
+from app.utils.sql_profiler import init_sql_profiler
 from app.routes.socketio_events import register_socketio_events
 
-def create_app():
+startup.mark('app_imported')
+
+def create_app(config_overrides=None):
     """
     Flask application factory.
     Sets up Flask, SQLAlchemy, Flask-Migrate, and registers blueprints.
+    config_overrides (dict, optional) replaces default settings, e.g. to point tests at an isolated database.
     """
-    app = Flask(__name__)
-    basedir = os.path.abspath(os.path.dirname(__file__))
-    # Use instance/app.db as the database file
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, '../instance/app.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-    db.init_app(app)
-    migrate.init_app(app, db)
-    socketio.init_app(app)
-
-    # Import models so Flask-Migrate can detect them
-    from app.models import sync_event
-    from app.models import sync_audit_log
-
-    # Register blueprints (add more as needed)
-    from app.routes.sync_routes import sync_bp
-    app.register_blueprint(sync_bp)
-
-    # Register SocketIO event handlers
-    register_socketio_events(socketio)
-
-    # Initialize core services (can be injected as needed)
-    app.sync_manager = SyncManager()
-    app.conflict_resolver = ConflictResolver()
+    with startup.phase('config'):
+        app = Flask(__name__)
+        basedir = os.path.abspath(os.path.dirname(__file__))
+        # Use instance/app.db as the database file
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, '../instance/app.db')
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config.from_object(Config)
+        if config_overrides:
+            app.config.update(config_overrides)
+
+    with startup.phase('extensions'):
+        db.init_app(app)
+        migrate.init_app(app, db)
+        app.db_offload = BlockingPool(app.config['SOCKETIO_ASYNC_MODE'], app.config['DB_OFFLOAD_THREADS'])
+        if app.db_offload.cooperative:
+            # REST handlers run on the blocking pool; Socket.IO's middleware (added next) stays on greenlets
+            app.wsgi_app = OffloadedWSGI(app.wsgi_app, app.db_offload)
+        # With a message bus, emits from any worker process reach devices connected to the others
+        # SocketIOJSON sends pre-encoded events as-is and uses orjson (when installed) for the rest
+        socketio.init_app(app, async_mode=app.config['SOCKETIO_ASYNC_MODE'], json=SocketIOJSON,
+                          client_manager=create_message_bus(app.config['MESSAGE_BUS_URL']))
+
+    with startup.phase('routes'):
+        # Import models so Flask-Migrate can detect them
+        from app.models import sync_event
+        from app.models import sync_audit_log
+
+        # Register blueprints (add more as needed)
+        from app.routes.sync_routes import sync_bp
+        from app.routes.export_routes import export_bp
+        from app.routes.audit_routes import audit_bp
+        from app.routes.metrics_routes import metrics_bp
+        app.register_blueprint(sync_bp)
+        app.register_blueprint(export_bp)
+        app.register_blueprint(audit_bp)
+        app.register_blueprint(metrics_bp)
+
+        # Register SocketIO event handlers
+        register_socketio_events(socketio)
+
+        @app.before_request
+        def mark_first_request():
+            startup.mark('first_request')
+
+    with startup.phase('services'):
+        # Initialize core services (can be injected as needed)
+        app.sync_manager = SyncManager(
+            app.config['OFFLINE_QUEUE_DIR'] or os.path.join(app.instance_path, 'offline_queue'),
+            HttpPushTransport(app.config['SYNC_MASTER_URL']) if app.config['SYNC_MASTER_URL'] else None,
+            app.config['OFFLINE_QUEUE_MEMORY_BYTES'], app.config['OFFLINE_QUEUE_MEMORY_EVENTS'],
+            app.config['OFFLINE_QUEUE_SEGMENT_BYTES'], app.config['OFFLINE_QUEUE_FSYNC'])
+        app.conflict_resolver = ConflictResolver()
+        # Cooperative modes merge inline: forking worker processes from a monkey-patched server is unsafe
+        app.merge_engine = MergeEngine(0 if app.db_offload.cooperative else app.config['MERGE_WORKERS'],
+                                       app.config['MERGE_PARALLEL_THRESHOLD'])
+        app.event_tracer = None
+        if app.config['EVENT_TRACE_SAMPLE_RATE'] > 0:
+            app.event_tracer = EventTracer(app.config['EVENT_TRACE_SAMPLE_RATE'], app.config['EVENT_TRACE_CAPACITY'])
+        app.event_partitions = EventPartitions(
+            app.config['EVENT_PARTITIONING'], app.config['EVENT_PARTITION_DAYS'],
+            app.config['EVENT_HOT_DAYS'], app.config['EVENT_RETENTION_DAYS'])
+        app.idempotency_index = IdempotencyIndex(
+            app.config['IDEMPOTENCY_BLOOM_CAPACITY'], app.config['IDEMPOTENCY_BLOOM_ERROR_RATE'],
+            partitions=app.event_partitions)
+        app.device_registry = create_device_registry(app.config['MESSAGE_BUS_URL'], app.config['MESSAGE_BUS_HEARTBEAT_SECONDS'])
+        app.push_writer = None
+        if app.config['PUSH_GROUP_COMMIT'] and not app.db_offload.cooperative:
+            app.push_writer = GroupCommitWriter(app, app.config['PUSH_GROUP_COMMIT_MAX_BATCH'])
+        max_waiters = app.config['PULL_LONG_POLL_MAX_WAITERS']
+        if app.db_offload.cooperative:
+            max_waiters = min(max_waiters, max(1, app.config['DB_OFFLOAD_THREADS'] // 2))
+        app.event_watermark = create_event_watermark(app.config['MESSAGE_BUS_URL'], max_waiters)
+        install_watermark_listeners()
+        app.event_log = None
+        if app.config['EVENT_LOG'] and not app.config['MESSAGE_BUS_URL']:
+            # The log's files are written by one process; worker processes would each need their own copy
+            app.event_log = EventLogStore(
+                app.config['EVENT_LOG_DIR'] or os.path.join(app.instance_path, 'event_log'),
+                app.config['EVENT_LOG_SEGMENT_BYTES'], app.config['EVENT_LOG_SEGMENT_EVENTS'],
+                app.config['EVENT_LOG_FSYNC'], app.config['EVENT_LOG_CHECKPOINT_SECONDS'])
+        app.cli.add_command(events_cli)
+        app.cli.add_command(invoices_cli)
+        app.flush_controller = FlushController(
+            app.config['FLUSH_GLOBAL_CREDITS'], app.config['FLUSH_MAX_WINDOW'], app.config['FLUSH_MIN_WINDOW'])
+        app.admission = None
+        if app.config['ADMISSION_CONTROL']:
+            app.admission = AdmissionController(
+                app.config['ADMISSION_GLOBAL_RATE'], app.config['ADMISSION_GLOBAL_BURST'],
+                app.config['ADMISSION_DEVICE_RATE'], app.config['ADMISSION_DEVICE_BURST'],
+                app.config['ADMISSION_BULK_RESERVE'], app.config['ADMISSION_MIN_RETRY'],
+                app.config['ADMISSION_RETRY_JITTER'])
+        init_admission_control(app)
+        app.reporting_db = ReportingDatabase(
+            app.config['SQLALCHEMY_DATABASE_URI'], app.config['REPORTING_DB_MODE'],
+            app.config['REPORTING_DB_POOL_SIZE'], app.config['REPORTING_REPLICA_PATH'],
+            app.config['REPORTING_REPLICA_MAX_AGE'])
+        app.status_cache = None
+        if app.config['STATUS_CACHE_SIZE'] and app.reporting_db.mode != 'replica':
+            # Other worker processes' commits only show up in the shared watermark
+            app.status_cache = StatusCache(
+                app.config['STATUS_CACHE_SIZE'], app.config['STATUS_CACHE_TTL'],
+                app.event_watermark if app.config['MESSAGE_BUS_URL'] else None)
+        install_status_cache_listeners()
+        with app.app_context():
+            engines = [db.engine]
+            if app.reporting_db.isolated:
+                # WAL: reporting readers work on snapshots and never block sync writers
+                enable_wal(db.engine)
+                engines.append(app.reporting_db.engine)
+            init_metrics(app)
+            init_sql_profiler(app, *engines)
+
+    # Work not needed to accept connections: run.py starts it once the server is listening, any
+    # other server on its first request or Socket.IO connection (see handle_connect).
+    # The idempotency index also rebuilds itself lazily on first use if this has not run yet.
+    app.startup_tasks = [('idempotency_rebuild', app.idempotency_index.rebuild)]
+    if app.event_partitions.enabled:
+        app.startup_tasks.append(('event_partitions', app.event_partitions.maintain))
+    if not app.config['DEFER_STARTUP_TASKS']:
+        run_startup_tasks(app)
+    else:
+        @app.before_request
+        def start_deferred_startup_tasks():
+            start_startup_tasks(app, socketio.start_background_task)
 
     return app
@@ -0,0 +1,141 @@
+"""
+Default configuration values for the backend.
+Loaded by create_app(); individual values can be overridden per app instance.
+"""
+
+import os
+
+class Config:
+    # Number of rows fetched from the database per round trip when streaming exports
+    EXPORT_BATCH_SIZE = 1000
+
+    # Page size bounds for the keyset-paginated audit log query API
+    AUDIT_QUERY_DEFAULT_LIMIT = 50
+    AUDIT_QUERY_MAX_LIMIT = 500
+
+    # Bloom filter sizing for the idempotency key index (rebuilt from sync_events at startup)
+    IDEMPOTENCY_BLOOM_CAPACITY = 100000
+    IDEMPOTENCY_BLOOM_ERROR_RATE = 0.01
+
+    # Credit-based offline queue flush over Socket.IO: events buffered across all flushing devices
+    # are capped at FLUSH_GLOBAL_CREDITS; each device's window is a fair share within these bounds
+    FLUSH_GLOBAL_CREDITS = 2000
+    FLUSH_MAX_WINDOW = 200
+    FLUSH_MIN_WINDOW = 10
+
+    # Admission control for the sync routes and Socket.IO handlers (ADMISSION_CONTROL=1), e.g. to ride out
+    # every till reconnecting after a router restart. Each device may make ADMISSION_DEVICE_RATE requests
+    # per second (bursts up to ADMISSION_DEVICE_BURST) and the server admits ADMISSION_GLOBAL_RATE per second
+    # (burst ADMISSION_GLOBAL_BURST). Bulk traffic (offline queue flushes, reports) is refused while less than
+    # ADMISSION_BULK_RESERVE of the global burst is left, keeping it for interactive POS traffic. Refusals
+    # (429/503, or an 'overloaded' Socket.IO event) say when to retry: at least ADMISSION_MIN_RETRY seconds,
+    # stretched by up to ADMISSION_RETRY_JITTER so refused tills do not return in lockstep
+    ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL') == '1'
+    ADMISSION_GLOBAL_RATE = 500
+    ADMISSION_GLOBAL_BURST = 1000
+    ADMISSION_DEVICE_RATE = 10
+    ADMISSION_DEVICE_BURST = 30
+    ADMISSION_BULK_RESERVE = 0.25
+    ADMISSION_MIN_RETRY = 1.0
+    ADMISSION_RETRY_JITTER = 0.5
+
+    # Per-request SQL profiling (off by default; enable with SQL_PROFILING=1 while investigating)
+    SQL_PROFILING = os.environ.get('SQL_PROFILING') == '1'
+    SQL_SLOW_QUERY_MS = 50
+    SQL_REPEAT_THRESHOLD = 5     # same statement this many times in one request is flagged as a possible N+1
+    SQL_PROFILE_HEADER = 'X-SQL-Profile'
+
+    # Socket.IO server mode: 'threading' (default), or 'gevent'/'eventlet' for thousands of idle
+    # device connections (the server must be started through run.py so monkey patching happens first)
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+    # OS threads available to blocking database work in cooperative modes
+    DB_OFFLOAD_THREADS = 8
+
+    # Local message bus shared by several server worker processes, e.g. sqlite:////var/run/pos/bus.db.
+    # Unset runs a single process with in-memory Socket.IO rooms and device registry
+    MESSAGE_BUS_URL = os.environ.get('MESSAGE_BUS_URL')
+    # Workers record a heartbeat in the bus this often; devices of a worker silent for 3 intervals are dropped
+    MESSAGE_BUS_HEARTBEAT_SECONDS = 10.0
+
+    # Run non-critical startup work (e.g. rebuilding the idempotency Bloom filter) in the background
+    # after the server starts listening (run.py) or on the first request, instead of inside create_app()
+    DEFER_STARTUP_TASKS = True
+
+    # /sync/pull?wait=N long-polling: longest hold, and how many requests may be held at once
+    # (in cooperative modes held requests occupy DB offload threads, so at most half of those are used)
+    PULL_LONG_POLL_MAX_SECONDS = 60
+    PULL_LONG_POLL_MAX_WAITERS = 64
+
+    # /sync/pull compression (zstd or gzip, negotiated via Accept-Encoding) and NDJSON streaming
+    PULL_COMPRESS_MIN_BYTES = 1024   # smaller JSON bodies are sent uncompressed
+    PULL_STREAM_BATCH_SIZE = 500     # rows read (and written) per batch by format=ndjson
+
+    # Time-partitioned sync_events history. When enabled, `flask events maintain` (cron) and the
+    # deferred startup tasks move non-pending events older than EVENT_HOT_DAYS into per-day (1) or
+    # per-week (7) partition tables, and drop whole partitions older than EVENT_RETENTION_DAYS
+    EVENT_PARTITIONING = os.environ.get('EVENT_PARTITIONING') == '1'
+    EVENT_PARTITION_DAYS = 7
+    EVENT_HOT_DAYS = 7
+    EVENT_RETENTION_DAYS = None  # keep all history
+
+    # Read-only connections for /sync/status, /sync/export/* and /sync/audit, kept apart from sync writers.
+    # 'snapshot' reads the live database through WAL snapshots; 'replica' reads a copy made with the
+    # SQLite backup API once it is REPORTING_REPLICA_MAX_AGE seconds old; 'primary' shares the app session
+    REPORTING_DB_MODE = os.environ.get('REPORTING_DB_MODE', 'snapshot')
+    REPORTING_DB_POOL_SIZE = 4
+    REPORTING_REPLICA_PATH = None   # default: <database file>.replica
+    REPORTING_REPLICA_MAX_AGE = 30
+
+    # In-memory cache of /sync/status responses keyed by (device_id, user_id, limit): at most STATUS_CACHE_SIZE
+    # entries (0 disables it), each kept up to STATUS_CACHE_TTL seconds. Commits that insert or change SyncEvents
+    # drop the entries of their devices and users. Not used with REPORTING_DB_MODE=replica, whose reads lag writes
+    STATUS_CACHE_SIZE = 1024
+    STATUS_CACHE_TTL = 30
+
+    # End-to-end latency tracing of a sample of sync events (push, persist, broadcast, first ack);
+    # percentiles at /sync/trace/stats. 0 turns tracing off; EVENT_TRACE_CAPACITY traces are kept
+    EVENT_TRACE_SAMPLE_RATE = float(os.environ.get('EVENT_TRACE_SAMPLE_RATE', '0.01'))
+    EVENT_TRACE_CAPACITY = 4096
+
+    # Supplier invoice imports (POST /sync/import/invoices, `flask invoices import`): lines are grouped
+    # into invoice_batch events of up to INVOICE_IMPORT_BATCH_LINES lines, and every
+    # INVOICE_IMPORT_TRANSACTION_BATCHES events are stored in one transaction
+    INVOICE_IMPORT_BATCH_LINES = 500
+    INVOICE_IMPORT_TRANSACTION_BATCHES = 10
+
+    # Field-level three-way merges (POST /sync/merge, ConflictResolver.merge): batches of at least
+    # MERGE_PARALLEL_THRESHOLD records run on MERGE_WORKERS processes (None: one per CPU; 0: inline).
+    # MERGE_ADDITIVE_FIELDS are counters whose concurrent changes are both applied instead of conflicting
+    MERGE_WORKERS = int(os.environ.get('MERGE_WORKERS', '2'))
+    MERGE_PARALLEL_THRESHOLD = 500
+    MERGE_ADDITIVE_FIELDS = ('new_stock',)
+
+    # Group commit for /sync/push: one writer thread inserts every push queued since its last commit
+    # (up to PUSH_GROUP_COMMIT_MAX_BATCH) in a single transaction; each request is answered after the
+    # commit that holds its event. Used in threading mode (cooperative modes commit per request)
+    PUSH_GROUP_COMMIT = os.environ.get('PUSH_GROUP_COMMIT', '1') == '1'
+    PUSH_GROUP_COMMIT_MAX_BATCH = 256
+    PUSH_GROUP_COMMIT_TIMEOUT = 30   # seconds a request waits for its commit (twice once the writer has taken it)
+
+    # Durable offline queue on a device (SyncManager.queue_event). Every event is written to memory-mapped
+    # segment files under OFFLINE_QUEUE_DIR (default: <instance>/offline_queue); only the front of the
+    # queue, up to the memory budget, is also held in memory. perform_periodic_sync drains it in order
+    # to SYNC_MASTER_URL
+    OFFLINE_QUEUE_DIR = os.environ.get('OFFLINE_QUEUE_DIR')
+    OFFLINE_QUEUE_MEMORY_BYTES = 2 * 1024 * 1024
+    OFFLINE_QUEUE_MEMORY_EVENTS = 4096
+    OFFLINE_QUEUE_SEGMENT_BYTES = 4 * 1024 * 1024
+    OFFLINE_QUEUE_FSYNC = True    # msync every append (False: survives process crashes, not power loss)
+    SYNC_MASTER_URL = os.environ.get('SYNC_MASTER_URL')
+
+    # Optional append-only event log for the master's sync pipeline (EVENT_LOG=1): committed events are
+    # copied into memory-mapped segment files under EVENT_LOG_DIR (default: <instance>/event_log), and
+    # /sync/pull and the periodic/immediate broadcasts read pending events and record status changes
+    # there. Status changes reach sync_events every EVENT_LOG_CHECKPOINT_SECONDS. Single-process only:
+    # ignored when MESSAGE_BUS_URL runs several workers
+    EVENT_LOG = os.environ.get('EVENT_LOG') == '1'
+    EVENT_LOG_DIR = os.environ.get('EVENT_LOG_DIR')
+    EVENT_LOG_SEGMENT_BYTES = 64 * 1024 * 1024
+    EVENT_LOG_SEGMENT_EVENTS = 65536
+    EVENT_LOG_FSYNC = True    # one msync per appended batch / status change
+    EVENT_LOG_CHECKPOINT_SECONDS = 5
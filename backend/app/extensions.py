@@ -1,7 +1,45 @@
+from flask import current_app
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_socketio import SocketIO
 
+
+class LazyMigrate:
+    """
+    Flask-Migrate imports alembic, which only the `flask db` commands need and which is a large
+    share of server import time. The `db` command group is registered up front; the real
+    extension is set up the first time one of its commands is looked up.
+    """
+
+    def __init__(self, directory='migrations'):
+        self.directory = directory
+        self.db = None
+
+    def init_app(self, app, db):
+        self.db = db
+        app.cli.add_command(_LazyCommandGroup(self.load, name='db', help='Perform database migrations.'))
+
+    def load(self):
+        """Initialize Flask-Migrate on the current app and return its `db` command group."""
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli_group
+        app = current_app._get_current_object()
+        if 'migrate' not in app.extensions:
+            Migrate(app, self.db, directory=self.directory)
+        return db_cli_group
+
+
+class _LazyCommandGroup(AppGroup):
+    """CLI group placeholder; invoking it parses and runs the group returned by loader()."""
+
+    def __init__(self, loader, **kwargs):
+        super().__init__(**kwargs)
+        self._loader = loader
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self._loader().make_context(info_name, args, parent=parent, **extra)
+
+
 db = SQLAlchemy()
-migrate = Migrate()
-socketio = SocketIO() 
\ No newline at end of file
+migrate = LazyMigrate()
+socketio = SocketIO()
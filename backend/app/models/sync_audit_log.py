@@ -16,5 +16,13 @@ class SyncAuditLog(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
     details = db.Column(db.Text, nullable=True)       # JSON or string with extra info
 
+    # Composite indexes matching the audit query filters; each ends in (timestamp, id)
+    # so keyset pagination walks the index in order without a table scan or sort.
+    __table_args__ = (
+        db.Index('ix_sync_audit_logs_device_ts', 'device_id', 'timestamp', 'id'),
+        db.Index('ix_sync_audit_logs_user_ts', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_sync_audit_logs_op_status_ts', 'operation', 'status', 'timestamp', 'id'),
+    )
+
     def __repr__(self):
         return f"<SyncAuditLog(id={self.id}, op={self.operation}, status={self.status}, device={self.device_id})>" 
\ No newline at end of file
@@ -17,10 +17,12 @@ class SyncEvent(db.Model):
     status = db.Column(db.String, default='pending', index=True)  # 'pending', 'synced', 'failed', etc.
     device_id = db.Column(db.String, nullable=False, index=True)  # Originating device
     user_id = db.Column(db.String, nullable=True, index=True)     # Originating user (if applicable)
+    idempotency_key = db.Column(db.String, nullable=True)         # Client-supplied key used to drop retried pushes
 
     # Optional: Add an index for faster queries by device and status
     __table_args__ = (
         db.Index('ix_sync_events_device_status', 'device_id', 'status'),
+        db.Index('ux_sync_events_idempotency_key', 'idempotency_key', unique=True),
     )
 
     def __repr__(self):
@@ -0,0 +1,101 @@
+"""
+Audit log query API for support staff.
+Filters on device, user, operation, status and time range, paginated by keyset (timestamp, id)
+so each page is an index range scan regardless of how deep into the history it is.
+"""
+
+import base64
+import datetime
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import or_, select, tuple_
+from app.models.sync_audit_log import SyncAuditLog
+from app.utils.export_helpers import parse_iso_param
+
+audit_bp = Blueprint('audit', __name__)
+
+
+def encode_cursor(timestamp, log_id):
+    """Encode the (timestamp, id) keyset position of the last row on a page as an opaque cursor."""
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, log_id = raw.rsplit('|', 1)
+        return (datetime.datetime.fromisoformat(timestamp) if timestamp else None), int(log_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def serialize_audit_log(log):
+    return {
+        'id': log.id,
+        'event_type': log.event_type,
+        'operation': log.operation,
+        'status': log.status,
+        'device_id': log.device_id,
+        'user_id': log.user_id,
+        'timestamp': log.timestamp.isoformat() if log.timestamp else None,
+        'details': log.details
+    }
+
+
+@audit_bp.route('/sync/audit', methods=['GET'])
+def query_audit_logs():
+    """Query the audit trail, newest first, with keyset pagination."""
+    try:
+        limit = int(request.args.get('limit', current_app.config['AUDIT_QUERY_DEFAULT_LIMIT']))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit parameter'}), 400
+    limit = max(1, min(limit, current_app.config['AUDIT_QUERY_MAX_LIMIT']))
+
+    try:
+        since = parse_iso_param(request.args.get('since'))
+        until = parse_iso_param(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until timestamp format. Use ISO format.'}), 400
+
+    statement = select(SyncAuditLog)
+    for column in ('device_id', 'user_id', 'operation', 'status', 'event_type'):
+        value = request.args.get(column)
+        if value:
+            statement = statement.where(getattr(SyncAuditLog, column) == value)
+    if since:
+        statement = statement.where(SyncAuditLog.timestamp >= since)
+    if until:
+        statement = statement.where(SyncAuditLog.timestamp < until)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_ts, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor parameter'}), 400
+        # Rows without a timestamp sort after all others (SQLite orders NULLs last when descending)
+        if cursor_ts is None:
+            statement = statement.where(SyncAuditLog.timestamp.is_(None), SyncAuditLog.id < cursor_id)
+        else:
+            # Row-value comparison lets SQLite seek straight to the cursor position in the composite index
+            statement = statement.where(or_(
+                tuple_(SyncAuditLog.timestamp, SyncAuditLog.id) < tuple_(cursor_ts, cursor_id),
+                SyncAuditLog.timestamp.is_(None)))
+
+    # Fetch one extra row to know whether another page exists
+    statement = statement.order_by(SyncAuditLog.timestamp.desc(), SyncAuditLog.id.desc()).limit(limit + 1)
+    # Support queries run on the read-only reporting connections, away from sync writers
+    with current_app.reporting_db.session() as session:
+        logs = session.execute(statement).scalars().all()
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        last = logs[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+
+    return jsonify({
+        'logs': [serialize_audit_log(log) for log in logs],
+        'next_cursor': next_cursor
+    }), 200
@@ -0,0 +1,100 @@
+"""
+Streaming export endpoints for sync event and audit log history.
+Rows are read through a server-side cursor and written to the response as they arrive,
+so memory use stays flat regardless of the size of the exported range.
+"""
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy import select, union_all
+from app.models.sync_event import SyncEvent
+from app.models.sync_audit_log import SyncAuditLog
+from app.utils.export_helpers import EXPORT_FORMATS, iter_csv, iter_gzip, iter_ndjson, iter_query_rows, parse_iso_param
+
+export_bp = Blueprint('export', __name__)
+
+EVENT_EXPORT_COLUMNS = ['id', 'event_type', 'payload', 'timestamp', 'status', 'device_id', 'user_id']
+AUDIT_EXPORT_COLUMNS = ['id', 'event_type', 'operation', 'status', 'device_id', 'user_id', 'timestamp', 'details']
+
+
+def _stream_export(model, columns, filters, basename, sources=None):
+    """
+    Build a streaming Response for the given model/columns/filters using the request's format options.
+    sources(since, until, session) lists the tables to read (default: the model's table); several are combined
+    in id order. Rows are read on the read-only reporting connections.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {export_format}. Use csv or ndjson.'}), 400
+    try:
+        since = parse_iso_param(request.args.get('since'))
+        until = parse_iso_param(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until timestamp format. Use ISO format.'}), 400
+
+    reporting = current_app.reporting_db
+    engine = reporting.bind()
+    tables = [model.__table__]
+    if sources:
+        with reporting.session() as session:
+            tables = sources(since, until, session)
+
+    statements = []
+    for table in tables:
+        statement = select(*[table.c[c] for c in columns])
+        for column, value in filters.items():
+            if value is not None:
+                statement = statement.where(table.c[column] == value)
+        if since:
+            statement = statement.where(table.c.timestamp >= since)
+        if until:
+            statement = statement.where(table.c.timestamp < until)
+        statements.append(statement)
+    if len(statements) == 1:
+        statement = statements[0].order_by(statements[0].selected_columns.id.asc())
+    else:
+        combined = union_all(*statements).subquery()
+        statement = select(*combined.c).order_by(combined.c.id.asc())
+
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+
+    def generate():
+        batches = iter_query_rows(engine, statement, batch_size)
+        encoder = iter_csv if export_format == 'csv' else iter_ndjson
+        return encoder(columns, batches)
+
+    filename = f'{basename}.{export_format}'
+    mimetype = EXPORT_FORMATS[export_format]
+    body = generate()
+    if request.args.get('gzip') in ('1', 'true'):
+        body = iter_gzip(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+@export_bp.route('/sync/export/events', methods=['GET'])
+def export_sync_events():
+    """Stream SyncEvent history as CSV or NDJSON (optionally gzip-compressed)."""
+    filters = {
+        'device_id': request.args.get('device_id'),
+        'user_id': request.args.get('user_id'),
+        'status': request.args.get('status'),
+        'event_type': request.args.get('event_type'),
+    }
+    return _stream_export(SyncEvent, EVENT_EXPORT_COLUMNS, filters, 'sync_events',
+                          sources=current_app.event_partitions.sources)
+
+
+@export_bp.route('/sync/export/audit', methods=['GET'])
+def export_audit_logs():
+    """Stream SyncAuditLog history as CSV or NDJSON (optionally gzip-compressed)."""
+    filters = {
+        'device_id': request.args.get('device_id'),
+        'user_id': request.args.get('user_id'),
+        'operation': request.args.get('operation'),
+        'status': request.args.get('status'),
+    }
+    return _stream_export(SyncAuditLog, AUDIT_EXPORT_COLUMNS, filters, 'sync_audit_logs')
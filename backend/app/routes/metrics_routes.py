@@ -0,0 +1,14 @@
+"""
+Metrics endpoint exposing the in-process registry in the Prometheus text exposition format.
+"""
+
+from flask import Blueprint, Response
+from app.utils.metrics import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Render all registered metrics (histograms, counters, gauges) as text."""
+    return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
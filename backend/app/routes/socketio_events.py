@@ -1,5 +1,13 @@
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask import request
+from flask_socketio import ConnectionRefusedError, SocketIO, emit, join_room, leave_room
+from flask import current_app, request
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.services.admission import BULK, INTERACTIVE
+from app.services.event_ingest import ingest_events
+from app.services.event_trace import key_trace_id
+from app.services.sync_metrics import BROADCAST_FANOUT
+from app.utils.startup import start_startup_tasks, startup
+from app.utils.sync_helpers import validate_sync_event
 
 # SocketIO instance will be initialized in app/__init__.py
 
@@ -7,44 +15,165 @@ from flask import request
 This module defines SocketIO event handlers for real-time sync operations.
 """
 
-connected_devices = {}
-master_device_id = None
+# Registered devices and the current master live in current_app.device_registry so that
+# every worker process attached to the message bus shares them
 
 def register_socketio_events(socketio: SocketIO):
     """Register all sync-related SocketIO event handlers."""
 
+    def _refused(traffic, device_key=None):
+        """Admission check for a Socket.IO event; (limit, retry_after) when it is refused."""
+        admission = current_app.admission
+        if admission is None:
+            return None
+        return admission.admit(device_key or request.sid, traffic)
+
+    def _overloaded(event, refused):
+        limit, retry_after = refused
+        emit('overloaded', {'event': event, 'limit': limit, 'retry_after': round(retry_after, 3)})
+
+    # heartbeat, acknowledge, flush_end and disconnect are never refused: they are cheap, flush_end
+    # returns credits, and a refused heartbeat would look like a dead master to the device
+
     @socketio.on('connect')
     def handle_connect():
         """Handle new device connection."""
+        startup.mark('first_connect')
+        # A till may reconnect before any HTTP request reaches this worker
+        start_startup_tasks(current_app._get_current_object(), socketio.start_background_task)
+        refused = _refused(INTERACTIVE, request.args.get('device_id') or request.remote_addr)
+        if refused:
+            # Reconnect storm: the client sees connect_error with the hint and retries later
+            raise ConnectionRefusedError({'error': 'Server busy', 'retry_after': round(refused[1], 3)})
         # TODO: Add authentication/registration logic
         emit('connected', {'message': 'Connected to sync server'})
 
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle device disconnection."""
-        # TODO: Handle cleanup if needed
+        # Return credits held by an unfinished offline queue flush to the shared pool
+        _, regrants = current_app.flush_controller.end(request.sid)
+        _notify_credits(regrants)
+        # Forget devices registered on this connection
+        current_app.device_registry.unregister_sid(request.sid)
         print('Client disconnected')
 
+    def _notify_credits(regrants):
+        """Tell devices that were waiting for credits how many they may now send."""
+        for sid, credits in regrants:
+            socketio.emit('flush_credit', {'credits': credits}, to=sid)
+
+    @socketio.on('flush_begin')
+    def handle_flush_begin(data):
+        """Start a credit-based offline queue flush; replies with the initial credit grant."""
+        device_id = (data or {}).get('device_id')
+        if not device_id:
+            emit('error', {'error': 'Missing device_id'})
+            return
+        refused = _refused(BULK, device_id)
+        if refused:
+            _overloaded('flush_begin', refused)
+            return
+        credits = current_app.flush_controller.begin(request.sid, device_id)
+        # credits may be 0 when the global pool is exhausted; a flush_credit follows once credits free up
+        emit('flush_credit', {'credits': credits})
+
+    @socketio.on('flush_batch')
+    def handle_flush_batch(data):
+        """Ingest one windowed batch of queued events and acknowledge it with a fresh credit grant."""
+        data = data or {}
+        batch_id = data.get('batch_id')
+        events = data.get('events')
+        if not isinstance(events, list):
+            emit('flush_ack', {'batch_id': batch_id, 'error': 'events must be a list'})
+            return
+        controller = current_app.flush_controller
+        session = controller.sessions.get(request.sid)
+        if session is None:
+            emit('flush_ack', {'batch_id': batch_id, 'error': 'No flush in progress; send flush_begin first'})
+            return
+        # Read once: a flush_end or disconnect may drop the session while this batch is stored
+        device_id = session.device_id
+        refused = _refused(BULK, device_id)
+        if refused:
+            # The batch was not taken; the device resends it after retry_after with the credits it holds
+            emit('flush_ack', {'batch_id': batch_id, 'error': 'Server busy', 'retry_after': round(refused[1], 3)})
+            return
+        error = controller.reserve(request.sid, len(events))
+        if error:
+            emit('flush_ack', {'batch_id': batch_id, 'error': error})
+            return
+        # Database work runs on the bounded blocking pool so cooperative modes keep serving other sockets
+        result = current_app.db_offload.run(_ingest_flush_batch, events, current_app.idempotency_index, device_id)
+        credits, regrants = controller.complete(request.sid, len(events), result)
+        emit('flush_ack', {'batch_id': batch_id, **result, 'credits': credits})
+        _notify_credits(regrants)
+
+    def _ingest_flush_batch(events, idempotency_index, device_id):
+        """Store a flush batch; on failure every event is reported as rejected and the error is audited."""
+        try:
+            # A connection flushes the queue of the device that began the flush, and no other
+            return ingest_events(events, idempotency_index, operation='flush', device_id=device_id, sender_only=True)
+        except Exception as e:
+            db.session.rollback()
+            db.session.add(SyncAuditLog(event_type='sync', operation='flush', status='error',
+                                        device_id=device_id, details=str(e)))
+            db.session.commit()
+            return {'accepted': [], 'duplicates': [], 'rejected': [
+                {'index': index, 'errors': [f'Failed to store event: {e}']} for index in range(len(events))]}
+
+    @socketio.on('flush_end')
+    def handle_flush_end(data=None):
+        """Finish an offline queue flush and report totals."""
+        summary, regrants = current_app.flush_controller.end(request.sid)
+        emit('flush_complete', summary or {'error': 'No flush in progress'})
+        _notify_credits(regrants)
+
     @socketio.on('critical_event')
     def handle_critical_event(data):
         """Broadcast a critical sync event to all connected clients."""
-        # Validate required fields for a critical event
-        required_fields = ['event_type', 'payload', 'device_id']
-        missing = [f for f in required_fields if f not in data]
-        if missing:
-            emit('error', {'error': f'Missing fields: {", ".join(missing)}'})
+        tracer = current_app.event_tracer
+        received_at = tracer.clock() if tracer is not None else None
+        # Validate against the same compiled schema used by the REST routes
+        errors = validate_sync_event(data)
+        if errors:
+            emit('error', {'error': '; '.join(errors)})
+            return
+        refused = _refused(INTERACTIVE, data['device_id'])
+        if refused:
+            _overloaded('critical_event', refused)
+            return
+        # A retried emit (same idempotency key) is acknowledged but not broadcast again
+        idempotency_key = data.get('idempotency_key')
+        if idempotency_key and not current_app.db_offload.run(current_app.idempotency_index.claim_broadcast, idempotency_key):
+            emit('acknowledged', {'message': 'Event already received', 'idempotency_key': idempotency_key, 'duplicate': True})
             return
+        # The claimed key stands in for the stored row: the trace starts here, on the 'immediate' path
+        trace_id = key_trace_id(idempotency_key) if tracer is not None and idempotency_key else None
+        if trace_id is not None:
+            tracer.persisted(trace_id, data['event_type'], received_at)
+            if not tracer.tracing(trace_id):
+                trace_id = None   # not sampled
+        started = tracer.clock() if trace_id is not None else None
         # Log the event (could also queue in DB if needed)
         print(f"Broadcasting critical event: {data}")
         # Broadcast to all clients
-        emit('critical_event', data, broadcast=True)
+        with BROADCAST_FANOUT.labels('critical_event').time():
+            emit('critical_event', data, broadcast=True)
+        if trace_id is not None:
+            tracer.broadcast(trace_id, 'immediate', started, tracer.clock())
 
     @socketio.on('acknowledge')
     def handle_acknowledge(data):
-        """Handle client acknowledgement of a critical event (optional, for reliability/audit)."""
-        # Log acknowledgement for audit
-        print(f"Acknowledgement received: {data}")
-        # Optionally, update event status in DB or perform other logic
+        """Handle client acknowledgement of a broadcast event (optional, for reliability/audit)."""
+        # The first acknowledgement of a traced event closes its end-to-end latency trace
+        tracer = current_app.event_tracer
+        event_id = (data.get('event_id', data.get('id')) if isinstance(data, dict) else None)
+        if event_id is None and isinstance(data, dict) and isinstance(data.get('idempotency_key'), str):
+            # Critical events are not stored and are acknowledged by their idempotency key
+            event_id = key_trace_id(data['idempotency_key'])
+        if tracer is not None and isinstance(event_id, int) and not isinstance(event_id, bool):
+            tracer.acknowledged(event_id)
         emit('acknowledged', {'message': 'Acknowledgement received'})
 
     @socketio.on('register_device')
@@ -55,15 +184,17 @@ def register_socketio_events(socketio: SocketIO):
         if not device_id:
             emit('error', {'error': 'Missing device_id'})
             return
-        connected_devices[device_id] = {'sid': request.sid, 'role': role}
-        global master_device_id
-        if role == 'master':
-            master_device_id = device_id
+        refused = _refused(INTERACTIVE, device_id)
+        if refused:
+            _overloaded('register_device', refused)
+            return
+        current_app.device_registry.register(device_id, request.sid, role)
         emit('registered', {'device_id': device_id, 'role': role})
 
     @socketio.on('heartbeat')
     def handle_heartbeat(data):
         """Handle heartbeat from device to detect master failure."""
+        startup.mark('first_heartbeat')
         device_id = data.get('device_id')
         # Update last seen timestamp, etc. (for demo, just acknowledge)
         emit('heartbeat_ack', {'device_id': device_id})
@@ -72,6 +203,9 @@ def register_socketio_events(socketio: SocketIO):
     def handle_master_election(data):
         """Notify all devices of new master after failover."""
         new_master_id = data.get('new_master_id')
-        global master_device_id
-        master_device_id = new_master_id
+        refused = _refused(INTERACTIVE, new_master_id)
+        if refused:
+            _overloaded('master_election', refused)
+            return
+        current_app.device_registry.set_master(new_master_id)
         emit('master_elected', {'new_master_id': new_master_id}, broadcast=True) 
\ No newline at end of file
@@ -1,20 +1,112 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+import csv
+import hashlib
+import time
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models.sync_event import SyncEvent
 import datetime
 from app.models.sync_audit_log import SyncAuditLog
+from app.services.sync_metrics import PAYLOAD_BYTES, PULL_LATENCY, PUSH_LATENCY
+from app.utils.event_encoding import (encode_event, encode_event_list, encode_object, event_columns, json_dumps,
+                                      select_events)
+from app.utils.event_schemas import event_schemas
+from app.utils.export_helpers import compress_body, iter_compressed, iter_query_rows, negotiate_encoding
+from app.utils.sync_helpers import parse_event_timestamp, validate_sync_event
+from app.services.group_commit import CommitTimeout
+from app.services.invoice_import import create_invoice_importer, read_invoice_lines, text_stream
+from app.services.merge import MISSING
+from app.sync.services import MERGE_SIDES, SyncService
 
 sync_bp = Blueprint('sync', __name__)
 
+def _duplicate_push_response(data, event_id):
+    """Acknowledge a retried push without inserting it again."""
+    log = SyncAuditLog(
+        event_type=data['event_type'],
+        operation='push',
+        status='duplicate',
+        device_id=data['device_id'],
+        user_id=data.get('user_id'),
+        details=f'Retry of event {event_id} ignored (idempotency key {data["idempotency_key"]})'
+    )
+    db.session.add(log)
+    db.session.commit()
+    return jsonify({'message': 'Event already received', 'event_id': event_id, 'duplicate': True}), 200
+
+def _push_error_response(data, error):
+    """Log a failed push for debugging and audit and answer 500."""
+    log = SyncAuditLog(
+        event_type=data.get('event_type'),
+        operation='push',
+        status='error',
+        device_id=data.get('device_id'),
+        user_id=data.get('user_id'),
+        details=str(error)
+    )
+    db.session.add(log)
+    db.session.commit()
+    return jsonify({'error': f'Failed to queue event: {str(error)}'}), 500
+
+@sync_bp.after_request
+def record_payload_size(response):
+    """Record request/response payload sizes for the metrics endpoint."""
+    if request.endpoint == 'sync.push_sync_event':
+        PAYLOAD_BYTES.labels('push').observe(request.content_length or 0)
+    elif request.endpoint == 'sync.pull_sync_events' and not response.is_streamed:
+        PAYLOAD_BYTES.labels('pull').observe(response.content_length or 0)
+    return response
+
+def _push_timeout_response(timeout):
+    """
+    503 when the push was withdrawn before its commit (not stored, safe to retry); 504 when its
+    commit is still running and the outcome is unknown (retry with the same idempotency key).
+    """
+    if timeout.withdrawn:
+        response = jsonify({'error': 'Server busy, event not stored', 'outcome': 'not_stored', 'retry_after': 1})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    return jsonify({'error': 'Commit still in progress', 'outcome': 'unknown'}), 504
+
 @sync_bp.route('/sync/push', methods=['POST'])
+@PUSH_LATENCY.time()
 def push_sync_event():
     """Endpoint for clients to push new sync events to the master node."""
-    data = request.get_json()
-    # Validate required fields
-    required_fields = ['event_type', 'payload', 'device_id']
-    missing = [f for f in required_fields if f not in data]
-    if missing:
-        return jsonify({'error': f'Missing fields: {", ".join(missing)}'}), 400
+    tracer = current_app.event_tracer
+    received_at = tracer.clock() if tracer is not None else None
+    data = request.get_json(silent=True)
+    # The idempotency key may also be sent as a header (body value takes precedence)
+    if isinstance(data, dict) and 'idempotency_key' not in data and request.headers.get('Idempotency-Key'):
+        data['idempotency_key'] = request.headers['Idempotency-Key']
+    # Validate envelope and payload against the compiled schema before touching the database
+    errors = validate_sync_event(data)
+    if errors:
+        return jsonify({'error': '; '.join(errors)}), 400
+
+    # Drop retries of events that were already stored (e.g. an offline queue resent after a reconnect)
+    idempotency_key = data.get('idempotency_key')
+    idempotency_index = current_app.idempotency_index
+    if idempotency_key:
+        existing_id = idempotency_index.lookup(idempotency_key)
+        if existing_id is not None:
+            return _duplicate_push_response(data, existing_id)
+
+    # Group commit: the writer thread inserts this event together with other queued pushes
+    push_writer = current_app.push_writer
+    if push_writer is not None:
+        try:
+            event_id, duplicate = push_writer.wait(push_writer.submit(data), current_app.config['PUSH_GROUP_COMMIT_TIMEOUT'])
+        except CommitTimeout as e:
+            return _push_timeout_response(e)
+        except Exception as e:
+            return _push_error_response(data, e)
+        if duplicate:
+            return _duplicate_push_response(data, event_id)
+        if tracer is not None:
+            tracer.persisted(event_id, data['event_type'], received_at)
+        return jsonify({'message': 'Event queued', 'event_id': event_id}), 200
 
     # Create SyncEvent instance
     try:
@@ -23,11 +115,16 @@ def push_sync_event():
             payload=data['payload'],
             device_id=data['device_id'],
             user_id=data.get('user_id'),
-            timestamp=data.get('timestamp', datetime.datetime.utcnow()),
-            status='pending'
+            timestamp=parse_event_timestamp(data),
+            status='pending',
+            idempotency_key=idempotency_key
         )
         db.session.add(event)
         db.session.commit()
+        if tracer is not None:
+            tracer.persisted(event.id, data['event_type'], received_at)
+        if idempotency_key:
+            idempotency_index.add(idempotency_key)
         # Log audit
         log = SyncAuditLog(
             event_type=data['event_type'],
@@ -41,18 +138,15 @@ def push_sync_event():
         db.session.commit()
     except Exception as e:
         db.session.rollback()
-        # Log the error for debugging and audit
-        log = SyncAuditLog(
-            event_type=data.get('event_type'),
-            operation='push',
-            status='error',
-            device_id=data.get('device_id'),
-            user_id=data.get('user_id'),
-            details=str(e)
-        )
-        db.session.add(log)
-        db.session.commit()
-        return jsonify({'error': f'Failed to queue event: {str(e)}'}), 500
+        # A concurrent retry won the race on the unique index; acknowledge it as a duplicate
+        if isinstance(e, IntegrityError) and idempotency_key:
+            existing_id = db.session.execute(
+                db.select(SyncEvent.id).where(SyncEvent.idempotency_key == idempotency_key)
+            ).scalar()
+            if existing_id is not None:
+                idempotency_index.add(idempotency_key)
+                return _duplicate_push_response(data, existing_id)
+        return _push_error_response(data, e)
 
     # (Optional) Trigger immediate sync for critical events
     # if event.event_type in ["stock_update", "critical_event"]:
@@ -60,13 +154,44 @@ def push_sync_event():
 
     return jsonify({'message': 'Event queued', 'event_id': event.id}), 200
 
+PULL_FORMATS = ('json', 'ndjson')
+
+def _pull_etag(watermark, version, device_id, since, variant):
+    """ETag of a pull response: the sync_events high-water mark plus the query parameters and representation."""
+    digest = hashlib.blake2b(f'{device_id}|{since or ""}|{variant}'.encode(), digest_size=6).hexdigest()
+    return f'{watermark.epoch}.{version}.{digest}'
+
+def _stream_pull(statement, encoding):
+    """Stream the pull result as NDJSON, one event per line, writing each batch as it is read."""
+    def generate():
+        for batch in iter_query_rows(db.engine, statement, current_app.config['PULL_STREAM_BATCH_SIZE']):
+            yield b''.join(encode_event(row) + b'\n' for row in batch)
+
+    return _ndjson_response(generate(), encoding)
+
+def _stream_log_pull(records, encoding):
+    """Stream encoded events read from the event log as NDJSON, in PULL_STREAM_BATCH_SIZE batches."""
+    size = current_app.config['PULL_STREAM_BATCH_SIZE']
+    return _ndjson_response(
+        (b''.join(record + b'\n' for record in records[start:start + size]) for start in range(0, len(records), size)),
+        encoding)
+
+def _ndjson_response(body, encoding):
+    if encoding:
+        # Flush every batch so the device can apply events before the stream ends
+        body = iter_compressed(body, encoding, flush=True)
+    return current_app.response_class(stream_with_context(body), status=200, mimetype='application/x-ndjson')
+
 @sync_bp.route('/sync/pull', methods=['GET'])
 def pull_sync_events():
-    """Endpoint for clients to pull pending sync events from the master node."""
-    from app.models.sync_event import SyncEvent
-    from app import db
-    import datetime
+    """Endpoint for clients to pull pending sync events from the master node.
 
+    Responses carry an ETag derived from the event high-water mark; a request whose
+    If-None-Match still matches gets 304 without touching the database. With wait=N the
+    request is held (up to N seconds) until new events for this device arrive.
+    format=ndjson streams one event per line as rows are read; the body is compressed with
+    zstd or gzip when the client's Accept-Encoding allows it.
+    """
     device_id = request.args.get('device_id')
     since = request.args.get('since')
 
@@ -75,38 +200,85 @@ def pull_sync_events():
         return jsonify({'error': 'Missing device_id parameter'}), 400
 
     # Build query for pending events not from this device
-    query = SyncEvent.query.filter(SyncEvent.device_id != device_id, SyncEvent.status == 'pending')
+    criteria = [SyncEvent.device_id != device_id, SyncEvent.status == 'pending']
+    since_dt = None
     if since:
         try:
             since_dt = datetime.datetime.fromisoformat(since)
-            query = query.filter(SyncEvent.timestamp > since_dt)
+            criteria.append(SyncEvent.timestamp > since_dt)
         except Exception:
             return jsonify({'error': 'Invalid since timestamp format. Use ISO format.'}), 400
+    try:
+        wait = min(float(request.args.get('wait', 0)), current_app.config['PULL_LONG_POLL_MAX_SECONDS'])
+    except ValueError:
+        return jsonify({'error': 'Invalid wait parameter. Use a number of seconds.'}), 400
+    pull_format = request.args.get('format', 'json')
+    if pull_format not in PULL_FORMATS:
+        return jsonify({'error': f'Unsupported format: {pull_format}. Use json or ndjson.'}), 400
+    encoding = negotiate_encoding(request.accept_encodings)
+    statement = select_events(*criteria).order_by(SyncEvent.timestamp.asc())
 
-    events = query.order_by(SyncEvent.timestamp.asc()).all()
-
-    # Serialize events
-    def serialize_event(event):
-        return {
-            'id': event.id,
-            'event_type': event.event_type,
-            'payload': event.payload,
-            'timestamp': event.timestamp.isoformat() if event.timestamp else None,
-            'status': event.status,
-            'device_id': event.device_id,
-            'user_id': event.user_id
-        }
-    events_json = [serialize_event(e) for e in events]
+    # With the event log enabled, pending events are read from its memory-mapped segments instead
+    event_log = current_app.event_log
 
-    return jsonify({'events': events_json}), 200
+    watermark = current_app.event_watermark
+    # Past the long-poll limit the request is answered at once, as if wait were 0
+    waiting = wait > 0 and watermark.acquire_waiter()
+    content_encoding = None
+    try:
+        deadline = time.monotonic() + wait
+        version = watermark.version
+        while True:
+            etag = _pull_etag(watermark, version, device_id, since, f'{pull_format}+{encoding}')
+            expired = not waiting or time.monotonic() >= deadline
+            if not request.if_none_match.contains(etag):
+                if pull_format == 'ndjson' and event_log is not None:
+                    records = event_log.pull(device_id, since_dt)
+                    if records or expired:
+                        response = _stream_log_pull(records, encoding)
+                        content_encoding = encoding
+                        break
+                elif pull_format == 'ndjson':
+                    # Streamed: while waiting, only check that there is something to send
+                    if expired or db.session.execute(statement.limit(1)).first() is not None:
+                        response = _stream_pull(statement, encoding)
+                        content_encoding = encoding
+                        break
+                else:
+                    with PULL_LATENCY.time():
+                        if event_log is not None:
+                            rows = event_log.pull(device_id, since_dt)
+                            events = b'[' + b','.join(rows) + b']'
+                        else:
+                            # Column tuples straight from the cursor, encoded to JSON bytes without building ORM objects
+                            rows = db.session.execute(statement).all()
+                            events = encode_event_list(rows)
+                        body = encode_object([('events', events)])
+                        if rows or expired:
+                            if encoding and len(body) >= current_app.config['PULL_COMPRESS_MIN_BYTES']:
+                                body = compress_body(body, encoding)
+                                content_encoding = encoding
+                            response = current_app.response_class(body, status=200, mimetype='application/json')
+                            break
+                db.session.rollback()  # end the read transaction before waiting
+            elif expired:
+                response = current_app.response_class(status=304)
+                break
+            # Nothing new for this device yet: sleep until sync_events change or the wait expires
+            version = watermark.wait_for_change(version, deadline - time.monotonic())
+    finally:
+        if waiting:
+            watermark.release_waiter()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    return response
 
 @sync_bp.route('/sync/status', methods=['GET'])
 def sync_status():
     """Endpoint to query sync status/history for a device/user."""
-    from app.models.sync_event import SyncEvent
-    from app import db
-    import datetime
-
     device_id = request.args.get('device_id')
     user_id = request.args.get('user_id')
     limit = int(request.args.get('limit', 20))  # Limit history to last N events
@@ -115,39 +287,131 @@ def sync_status():
     if not device_id and not user_id:
         return jsonify({'error': 'Missing device_id or user_id parameter'}), 400
 
-    # Build query for events
-    query = SyncEvent.query
-    if device_id:
-        query = query.filter(SyncEvent.device_id == device_id)
-    if user_id:
-        query = query.filter(SyncEvent.user_id == user_id)
-    events = query.order_by(SyncEvent.timestamp.desc()).limit(limit).all()
-
-    # Summarize status
-    total = query.count()
-    pending = query.filter(SyncEvent.status == 'pending').count()
-    synced = query.filter(SyncEvent.status == 'synced').count()
-    failed = query.filter(SyncEvent.status == 'failed').count()
-
-    # Serialize events
-    def serialize_event(event):
-        return {
-            'id': event.id,
-            'event_type': event.event_type,
-            'payload': event.payload,
-            'timestamp': event.timestamp.isoformat() if event.timestamp else None,
-            'status': event.status,
-            'device_id': event.device_id,
-            'user_id': event.user_id
-        }
-    events_json = [serialize_event(e) for e in events]
-
-    return jsonify({
-        'summary': {
-            'total': total,
-            'pending': pending,
-            'synced': synced,
-            'failed': failed
-        },
-        'history': events_json
-    }), 200 
\ No newline at end of file
+    # Dashboards repeat the same queries; a cached response is dropped as soon as a commit touches its device/user
+    cache = current_app.status_cache
+    key = (device_id, user_id, limit)
+    if cache is not None:
+        body = cache.get(key)
+        if body is not None:
+            response = current_app.response_class(body, status=200, mimetype='application/json')
+            response.headers['X-Cache'] = 'hit'
+            return response
+        token = cache.begin()   # before reading: a write committed from here on keeps this result out
+
+    # Filters per source table: the hot sync_events table plus any history partitions
+    def criteria(table):
+        filters = []
+        if device_id:
+            filters.append(table.c.device_id == device_id)
+        if user_id:
+            filters.append(table.c.user_id == user_id)
+        return filters
+
+    partitions = current_app.event_partitions
+    # Read-only reporting connection: history reads never hold up /sync/push writers
+    with current_app.reporting_db.session() as session:
+        source = partitions.union(event_columns, criteria, session=session)
+        rows = session.execute(select(*source.c).order_by(source.c.timestamp.desc()).limit(limit)).all()
+
+        # Summarize status with one GROUP BY (per source) instead of a COUNT per status
+        counts = partitions.count_by_status(criteria, session)
+    summary = {
+        'total': sum(counts.values()),
+        'pending': counts.get('pending', 0),
+        'synced': counts.get('synced', 0),
+        'failed': counts.get('failed', 0)
+    }
+
+    body = encode_object([('summary', json_dumps(summary)), ('history', encode_event_list(rows))])
+    response = current_app.response_class(body, status=200, mimetype='application/json')
+    if cache is not None:
+        cache.put(key, body, token)
+        response.headers['X-Cache'] = 'miss'
+    return response
+
+@sync_bp.route('/sync/cache/stats', methods=['GET'])
+def status_cache_stats():
+    """Endpoint exposing the /sync/status response cache counters and hit rate."""
+    cache = current_app.status_cache
+    return jsonify({'status_cache': cache.snapshot() if cache is not None else None}), 200
+
+def _merge_value(value):
+    return None if value is MISSING else value
+
+def _conflict_json(conflict):
+    return {'field': '.'.join(map(str, conflict.path)), 'base': _merge_value(conflict.base),
+            'local': _merge_value(conflict.ours), 'incoming': _merge_value(conflict.theirs),
+            'resolved': _merge_value(conflict.resolved)}
+
+@sync_bp.route('/sync/merge', methods=['POST'])
+def merge_records():
+    """
+    Endpoint merging record versions edited concurrently (e.g. a bulk price-list update against
+    local edits): each of `records` holds `base`, `local` and `incoming` versions of one record.
+    """
+    data = request.get_json(silent=True)
+    records = data.get('records') if isinstance(data, dict) else None
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        return jsonify({'error': 'records must be a list of {base, local, incoming} objects'}), 400
+    prefer = data.get('prefer', 'local')
+    if prefer not in MERGE_SIDES:
+        return jsonify({'error': "prefer must be 'local' or 'incoming'"}), 400
+    if not all(isinstance(record.get('incoming'), dict) for record in records):
+        return jsonify({'error': 'every record needs an incoming object'}), 400
+    if not all(isinstance(record.get(side), (dict, type(None))) for record in records for side in ('local', 'base')):
+        return jsonify({'error': 'local and base must be objects or null'}), 400
+    additive = data.get('additive', current_app.config['MERGE_ADDITIVE_FIELDS'])
+    if not isinstance(additive, (list, tuple)) or not all(isinstance(field, str) for field in additive):
+        return jsonify({'error': 'additive must be a list of field names'}), 400
+    results = SyncService(current_app.merge_engine).merge_data(
+        [record['incoming'] for record in records], [record.get('local') for record in records],
+        [record.get('base') for record in records], prefer, additive)
+    return jsonify({'merged': [result.merged for result in results],
+                    'conflicts': [[_conflict_json(conflict) for conflict in result.conflicts]
+                                  for result in results]}), 200
+
+@sync_bp.route('/sync/import/invoices', methods=['POST'])
+def import_invoices():
+    """
+    Endpoint importing a supplier invoice file (the request body: CSV, NDJSON or a JSON array of
+    lines) as grouped invoice_batch events. Streams one NDJSON progress line per transaction,
+    then a summary with the rejected lines.
+    """
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'json')
+    if fmt not in ('csv', 'json', 'ndjson'):
+        return jsonify({'error': 'format must be csv, json or ndjson'}), 400
+    updates = []
+    importer = create_invoice_importer(
+        device_id=request.args.get('device_id') or 'import', user_id=request.args.get('user_id'),
+        defaults={'supplier_id': request.args.get('supplier_id'),
+                  'invoice_number': request.args.get('invoice_number')},
+        progress=updates.append)
+
+    def generate():
+        # The body is read as the import goes; only one transaction's lines are held at a time
+        try:
+            for line_number, record in read_invoice_lines(text_stream(request.stream), fmt):
+                importer.add(line_number, record)
+                while updates:
+                    yield json_dumps({'progress': updates.pop(0)}) + b'\n'
+        except (ValueError, csv.Error) as exc:
+            # Lines already committed stay; re-importing the fixed file stores only the missing lines
+            yield json_dumps({'error': str(exc), 'result': {**importer.stats, 'errors': importer.errors}}) + b'\n'
+            return
+        result = importer.finish()
+        for update in updates:
+            yield json_dumps({'progress': update}) + b'\n'
+        yield json_dumps({'result': result}) + b'\n'
+
+    return current_app.response_class(stream_with_context(generate()), status=200, mimetype='application/x-ndjson')
+
+@sync_bp.route('/sync/trace/stats', methods=['GET'])
+def event_trace_stats():
+    """Endpoint exposing latency percentiles of sampled events per stage, event type and broadcast path."""
+    tracer = current_app.event_tracer
+    return jsonify({'event_trace': tracer.summary() if tracer is not None else None}), 200
+
+@sync_bp.route('/sync/validation/stats', methods=['GET'])
+def validation_stats():
+    """Endpoint exposing per-event_type validation counters and mean validation cost."""
+    return jsonify({'validation': event_schemas.stats()}), 200
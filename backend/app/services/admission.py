@@ -0,0 +1,145 @@
+"""
+AdmissionController: Token-bucket admission control for the sync routes and Socket.IO handlers.
+
+When the store router restarts, every till reconnects at once and pushes, pulls, registers
+and starts flushing its offline queue in the same second. Each request or socket event must
+take a token from its device's bucket and one from the server-wide bucket before any
+database work. When either bucket is empty, the request is refused at once. The refusal says
+when to retry, and that hint carries random jitter so refused tills spread their retries out
+instead of returning together.
+
+Traffic has two classes. Interactive traffic is what a cashier waits on: push, pull,
+connects, critical events and registration. Bulk traffic is offline queue flushes and
+reports. Bulk requests are refused while the global bucket is below its reserve, so the
+last part of the server's capacity is kept for interactive traffic.
+
+Heartbeats, acknowledge, flush_end and disconnect are exempt and never take a token: they are
+cheap, flush_end returns credits, and a refused heartbeat would look like a dead master.
+"""
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, jsonify, request
+
+from app.services.sync_metrics import ADMISSION_REJECTED
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# HTTP endpoints under admission control and their traffic class; others (e.g. /metrics) are not limited
+ENDPOINT_TRAFFIC = {
+    'sync.push_sync_event': INTERACTIVE,
+    'sync.pull_sync_events': INTERACTIVE,
+    'sync.sync_status': BULK,
+    'sync.validation_stats': BULK,
+    'sync.merge_records': BULK,
+    'sync.import_invoices': BULK,
+    'export.export_sync_events': BULK,
+    'export.export_audit_logs': BULK,
+    'audit.query_audit_logs': BULK,
+}
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst."""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, cost, floor=0.0):
+        """Seconds until cost tokens can be taken while leaving floor tokens in the bucket (0: now)."""
+        missing = cost + floor - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class AdmissionController:
+    def __init__(self, global_rate=500, global_burst=1000, device_rate=10, device_burst=30, bulk_reserve=0.25,
+                 min_retry=1.0, retry_jitter=0.5, max_devices=10000, clock=time.monotonic):
+        """
+        bulk_reserve is the fraction of global_burst kept for interactive traffic. Retry hints are
+        at least min_retry seconds, stretched by a random factor of up to 1 + retry_jitter.
+        Buckets of the least recently seen devices are dropped beyond max_devices.
+        """
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.bulk_floor = global_burst * bulk_reserve
+        self.min_retry = min_retry
+        self.retry_jitter = retry_jitter
+        self.max_devices = max_devices
+        self.clock = clock
+        self.stats = {'admitted': 0, 'rejected_device': 0, 'rejected_global': 0}
+        self._global = TokenBucket(global_rate, global_burst, clock())
+        self._devices = OrderedDict()   # device key -> TokenBucket, least recently seen first
+        self._lock = threading.Lock()
+
+    def admit(self, device_key, traffic=INTERACTIVE, cost=1):
+        """
+        Take cost tokens for device_key; returns None when admitted, otherwise
+        (limit, retry_after): which bucket refused ('device' or 'global') and seconds to wait.
+        """
+        with self._lock:
+            now = self.clock()
+            bucket = self._devices.pop(device_key, None)
+            if bucket is None:
+                bucket = TokenBucket(self.device_rate, self.device_burst, now)
+                if len(self._devices) >= self.max_devices:
+                    self._devices.popitem(last=False)
+            self._devices[device_key] = bucket
+            bucket.refill(now)
+            self._global.refill(now)
+            # Nothing is taken unless both buckets can pay, so a refusal costs the device nothing
+            device_wait = bucket.wait(cost)
+            global_wait = self._global.wait(cost, self.bulk_floor if traffic == BULK else 0.0)
+            if device_wait or global_wait:
+                limit = 'device' if device_wait >= global_wait else 'global'
+                self.stats[f'rejected_{limit}'] += 1
+                ADMISSION_REJECTED.labels(traffic, limit).inc()
+                return limit, self._retry_after(max(device_wait, global_wait))
+            bucket.tokens -= cost
+            self._global.tokens -= cost
+            self.stats['admitted'] += 1
+            return None
+
+    def _retry_after(self, wait):
+        return max(wait, self.min_retry) * (1 + random.random() * self.retry_jitter)
+
+
+def overloaded_response(limit, retry_after):
+    """429 (this device is over its rate) or 503 (the server is), with a jittered Retry-After."""
+    response = jsonify({'error': 'Too many requests from this device' if limit == 'device' else 'Server busy',
+                        'retry_after': round(retry_after, 3)})
+    response.status_code = 429 if limit == 'device' else 503
+    # The header takes whole seconds; the body carries the precise, jittered delay
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+def _request_device():
+    device_id = request.args.get('device_id')
+    if not device_id and request.is_json:
+        body = request.get_json(silent=True)   # cached; the view reuses the parsed body
+        device_id = body.get('device_id') if isinstance(body, dict) else None
+    return device_id or request.remote_addr
+
+
+def init_admission_control(app):
+    """Refuse HTTP requests to the ENDPOINT_TRAFFIC routes that app.admission does not admit."""
+    @app.before_request
+    def admit_request():
+        traffic = ENDPOINT_TRAFFIC.get(request.endpoint)
+        if traffic is None or current_app.admission is None:
+            return None
+        refused = current_app.admission.admit(_request_device(), traffic)
+        return overloaded_response(*refused) if refused else None
@@ -1,10 +1,13 @@
 """
 ConflictResolver: Handles conflict resolution logic for sync events.
 Implements first-come, first-served by timestamp and other strategies as needed.
+When the common ancestor of two conflicting events is known, merge() combines them field by
+field instead of dropping the later one.
 """
 
 from app.models.sync_audit_log import SyncAuditLog
 from app.extensions import db
+from app.services.merge import three_way_merge
 
 class ConflictResolver:
     def resolve(self, event_a, event_b):
@@ -35,4 +38,28 @@ class ConflictResolver:
             )
             db.session.add(log)
             db.session.commit()
-            return event_b, 'rejected' 
\ No newline at end of file
+            return event_b, 'rejected'
+
+    def merge(self, base_event, event_a, event_b, additive=()):
+        """
+        Three-way merge of two concurrent events' payloads against their common ancestor's
+        (base_event may be None). Fields changed on one side keep that change; fields changed
+        differently on both sides go to the earlier event, as in resolve(); additive fields get
+        both changes. Returns MergeResult(merged payload, conflicts).
+        """
+        first, second = (event_a, event_b) if event_a.timestamp <= event_b.timestamp else (event_b, event_a)
+        result = three_way_merge(base_event.payload if base_event is not None else None,
+                                 first.payload, second.payload, prefer='ours', additive=additive)
+        fields = ', '.join('.'.join(map(str, conflict.path)) for conflict in result.conflicts)
+        log = SyncAuditLog(
+            event_type='conflict',
+            operation='merge',
+            status='merged_with_conflicts' if result.conflicts else 'merged',
+            device_id=second.device_id,
+            user_id=second.user_id,
+            details=f'{first.id} + {second.id} on base {base_event.id if base_event is not None else None}'
+                    + (f'; {first.id} kept for: {fields}' if fields else '')
+        )
+        db.session.add(log)
+        db.session.commit()
+        return result
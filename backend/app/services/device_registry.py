@@ -0,0 +1,160 @@
+"""
+DeviceRegistry: Devices registered over Socket.IO and the current master device.
+The in-memory registry serves a single server process; SQLiteDeviceRegistry keeps the same
+state in the message bus database so every worker process sees the same devices and master.
+Each worker records a heartbeat in the bus database. Devices of a worker that stopped beating
+(e.g. one that crashed, or was killed before it could unregister them) are dropped by the others.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from app.services.message_bus import bus_path, connect_bus
+
+
+class DeviceRegistry:
+    def __init__(self):
+        """Initialize an empty in-process registry."""
+        self._devices = {}
+        self._master = None
+        self._lock = threading.Lock()
+
+    def register(self, device_id, sid, role='client'):
+        """Record the connection a device registered on; a master registration also sets the master."""
+        with self._lock:
+            self._devices[device_id] = {'sid': sid, 'role': role}
+            if role == 'master':
+                self._master = device_id
+
+    def unregister_sid(self, sid):
+        """Forget every device registered on a closed connection; returns their ids."""
+        with self._lock:
+            device_ids = [d for d, info in self._devices.items() if info['sid'] == sid]
+            for device_id in device_ids:
+                del self._devices[device_id]
+        return device_ids
+
+    def get(self, device_id):
+        """Return {'sid', 'role'} for a registered device, or None."""
+        return self._devices.get(device_id)
+
+    def devices(self):
+        """Return a snapshot of all registered devices keyed by device_id."""
+        with self._lock:
+            return dict(self._devices)
+
+    def count(self):
+        return len(self._devices)
+
+    @property
+    def master_device_id(self):
+        return self._master
+
+    def set_master(self, device_id):
+        self._master = device_id
+
+
+class SQLiteDeviceRegistry(DeviceRegistry):
+    """Registry shared by the worker processes attached to the same SQLite message bus."""
+
+    def __init__(self, url, heartbeat_interval=10.0, clock=time.time):
+        """
+        Open (and create if needed) the registry tables in the bus database. A worker whose last
+        heartbeat is more than 3 heartbeat_intervals old is taken to be gone; 0 starts no
+        heartbeat thread (call heartbeat() yourself).
+        """
+        self.path = bus_path(url)
+        # Each worker tags its rows so entries left behind by a dead worker can be dropped;
+        # the random part keeps a reused pid from claiming them
+        self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.heartbeat_interval = heartbeat_interval
+        self.clock = clock
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS bus_devices ('
+                     'device_id TEXT PRIMARY KEY, sid TEXT NOT NULL, role TEXT NOT NULL, worker TEXT NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_bus_devices_sid ON bus_devices (sid)')
+        conn.execute('CREATE TABLE IF NOT EXISTS bus_state (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute('CREATE TABLE IF NOT EXISTS bus_workers (worker TEXT PRIMARY KEY, seen REAL NOT NULL)')
+        self.heartbeat()
+        if heartbeat_interval:
+            threading.Thread(target=self._beat, name='device-registry-heartbeat', daemon=True).start()
+
+    def heartbeat(self):
+        """Record that this worker is alive and drop the devices of workers that stopped beating; returns their count."""
+        now = self.clock()
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO bus_workers (worker, seen) VALUES (?, ?)', (self.worker_id, now))
+            cutoff = now - 3 * self.heartbeat_interval
+            conn.execute('DELETE FROM bus_workers WHERE seen < ?', (cutoff,))
+            # Also drops rows of workers that never beat (registered before heartbeats were recorded)
+            purged = conn.execute('DELETE FROM bus_devices WHERE worker NOT IN (SELECT worker FROM bus_workers)').rowcount
+        return purged
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except sqlite3.Error:
+                pass   # bus briefly locked or unavailable: the next beat retries
+
+    def _conn(self):
+        # sqlite3 connections are not shared between threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect_bus(self.path)
+        return conn
+
+    def register(self, device_id, sid, role='client'):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO bus_devices (device_id, sid, role, worker) VALUES (?, ?, ?, ?)',
+                         (device_id, sid, role, self.worker_id))
+            if role == 'master':
+                self._set_state(conn, 'master_device_id', device_id)
+
+    def unregister_sid(self, sid):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            device_ids = [row[0] for row in conn.execute('SELECT device_id FROM bus_devices WHERE sid = ?', (sid,))]
+            conn.execute('DELETE FROM bus_devices WHERE sid = ?', (sid,))
+        return device_ids
+
+    def get(self, device_id):
+        row = self._conn().execute('SELECT sid, role FROM bus_devices WHERE device_id = ?', (device_id,)).fetchone()
+        return {'sid': row[0], 'role': row[1]} if row else None
+
+    def devices(self):
+        rows = self._conn().execute('SELECT device_id, sid, role FROM bus_devices')
+        return {device_id: {'sid': sid, 'role': role} for device_id, sid, role in rows}
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM bus_devices').fetchone()[0]
+
+    @property
+    def master_device_id(self):
+        row = self._conn().execute("SELECT value FROM bus_state WHERE key = 'master_device_id'").fetchone()
+        return row[0] if row else None
+
+    def set_master(self, device_id):
+        conn = self._conn()
+        with conn:
+            self._set_state(conn, 'master_device_id', device_id)
+
+    @staticmethod
+    def _set_state(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO bus_state (key, value) VALUES (?, ?)', (key, value))
+
+
+def create_device_registry(url, heartbeat_interval=10.0):
+    """Build the registry for MESSAGE_BUS_URL: shared through the bus database, or in-process."""
+    if not url:
+        return DeviceRegistry()
+    return SQLiteDeviceRegistry(url, heartbeat_interval)
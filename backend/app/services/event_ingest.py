@@ -0,0 +1,131 @@
+"""
+Bulk ingest of sync events: validation, idempotency checks and a single-transaction insert.
+Shared by the Socket.IO offline-queue flush and other batch ingest paths.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+from app.utils.sync_helpers import parse_event_timestamp, validate_sync_events
+
+
+def event_values(data):
+    """Column values of a pending SyncEvent for a validated event dict."""
+    return {
+        'event_type': data['event_type'],
+        'payload': data['payload'],
+        'device_id': data['device_id'],
+        'user_id': data.get('user_id'),
+        'timestamp': parse_event_timestamp(data),
+        'status': 'pending',
+        'idempotency_key': data.get('idempotency_key'),
+    }
+
+
+def build_event(data):
+    """A pending SyncEvent for a validated event dict."""
+    return SyncEvent(**event_values(data))
+
+
+def ingest_events(events, idempotency_index, operation='bulk_push', device_id=None, sender_only=False):
+    """
+    Validate, deduplicate and insert a batch of event dicts in one transaction.
+    Returns {'accepted': [{index, event_id}], 'duplicates': [{index, event_id}], 'rejected': [{index, errors}]}.
+    Invalid events never reach the database; retried events (known idempotency key) are not inserted again.
+    sender_only rejects events whose device_id is not device_id (the device that sent the batch).
+    """
+    result = {'accepted': [], 'duplicates': [], 'rejected': []}
+    invalid = dict(validate_sync_events(events))
+    pending = []        # (index, SyncEvent) to insert
+    batch_keys = set()  # idempotency keys inserted earlier in this batch
+    batch_duplicates = []
+    for index, data in enumerate(events):
+        if index in invalid:
+            result['rejected'].append({'index': index, 'errors': invalid[index]})
+            continue
+        if sender_only and data['device_id'] != device_id:
+            errors = [f'Field device_id must be {device_id} (the sending device)']
+            result['rejected'].append({'index': index, 'errors': errors})
+            continue
+        key = data.get('idempotency_key')
+        if key:
+            if key in batch_keys:
+                batch_duplicates.append((index, key))
+                continue
+            existing_id = idempotency_index.lookup(key)
+            if existing_id is not None:
+                result['duplicates'].append({'index': index, 'event_id': existing_id})
+                continue
+        if key:
+            batch_keys.add(key)
+        pending.append((index, build_event(data)))
+
+    if pending:
+        try:
+            db.session.add_all([event for _, event in pending])
+            db.session.flush()
+            # Read ids before commit expires the instances (avoids a refresh query per event)
+            inserted = [(index, event.id, event.idempotency_key) for index, event in pending]
+            db.session.add(SyncAuditLog(
+                event_type='sync',
+                operation=operation,
+                status='success',
+                device_id=device_id,
+                details=f'{len(pending)} events ingested ({inserted[0][1]}..{inserted[-1][1]})'
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent push stored one of the keys after our lookup; fall back to per-event inserts
+            db.session.rollback()
+            return _ingest_one_by_one(events, pending, batch_duplicates, result, idempotency_index,
+                                      operation, device_id)
+        ids_by_key = {}
+        for index, event_id, key in inserted:
+            result['accepted'].append({'index': index, 'event_id': event_id})
+            if key:
+                ids_by_key[key] = event_id
+                idempotency_index.add(key)
+        for index, key in batch_duplicates:
+            result['duplicates'].append({'index': index, 'event_id': ids_by_key[key]})
+        result['duplicates'].sort(key=lambda item: item['index'])
+    return result
+
+
+def _ingest_one_by_one(events, pending, batch_duplicates, result, idempotency_index, operation, device_id):
+    """Slow path after a unique-key race: insert each event in its own savepoint."""
+    stored = {}
+    for index, _ in pending + batch_duplicates:
+        data = events[index]
+        key = data.get('idempotency_key')
+        if key and key in stored:
+            result['duplicates'].append({'index': index, 'event_id': stored[key]})
+            continue
+        event = build_event(data)
+        try:
+            with db.session.begin_nested():
+                db.session.add(event)
+                db.session.flush()
+                event_id = event.id
+            result['accepted'].append({'index': index, 'event_id': event_id})
+            if key:
+                stored[key] = event_id
+                idempotency_index.add(key)
+        except IntegrityError:
+            existing_id = db.session.execute(select(SyncEvent.id).where(SyncEvent.idempotency_key == key)).scalar()
+            stored[key] = existing_id
+            result['duplicates'].append({'index': index, 'event_id': existing_id})
+    accepted_ids = [item['event_id'] for item in result['accepted']]
+    db.session.add(SyncAuditLog(
+        event_type='sync',
+        operation=operation,
+        status='success',
+        device_id=device_id,
+        details=f'{len(accepted_ids)} events ingested one by one after a duplicate key'
+                + (f' ({min(accepted_ids)}..{max(accepted_ids)})' if accepted_ids else '')
+    ))
+    db.session.commit()
+    result['accepted'].sort(key=lambda item: item['index'])
+    result['duplicates'].sort(key=lambda item: item['index'])
+    return result
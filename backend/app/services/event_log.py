@@ -0,0 +1,471 @@
+"""
+EventLog: Optional append-only store of sync events for the master's sync pipeline.
+
+In SQLite a status change (pending -> synced) rewrites the event's row and its status
+indexes in place. With the event log enabled (EVENT_LOG=1), committed events are copied from
+sync_events, in id order, into a log of memory-mapped segment files. The pipeline then works
+on the log:
+
+- Records are the events already encoded for the wire (encode_event), framed like the
+  offline queue's: <u32 length><u32 crc32><u64 event id><event JSON>. Appends are sequential.
+  Each append batch costs one fsync, not one per event.
+- Each segment has an offset index (<segment base id>.idx) with one fixed-size entry per id:
+  the record's offset plus the device hash and timestamp that /sync/pull filters on. Events
+  are found and filtered without parsing them.
+- status.idx is the status/ack index: one byte per event id. Marking events synced writes
+  those bytes and nothing else. Pending events are found by scanning it for the pending code.
+
+/sync/pull and SyncManager's periodic and immediate broadcasts read pending events through
+the mmap. Status changes are written back to sync_events in batches (EventLogStore.checkpoint),
+so reports and exports see them after at most EVENT_LOG_CHECKPOINT_SECONDS. Segments with no
+pending events left are deleted at checkpoints. The log is derived from sync_events: a deleted
+log directory is rebuilt from the table on next use.
+"""
+
+import bisect
+import collections
+import datetime
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.offline_queue import RECORD_HEADER, Segment
+from app.utils.event_encoding import EncodedEvent, encode_event, json_loads, select_events
+
+INDEX_ENTRY = struct.Struct('<IIq')   # record offset + 1 (0: no event with this id), device hash, timestamp (µs)
+LOG_SUFFIX = '.log'
+INDEX_SUFFIX = '.idx'
+STATUS_CODES = {'pending': 1, 'synced': 2, 'failed': 3}
+STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+OTHER_STATUS = 4    # any status outside STATUS_CODES; never served as pending
+PENDING = bytes([STATUS_CODES['pending']])
+NO_TIMESTAMP = -2 ** 63
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def device_hash(device_id):
+    return zlib.crc32(device_id.encode()) if device_id is not None else 0
+
+
+def timestamp_micros(timestamp):
+    """Microseconds since the epoch of a (naive UTC) event timestamp, as stored in the offset index."""
+    if timestamp is None:
+        return NO_TIMESTAMP
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class _MappedFile:
+    """A file of at least size bytes, memory-mapped for reading and writing in place."""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)   # sparse and zero-filled
+        self.mm = mmap.mmap(self.fd, os.fstat(self.fd).st_size)
+
+    def grow(self, size):
+        self.mm.close()
+        os.ftruncate(self.fd, size)
+        self.mm = mmap.mmap(self.fd, size)
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+
+class StatusIndex(_MappedFile):
+    """One byte per event id: 0 where there is no event, otherwise its STATUS_CODES value."""
+
+    def __init__(self, path, size=64 * 1024):
+        super().__init__(path, size)
+
+    def get(self, event_id):
+        return self.mm[event_id] if event_id < len(self.mm) else 0
+
+    def set(self, event_id, code):
+        if event_id >= len(self.mm):
+            size = len(self.mm)
+            while size <= event_id:
+                size *= 2
+            self.grow(size)
+        self.mm[event_id] = code
+
+    def find(self, code, start, end):
+        """The first id in [start, end) with this status byte, or -1."""
+        return self.mm.find(code, start, min(end, len(self.mm)))
+
+    def clear_from(self, event_id):
+        if event_id < len(self.mm):
+            self.mm[event_id:] = bytes(len(self.mm) - event_id)
+
+
+class _OffsetIndex(_MappedFile):
+    def __init__(self, path, entries):
+        super().__init__(path, entries * INDEX_ENTRY.size)
+        self.entries = len(self.mm) // INDEX_ENTRY.size
+
+    def get(self, slot):
+        """(record offset or None, device hash, timestamp µs) of the event in slot."""
+        offset, device, timestamp = INDEX_ENTRY.unpack_from(self.mm, slot * INDEX_ENTRY.size)
+        return (offset - 1 if offset else None), device, timestamp
+
+    def put(self, slot, offset, device, timestamp):
+        INDEX_ENTRY.pack_into(self.mm, slot * INDEX_ENTRY.size, offset + 1, device, timestamp)
+
+    def clear_from(self, slot):
+        start = slot * INDEX_ENTRY.size
+        if start < len(self.mm):
+            self.mm[start:] = bytes(len(self.mm) - start)
+
+
+class _LogSegment:
+    """The records of the events with ids from base_id, and their offset index."""
+
+    def __init__(self, directory, base_id, segment_bytes, segment_events):
+        self.base_id = base_id
+        name = os.path.join(directory, f'{base_id:020d}')
+        self.records = Segment(name + LOG_SUFFIX, base_id, segment_bytes)
+        self.index = _OffsetIndex(name + INDEX_SUFFIX, segment_events)
+
+    def has_room(self, event_id, payload_size):
+        return (event_id - self.base_id < self.index.entries
+                and self.records.end + 2 * RECORD_HEADER.size + payload_size <= self.records.size)
+
+    def read(self, event_id):
+        offset = self.index.get(event_id - self.base_id)[0]
+        record = self.records.read(offset) if offset is not None else None
+        return record[1] if record else None
+
+    def flush(self):
+        self.records.mm.flush()
+        self.index.mm.flush()
+
+    def close(self):
+        self.records.close()
+        self.index.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.records.path)
+        os.remove(self.index.path)
+
+
+class EventLog:
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, segment_events=65536, fsync=True):
+        """Open (or recover) the log stored in directory."""
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_events = segment_events
+        self.fsync = fsync
+        self.stats = {'appended': 0, 'status_changes': 0, 'fsyncs': 0, 'recovered': 0, 'torn_records': 0,
+                      'segments_dropped': 0}
+        self.last_id = 0
+        self._lock = threading.Lock()
+        self._segments = []
+        self._bases = []
+        self._first_pending = 1   # no pending event has a lower id
+        os.makedirs(directory, exist_ok=True)
+        self.status = StatusIndex(os.path.join(directory, 'status.idx'))
+        self._recover()
+
+    # -- public API ------------------------------------------------------------------------------
+
+    def append(self, rows):
+        """
+        Append projected event rows (EVENT_COLUMNS) with ascending ids above last_id. The
+        batch is flushed to disk with one fsync of the files it touched.
+        """
+        with self._lock:
+            touched = set()
+            for row in rows:
+                event_id = row[0]
+                if event_id <= self.last_id:
+                    raise ValueError(f'Event {event_id} is not above the last logged id {self.last_id}')
+                payload = encode_event(row)
+                segment = self._writable_segment(event_id, len(payload))
+                offset = segment.records.end
+                segment.records.write(event_id, payload)
+                segment.index.put(event_id - segment.base_id, offset, device_hash(row[5]), timestamp_micros(row[3]))
+                self.status.set(event_id, STATUS_CODES.get(row[4], OTHER_STATUS))
+                self.last_id = event_id
+                touched.add(segment)
+                self.stats['appended'] += 1
+            if touched and self.fsync:
+                for segment in touched:
+                    segment.flush()
+                self.status.mm.flush()
+                self.stats['fsyncs'] += 1
+
+    def mark(self, event_ids, status):
+        """Set the status of logged events; returns the ids whose status changed."""
+        code = STATUS_CODES[status]
+        with self._lock:
+            changed = []
+            for event_id in event_ids:
+                current = self.status.get(event_id) if event_id <= self.last_id else 0
+                if current and current != code:
+                    self.status.set(event_id, code)
+                    changed.append(event_id)
+            if changed:
+                self.stats['status_changes'] += len(changed)
+                if code == PENDING[0]:
+                    self._first_pending = min(self._first_pending, min(changed))
+                if self.fsync:
+                    self.status.mm.flush()
+                    self.stats['fsyncs'] += 1
+            return changed
+
+    def status_of(self, event_id):
+        """The logged status of an event: a STATUS_CODES name, 'other', or None when it is not in the log."""
+        code = self.status.get(event_id) if event_id <= self.last_id else 0
+        return STATUS_NAMES.get(code, 'other') if code else None
+
+    def read(self, event_id):
+        """The encoded event with this id, or None."""
+        with self._lock:
+            segment = self._segment_for(event_id)
+            return segment.read(event_id) if segment else None
+
+    def read_range(self, after_id, limit):
+        """Up to limit (id, encoded event) pairs with ids above after_id, in id order: a sequential catch-up read."""
+        with self._lock:
+            events = []
+            event_id = after_id + 1
+            while len(events) < limit and event_id <= self.last_id:
+                segment = self._segment_for(event_id)
+                if segment is None:
+                    # Below the oldest retained segment
+                    event_id = self._bases[0] if self._bases else self.last_id + 1
+                    continue
+                payload = segment.read(event_id)
+                if payload is not None:
+                    events.append((event_id, payload))
+                event_id += 1
+            return events
+
+    def pending(self, exclude_device=None, since=None):
+        """
+        [(id, timestamp µs, encoded event)] of the pending events in id order, leaving out
+        those from exclude_device and, with since (µs), those not newer than since.
+        """
+        excluded = device_hash(exclude_device) if exclude_device is not None else None
+        with self._lock:
+            events = []
+            end = self.last_id + 1
+            event_id = self.status.find(PENDING, self._first_pending, end)
+            self._first_pending = event_id if event_id >= 0 else end
+            while event_id >= 0:
+                segment = self._segment_for(event_id)
+                offset, device, timestamp = segment.index.get(event_id - segment.base_id)
+                if since is None or timestamp > since:
+                    payload = segment.records.read(offset)[1]
+                    # Equal hashes are nearly always the same device; the event itself settles it
+                    if device != excluded or json_loads(payload)['device_id'] != exclude_device:
+                        events.append((event_id, timestamp, payload))
+                event_id = self.status.find(PENDING, event_id + 1, end)
+            return events
+
+    def compact(self):
+        """Delete segments (other than the newest) without pending events; returns how many were deleted."""
+        with self._lock:
+            dropped = 0
+            while len(self._segments) > 1:
+                segment, next_base = self._segments[0], self._bases[1]
+                if self.status.find(PENDING, segment.base_id, next_base) >= 0:
+                    break
+                segment.remove()
+                self._segments.pop(0)
+                self._bases.pop(0)
+                dropped += 1
+            self.stats['segments_dropped'] += dropped
+            return dropped
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments, self._bases = [], []
+            self.status.close()
+
+    # -- internals -------------------------------------------------------------------------------
+
+    def _segment_for(self, event_id):
+        position = bisect.bisect_right(self._bases, event_id) - 1
+        return self._segments[position] if position >= 0 else None
+
+    def _writable_segment(self, event_id, payload_size):
+        if self._segments and self._segments[-1].has_room(event_id, payload_size):
+            return self._segments[-1]
+        if self._segments and self.fsync:
+            self._segments[-1].flush()
+        size = max(self.segment_bytes, 2 * RECORD_HEADER.size + payload_size)
+        segment = _LogSegment(self.directory, event_id, size, self.segment_events)
+        self._segments.append(segment)
+        self._bases.append(event_id)
+        return segment
+
+    def _recover(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(LOG_SUFFIX))
+        for name in names:
+            base_id = int(name[:-len(LOG_SUFFIX)])
+            path = os.path.join(self.directory, name)
+            if os.path.getsize(path) == 0:
+                os.remove(path)   # crashed between creating and sizing the file
+                continue
+            segment = _LogSegment(self.directory, base_id, 0, self.segment_events)
+            self._segments.append(segment)
+            self._bases.append(base_id)
+            offset = 0
+            while True:
+                record = segment.records.read(offset)
+                if record is None:
+                    break
+                event_id, payload, next_offset = record
+                if segment.index.get(event_id - base_id)[0] != offset or not self.status.get(event_id):
+                    # The crash came between writing the record and its index entries
+                    event = json_loads(payload)
+                    timestamp = datetime.datetime.fromisoformat(event['timestamp']) if event['timestamp'] else None
+                    segment.index.put(event_id - base_id, offset, device_hash(event['device_id']),
+                                      timestamp_micros(timestamp))
+                    if not self.status.get(event_id):
+                        self.status.set(event_id, STATUS_CODES.get(event['status'], OTHER_STATUS))
+                segment.records.end = next_offset
+                self.last_id = event_id
+                self.stats['recovered'] += 1
+                offset = next_offset
+            records = segment.records
+            if offset + RECORD_HEADER.size <= records.size and records.mm[offset:offset + 4] != b'\0\0\0\0':
+                self.stats['torn_records'] += 1
+        if self._segments:
+            # Index and status entries past the last valid record belong to a torn write
+            last = self._segments[-1]
+            last.index.clear_from(self.last_id - last.base_id + 1)
+            self.status.clear_from(self.last_id + 1)
+            # Never append after a torn record: later events go to a new segment
+            last.records.size = last.records.end
+        else:
+            self.status.clear_from(0)
+
+
+class EventLogStore:
+    """
+    sync_events mirrored into an EventLog, and the sync pipeline's reads and status changes
+    served from it. Holds the status changes not yet written back to sync_events.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, segment_events=65536, fsync=True,
+                 checkpoint_interval=5.0, batch_size=1000):
+        """The log in directory is opened (and caught up with sync_events) on first use."""
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        self.batch_size = batch_size
+        self._log_options = {'segment_bytes': segment_bytes, 'segment_events': segment_events, 'fsync': fsync}
+        self._log = None
+        self._open_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._caught_up = None     # watermark version the log was last caught up at
+        self._dirty = {}           # event id -> status not yet written to sync_events
+        self._last_checkpoint = time.monotonic()
+
+    @property
+    def log(self):
+        if self._log is None:
+            with self._open_lock:
+                if self._log is None:
+                    self._log = EventLog(self.directory, **self._log_options)
+        return self._log
+
+    def catch_up(self):
+        """Append the events committed to sync_events since the last call; free while the watermark has not moved."""
+        watermark = current_app.event_watermark
+        version = (watermark.epoch, watermark.version)   # read first: later commits move it again
+        if version == self._caught_up:
+            return
+        with self._lock:
+            log = self.log
+            if self._caught_up is None:
+                self._reconcile(log)
+            while True:
+                rows = db.session.execute(
+                    select_events(SyncEvent.id > log.last_id).order_by(SyncEvent.id).limit(self.batch_size)).all()
+                if not rows:
+                    break
+                log.append(rows)
+            self._caught_up = version
+
+    def pull(self, device_id, since=None):
+        """Encoded pending events not from device_id (and newer than since), oldest first: /sync/pull's result."""
+        self.catch_up()
+        events = self.log.pending(exclude_device=device_id, since=timestamp_micros(since) if since else None)
+        events.sort(key=lambda event: event[1])
+        return [payload for _, _, payload in events]
+
+    def pending_events(self):
+        """[(id, device_id, user_id, EncodedEvent)] of every pending event, for the periodic broadcast."""
+        self.catch_up()
+        events = []
+        for event_id, _, payload in self.log.pending():
+            event = json_loads(payload)
+            events.append((event_id, event['device_id'], event['user_id'], EncodedEvent.from_json(payload)))
+        return events
+
+    def mark(self, event_ids, status):
+        """Change the status of events in the log; sync_events follows at the next checkpoint."""
+        self.catch_up()
+        with self._lock:
+            changed = self.log.mark(event_ids, status)
+            for event_id in changed:
+                self._dirty[event_id] = status
+        if changed:
+            # No sync_events commit announces this change, so announce it here
+            current_app.event_watermark.bump()
+        return changed
+
+    def checkpoint(self, force=False):
+        """
+        Write the status changes made in the log to sync_events, in one transaction, at most
+        every checkpoint_interval seconds unless forced. Returns the number of events written.
+        """
+        with self._lock:
+            due = force or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval
+            if not self._dirty or not due:
+                return 0
+            dirty, self._dirty = self._dirty, {}
+        by_status = collections.defaultdict(list)
+        for event_id, status in dirty.items():
+            by_status[status].append(event_id)
+        try:
+            for status, event_ids in by_status.items():
+                for start in range(0, len(event_ids), 500):
+                    db.session.execute(update(SyncEvent).where(SyncEvent.id.in_(event_ids[start:start + 500]))
+                                       .values(status=status))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                for event_id, status in dirty.items():
+                    self._dirty.setdefault(event_id, status)
+            raise
+        self._last_checkpoint = time.monotonic()
+        self.log.compact()
+        return len(dirty)
+
+    def _reconcile(self, log):
+        # Status changes the log recorded but a stopped process never checkpointed
+        pending_ids = db.session.execute(
+            select(SyncEvent.id).where(SyncEvent.status == 'pending', SyncEvent.id <= log.last_id)).scalars()
+        for event_id in pending_ids:
+            status = log.status_of(event_id)
+            if status in ('synced', 'failed'):
+                self._dirty[event_id] = status
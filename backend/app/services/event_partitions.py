@@ -0,0 +1,205 @@
+"""
+EventPartitions: Time-partitioned history for sync_events.
+
+sync_events stays the hot table. Pushes, pulls and periodic sync only ever touch it, and
+pending events never leave it. Idempotency keys are also looked up in the partitions. rollover() moves non-pending events older
+than EVENT_HOT_DAYS into per-day or per-week partition tables, named
+sync_events_p<YYYYMMDD>_<days>d after the partition's first day and length. History reads
+(/sync/status, /sync/export/events) go through the routing helpers here. They combine the hot
+table with only the partitions whose time range overlaps the query (partition pruning).
+Retention drops whole partition tables instead of deleting rows.
+"""
+
+import datetime
+import re
+from collections import namedtuple
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (JSON, Column, DateTime, Index, Integer, MetaData, String, Table, delete, func, insert,
+                        select, text, union_all)
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.status_cache import ALL
+
+PARTITION_PREFIX = 'sync_events_p'
+_PARTITION_NAME = re.compile(r'^sync_events_p(\d{8})_(\d+)d$')
+
+Partition = namedtuple('Partition', 'name start end')
+
+
+def partition_start(timestamp, days):
+    """First day of the partition holding timestamp: the day itself, or the Monday of its week."""
+    day = timestamp.date() if isinstance(timestamp, datetime.datetime) else timestamp
+    if days == 7:
+        return day - datetime.timedelta(days=day.weekday())
+    # Other lengths are aligned on days since the epoch
+    return day - datetime.timedelta(days=(day - datetime.date(1970, 1, 1)).days % days)
+
+
+class EventPartitions:
+    def __init__(self, enabled=False, interval_days=7, hot_days=7, retention_days=None):
+        """interval_days is the partition length (1 = daily, 7 = ISO weeks); retention_days None keeps everything."""
+        self.enabled = enabled
+        self.interval_days = interval_days
+        self.hot_days = hot_days
+        self.retention_days = retention_days
+        self._metadata = MetaData()
+
+    def table_name(self, start, days=None):
+        return f'{PARTITION_PREFIX}{start:%Y%m%d}_{days or self.interval_days}d'
+
+    def table(self, name):
+        """Core Table for a partition (same columns as sync_events, explicit ids, per-partition index names)."""
+        if name in self._metadata.tables:
+            return self._metadata.tables[name]
+        return Table(
+            name, self._metadata,
+            Column('id', Integer, primary_key=True, autoincrement=False),
+            Column('event_type', String, nullable=False),
+            Column('payload', JSON, nullable=False),
+            Column('timestamp', DateTime),
+            Column('status', String),
+            Column('device_id', String, nullable=False),
+            Column('user_id', String),
+            Column('idempotency_key', String),
+            Index(f'ix_{name}_device_status', 'device_id', 'status'),
+            Index(f'ix_{name}_user_id', 'user_id'),
+            Index(f'ix_{name}_timestamp', 'timestamp'),
+            Index(f'ix_{name}_idempotency_key', 'idempotency_key'),
+        )
+
+    def partitions(self, session=None):
+        """Existing partitions, oldest first (read from the schema so other workers' rollovers are seen)."""
+        if not self.enabled:
+            return []
+        names = (session or db.session).execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"),
+            {'prefix': PARTITION_PREFIX + '%'}).scalars()
+        found = []
+        for name in names:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                start = datetime.datetime.strptime(match.group(1), '%Y%m%d')
+                found.append(Partition(name, start, start + datetime.timedelta(days=int(match.group(2)))))
+        return sorted(found, key=lambda p: p.start)
+
+    def sources(self, since=None, until=None, session=None):
+        """
+        Tables that may hold events with since <= timestamp < until: the hot table plus overlapping partitions.
+        session is the one the query will run in (e.g. a reporting session); defaults to db.session.
+        """
+        tables = [SyncEvent.__table__]
+        for partition in self.partitions(session):
+            if (since is None or partition.end > since) and (until is None or partition.start < until):
+                tables.append(self.table(partition.name))
+        return tables
+
+    def union(self, columns, criteria, since=None, until=None, session=None):
+        """
+        Subquery of columns(table) filtered by criteria(table) over the pruned sources, combined
+        with UNION ALL. Order and limit by selecting from its .c columns.
+        """
+        statements = [select(*columns(table)).where(*criteria(table)) for table in self.sources(since, until, session)]
+        if len(statements) == 1:
+            return statements[0].subquery()
+        return union_all(*statements).subquery()
+
+    def count_by_status(self, criteria, session=None):
+        """{status: count} over every source, one grouped query per table summed in SQL."""
+        session = session or db.session
+        grouped = [select(table.c.status, func.count().label('n')).where(*criteria(table)).group_by(table.c.status)
+                   for table in self.sources(session=session)]
+        if len(grouped) == 1:
+            return dict(session.execute(grouped[0]).all())
+        counts = union_all(*grouped).subquery()
+        return dict(session.execute(select(counts.c.status, func.sum(counts.c.n)).group_by(counts.c.status)).all())
+
+    def rollover(self, now=None):
+        """
+        Move non-pending events older than hot_days from sync_events into their partitions.
+        Each partition is filled in its own transaction. Returns {partition name: events moved}.
+        """
+        if not self.enabled:
+            return {}
+        now = now or datetime.datetime.utcnow()
+        cutoff = datetime.datetime.combine(partition_start(now - datetime.timedelta(days=self.hot_days), 1),
+                                           datetime.time())
+        hot = SyncEvent.__table__
+        # The newest row stays in the hot table so SQLite never hands out a moved event's id again
+        max_id = db.session.execute(select(func.max(hot.c.id))).scalar()
+        movable = [hot.c.status != 'pending', hot.c.timestamp < cutoff, hot.c.id != max_id]
+        moved = {}
+        while True:
+            # Each pass fills the partition of the oldest movable event, so empty ranges are skipped
+            oldest = db.session.execute(select(func.min(hot.c.timestamp)).where(*movable)).scalar()
+            if oldest is None:
+                break
+            start = partition_start(oldest, self.interval_days)
+            lower = datetime.datetime.combine(start, datetime.time())
+            in_range = [*movable, hot.c.timestamp >= lower,
+                        hot.c.timestamp < lower + datetime.timedelta(days=self.interval_days)]
+            table = self.table(self.table_name(start))
+            table.create(db.session.connection(), checkfirst=True)
+            for index in table.indexes:
+                # Partitions created before an index was added to table() get it here
+                index.create(db.session.connection(), checkfirst=True)
+            columns = [c.name for c in table.columns]
+            result = db.session.execute(insert(table).from_select(
+                columns, select(*[hot.c[c] for c in columns]).where(*in_range)))
+            db.session.execute(delete(hot).where(*in_range))
+            db.session.commit()
+            moved[table.name] = moved.get(table.name, 0) + result.rowcount
+        if moved:
+            _history_changed()
+        return moved
+
+    def drop_before(self, cutoff):
+        """Drop every partition whose whole time range ends at or before cutoff. Returns the dropped names."""
+        dropped = []
+        for partition in self.partitions():
+            if partition.end <= cutoff:
+                self.table(partition.name).drop(db.session.connection())
+                self._metadata.remove(self.table(partition.name))
+                dropped.append(partition.name)
+        db.session.commit()
+        if dropped:
+            _history_changed()
+        return dropped
+
+    def apply_retention(self, now=None):
+        """Drop partitions older than retention_days (nothing when retention is not configured)."""
+        if not self.enabled or self.retention_days is None:
+            return []
+        now = now or datetime.datetime.utcnow()
+        return self.drop_before(now - datetime.timedelta(days=self.retention_days))
+
+    def maintain(self, now=None):
+        """Rollover followed by retention; safe to run from cron or a background task."""
+        return {'moved': self.rollover(now), 'dropped': self.apply_retention(now)}
+
+
+def _history_changed():
+    """Expire cached /sync/status responses: the session listeners do not see partition DDL."""
+    cache = getattr(current_app, 'status_cache', None)
+    if cache is not None:
+        cache.invalidate([ALL])
+    watermark = getattr(current_app, 'event_watermark', None)
+    if watermark is not None:
+        # Also reaches other worker processes' caches through the shared watermark
+        watermark.bump()
+
+
+events_cli = AppGroup('events', help='Manage sync_events history partitions.')
+
+
+@events_cli.command('maintain')
+def maintain_command():
+    """Move old events into partitions and drop partitions past retention."""
+    result = current_app.event_partitions.maintain()
+    for name, count in result['moved'].items():
+        click.echo(f'{name}: moved {count} events')
+    for name in result['dropped']:
+        click.echo(f'{name}: dropped')
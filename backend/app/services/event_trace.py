@@ -0,0 +1,186 @@
+"""
+EventTracer: Sampled end-to-end latency tracing of sync events, from a till's push to the
+first acknowledgement from another till.
+
+A traced event gets a timestamp at each point it passes:
+
+    received     /sync/push or the Socket.IO critical_event handler starts handling it
+    persisted    its INSERT is committed (directly or by the group-commit writer); for a
+                 critical_event, which is not stored, its idempotency key is claimed
+    broadcast    SyncManager.periodic_sync, immediate_sync or the critical_event handler starts
+                 and finishes emitting it
+    acked        the first `acknowledge` naming its id (or a critical event's idempotency key) arrives
+
+Their differences are the stages: persist (database), schedule (waiting for the periodic or
+immediate broadcast), fanout (Socket.IO emit), ack (network and client) and end_to_end.
+
+Whether an event is traced depends only on a hash of its id, so every stage agrees on it
+without shared state. The untraced majority costs one dictionary lookup per stage. Traces are
+kept in a fixed ring of EVENT_TRACE_CAPACITY slots: five float timestamps, the event id and
+two small codes per slot, 50 bytes each. The oldest trace is overwritten first.
+
+A critical_event has no row id. It is traced under a negative id derived from its idempotency
+key (key_trace_id), and emits without a key are not traced.
+
+Traces live in the process that handled the push. With a message bus, a stage that runs in
+another worker process is not recorded.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from array import array
+
+from app.services.sync_metrics import EVENT_STAGE_LATENCY
+
+RECEIVED, PERSISTED, BROADCAST_STARTED, BROADCAST_FINISHED, ACKED = range(5)
+TIMESTAMPS = 5
+
+# stage -> (from timestamp, to timestamp)
+STAGES = {
+    'persist': (RECEIVED, PERSISTED),
+    'schedule': (PERSISTED, BROADCAST_STARTED),
+    'fanout': (BROADCAST_STARTED, BROADCAST_FINISHED),
+    'ack': (BROADCAST_FINISHED, ACKED),
+    'end_to_end': (RECEIVED, ACKED),
+}
+PATHS = (None, 'periodic', 'immediate')
+PERCENTILES = (50, 90, 99)
+MAX_EVENT_TYPES = 255   # further event types are traced as '_other'
+
+_HASH_MULTIPLIER = 0x9E3779B1   # Fibonacci hashing spreads consecutive ids evenly
+
+
+def key_trace_id(key):
+    """Trace id of a socket-only event, from its idempotency key; negative, so never a row id."""
+    return -1 - (int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big') >> 1)
+
+
+class EventTracer:
+    def __init__(self, sample_rate=0.01, capacity=4096, clock=time.perf_counter):
+        """Trace about sample_rate of all events (1: every event), keeping the latest `capacity` traces."""
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self.clock = clock
+        self.stats = {'traced': 0, 'overwritten': 0, 'acks': 0}
+        self._threshold = int(sample_rate * 2 ** 32)
+        self._times = array('d', [math.nan]) * (capacity * TIMESTAMPS)
+        self._ids = array('q', [0]) * capacity
+        self._types = array('B', [0]) * capacity   # index into _type_names
+        self._paths = array('B', [0]) * capacity   # index into PATHS
+        self._slots = {}                           # event id -> slot
+        self._type_names = ['_other']
+        self._type_codes = {}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def sampled(self, event_id):
+        return ((event_id * _HASH_MULTIPLIER) & 0xFFFFFFFF) < self._threshold
+
+    def tracing(self, event_id):
+        """Whether event_id has a trace to add stages to."""
+        return event_id in self._slots
+
+    def persisted(self, event_id, event_type, received_at, persisted_at=None):
+        """Start the trace of a committed event if it is sampled; received_at is a clock() reading."""
+        if not self.sampled(event_id) or event_id in self._slots:
+            return
+        persisted_at = self.clock() if persisted_at is None else persisted_at
+        with self._lock:
+            slot = self._next % self.capacity
+            if self._next >= self.capacity:
+                self._slots.pop(self._ids[slot], None)
+                self.stats['overwritten'] += 1
+            self._next += 1
+            self._slots[event_id] = slot
+            self._ids[slot] = event_id
+            self._types[slot] = self._type_code(event_type)
+            self._paths[slot] = 0
+            base = slot * TIMESTAMPS
+            self._times[base:base + TIMESTAMPS] = array('d', (received_at, persisted_at, math.nan, math.nan, math.nan))
+            self.stats['traced'] += 1
+            self._observe(slot, 'persist')
+
+    def broadcast(self, event_id, path, started, finished):
+        """Record the emit of a traced event by the 'periodic' or 'immediate' sync path."""
+        with self._lock:
+            slot = self._slots.get(event_id)
+            if slot is None or not math.isnan(self._times[slot * TIMESTAMPS + BROADCAST_STARTED]):
+                return
+            self._times[slot * TIMESTAMPS + BROADCAST_STARTED] = started
+            self._times[slot * TIMESTAMPS + BROADCAST_FINISHED] = finished
+            self._paths[slot] = PATHS.index(path)
+            self._observe(slot, 'schedule', 'fanout')
+
+    def acknowledged(self, event_id, at=None):
+        """Record an acknowledgement; only the first one after the broadcast counts."""
+        with self._lock:
+            slot = self._slots.get(event_id)
+            if slot is None:
+                return
+            self.stats['acks'] += 1
+            base = slot * TIMESTAMPS
+            if math.isnan(self._times[base + BROADCAST_FINISHED]) or not math.isnan(self._times[base + ACKED]):
+                return
+            self._times[base + ACKED] = self.clock() if at is None else at
+            self._observe(slot, 'ack', 'end_to_end')
+
+    def summary(self):
+        """
+        Latency percentiles in milliseconds per stage: overall, per event type and per broadcast path.
+        {stage: {'all': {count, p50, p90, p99, max}, 'event_types': {...}, 'paths': {...}}}
+        """
+        with self._lock:
+            used = min(self._next, self.capacity)
+            times = self._times[:used * TIMESTAMPS]
+            types = [self._type_names[code] for code in self._types[:used]]
+            paths = [PATHS[code] for code in self._paths[:used]]
+            stats = dict(self.stats)
+        result = {}
+        for stage, (start, end) in STAGES.items():
+            groups = {}
+            for slot in range(used):
+                elapsed = times[slot * TIMESTAMPS + end] - times[slot * TIMESTAMPS + start]
+                if math.isnan(elapsed):
+                    continue
+                for group in (('all',), ('event_types', types[slot]), ('paths', paths[slot])):
+                    if group[-1] is not None:
+                        groups.setdefault(group, []).append(elapsed)
+            result[stage] = {
+                'all': _percentiles(groups.get(('all',), [])),
+                'event_types': {key[1]: _percentiles(values) for key, values in groups.items() if key[0] == 'event_types'},
+                'paths': {key[1]: _percentiles(values) for key, values in groups.items() if key[0] == 'paths'},
+            }
+        return {'sample_rate': self.sample_rate, 'traces': used, **stats, 'stages': result}
+
+    def _type_code(self, event_type):
+        code = self._type_codes.get(event_type)
+        if code is None:
+            if len(self._type_names) > MAX_EVENT_TYPES:
+                return 0
+            code = self._type_codes[event_type] = len(self._type_names)
+            self._type_names.append(event_type)
+        return code
+
+    def _observe(self, slot, *stages):
+        # Called with the lock held, before the slot can be reused
+        base = slot * TIMESTAMPS
+        event_type = self._type_names[self._types[slot]]
+        for stage in stages:
+            start, end = STAGES[stage]
+            elapsed = self._times[base + end] - self._times[base + start]
+            if not math.isnan(elapsed):
+                EVENT_STAGE_LATENCY.labels(stage, event_type).observe(elapsed)
+
+
+def _percentiles(values):
+    """Nearest-rank percentiles of seconds, reported in milliseconds."""
+    if not values:
+        return {'count': 0}
+    values.sort()
+    summary = {'count': len(values)}
+    for p in PERCENTILES:
+        summary[f'p{p}'] = round(values[max(0, math.ceil(p / 100 * len(values)) - 1)] * 1000, 3)
+    summary['max'] = round(values[-1] * 1000, 3)
+    return summary
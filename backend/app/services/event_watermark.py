@@ -0,0 +1,148 @@
+"""
+EventWatermark: A version number for sync_events that rises on every committed change.
+
+Every commit that inserts, updates or deletes SyncEvent rows raises the version. That covers
+pushes, flush batches, periodic-sync status changes, and Core DML issued through the session.
+/sync/pull builds its ETag from the version, so a client that already holds the current state
+gets a 304 without a database query. Long-polling clients wait on the watermark until it moves.
+The version lives in process memory. With a message bus configured, SQLiteEventWatermark keeps
+it in the bus database so a change committed by any worker wakes and invalidates them all.
+"""
+
+import threading
+import time
+import uuid
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.sync_event import SyncEvent
+from app.services.message_bus import bus_path, connect_bus
+
+_listeners_installed = False
+
+
+class EventWatermark:
+    def __init__(self, max_waiters=64):
+        """max_waiters bounds the long-poll requests held at once; further requests do not wait."""
+        self.epoch = uuid.uuid4().hex[:8]   # distinguishes versions of different server runs
+        self.max_waiters = max_waiters
+        self.waiters = 0
+        self._version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump(self):
+        """Record a committed change to sync_events and wake long-polling requests."""
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """Block until the version differs from `version` or timeout (seconds) passes; returns the version."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self._version == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return self._version
+
+    def acquire_waiter(self):
+        """Reserve a long-poll slot; False when max_waiters requests are already held."""
+        with self._changed:
+            if self.waiters >= self.max_waiters:
+                return False
+            self.waiters += 1
+            return True
+
+    def release_waiter(self):
+        with self._changed:
+            self.waiters -= 1
+
+
+class SQLiteEventWatermark(EventWatermark):
+    """Watermark shared by the worker processes attached to the same SQLite message bus."""
+
+    def __init__(self, url, max_waiters=64, poll_interval=0.05):
+        super().__init__(max_waiters)
+        self.path = bus_path(url)
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS bus_state (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute("INSERT OR IGNORE INTO bus_state (key, value) VALUES ('events_version', '0')")
+        conn.execute("INSERT OR IGNORE INTO bus_state (key, value) VALUES ('events_epoch', ?)", (self.epoch,))
+        self.epoch = conn.execute("SELECT value FROM bus_state WHERE key = 'events_epoch'").fetchone()[0]
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect_bus(self.path)
+        return conn
+
+    @property
+    def version(self):
+        return int(self._conn().execute("SELECT value FROM bus_state WHERE key = 'events_version'").fetchone()[0])
+
+    def bump(self):
+        self._conn().execute("UPDATE bus_state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'events_version'")
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        # Local commits wake waiters at once; commits in other workers are seen on the next poll
+        deadline = time.monotonic() + timeout
+        current = self.version
+        while current == version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+            current = self.version
+        return current
+
+
+def create_event_watermark(url, max_waiters=64):
+    """Build the watermark for MESSAGE_BUS_URL: shared through the bus database, or in-process."""
+    if not url:
+        return EventWatermark(max_waiters)
+    return SQLiteEventWatermark(url, max_waiters)
+
+
+def install_watermark_listeners():
+    """Raise the current app's watermark after commits that changed sync_events. Installed once per process."""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+
+    @event.listens_for(Session, 'after_flush')
+    def _after_flush(session, flush_context):
+        if any(isinstance(obj, SyncEvent) for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info['sync_events_changed'] = True
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _on_execute(orm_execute_state):
+        # Bulk UPDATE/DELETE/INSERT statements bypass the unit of work
+        if (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert) and \
+                getattr(orm_execute_state.statement.table, 'name', None) == SyncEvent.__tablename__:
+            orm_execute_state.session.info['sync_events_changed'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        if session.info.pop('sync_events_changed', False) and has_app_context():
+            watermark = getattr(current_app, 'event_watermark', None)
+            if watermark is not None:
+                watermark.bump()
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(session):
+        session.info.pop('sync_events_changed', None)
+
+    _listeners_installed = True
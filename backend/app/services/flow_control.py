@@ -0,0 +1,114 @@
+"""
+FlushController: Credit-based flow control for offline queue flushes over Socket.IO.
+
+The server grants each flushing device a number of credits (events it may send). Credits come
+out of a global budget shared by every device flushing at once, so the number of events held in
+memory by the master stays bounded however many tills reconnect together. Credits are returned
+to the pool when a batch is acknowledged or the flush ends, and redistributed to waiting devices.
+"""
+
+import threading
+
+
+class FlushSession:
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.credits = 0        # events the device may still send
+        self.batches = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def summary(self):
+        return {
+            'device_id': self.device_id,
+            'batches': self.batches,
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+        }
+
+
+class FlushController:
+    def __init__(self, global_credits=2000, max_window=200, min_window=10):
+        """Initialize the shared credit pool and per-device window bounds."""
+        self.global_credits = global_credits
+        self.max_window = max_window
+        self.min_window = min_window
+        self.available = global_credits
+        self.sessions = {}  # sid -> FlushSession
+        self._lock = threading.Lock()
+
+    def _window(self):
+        """Fair share of the global budget per active flush, clamped to [min_window, max_window]."""
+        share = self.global_credits // max(1, len(self.sessions))
+        return min(self.max_window, max(self.min_window, share))
+
+    def _top_up(self, session):
+        """Grant credits up to the current window, limited by what is left in the global pool."""
+        grant = max(0, min(self._window() - session.credits, self.available))
+        session.credits += grant
+        self.available -= grant
+        return session.credits
+
+    def _regrant_waiting(self, exclude=None):
+        """Give freed credits to sessions that ran out. Returns [(sid, credits)] to notify."""
+        granted = []
+        for sid, session in self.sessions.items():
+            if sid != exclude and session.credits == 0 and self.available > 0:
+                if self._top_up(session):
+                    granted.append((sid, session.credits))
+        return granted
+
+    def begin(self, sid, device_id):
+        """Start (or restart) a flush for a connection. Returns the initial credit grant (may be 0)."""
+        with self._lock:
+            if sid in self.sessions:
+                self.available += self.sessions.pop(sid).credits
+            session = self.sessions[sid] = FlushSession(device_id)
+            return self._top_up(session)
+
+    def reserve(self, sid, count):
+        """
+        Consume credits for an incoming batch of `count` events.
+        Returns None on success or an error string if the connection has no flush or too few credits.
+        """
+        with self._lock:
+            session = self.sessions.get(sid)
+            if session is None:
+                return 'No flush in progress; send flush_begin first'
+            if count > session.credits:
+                return f'Batch of {count} events exceeds granted credits ({session.credits})'
+            session.credits -= count
+            return None
+
+    def complete(self, sid, count, result):
+        """
+        Return the credits of a processed batch to the pool and record its outcome.
+        Returns (credits for this sid, [(other_sid, credits)] to notify).
+        """
+        with self._lock:
+            self.available += count
+            session = self.sessions.get(sid)
+            if session is None:
+                return 0, self._regrant_waiting()
+            session.batches += 1
+            session.accepted += len(result['accepted'])
+            session.duplicates += len(result['duplicates'])
+            session.rejected += len(result['rejected'])
+            credits = self._top_up(session)
+            return credits, self._regrant_waiting(exclude=sid)
+
+    def end(self, sid):
+        """Finish a flush (or drop it on disconnect). Returns (summary or None, [(sid, credits)] to notify)."""
+        with self._lock:
+            session = self.sessions.pop(sid, None)
+            if session is None:
+                return None, []
+            self.available += session.credits
+            return session.summary(), self._regrant_waiting()
+
+    def in_flight(self):
+        """Credits currently granted or being processed (upper bound on buffered events)."""
+        with self._lock:
+            return self.global_credits - self.available
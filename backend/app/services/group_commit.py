@@ -0,0 +1,187 @@
+"""
+GroupCommitWriter: Group commit for /sync/push.
+
+Push handlers no longer each open a transaction and queue on SQLite's write lock. They submit
+the validated event to one writer thread and wait on a future. The writer takes everything that
+has queued up (up to max_batch) and inserts it in a single transaction. Each event gets its audit
+entry in that same transaction. After the commit the writer resolves each future with its event
+id. A request is answered only after its event is committed, as before, but one commit (one
+fsync) now covers every push that arrived while the previous batch was being written.
+
+A request that times out first withdraws its push if the writer has not taken it yet, so the
+push is definitely not stored. Once the writer has taken it, the batch commits or fails as a
+whole. The request then waits once more and, if the batch is still being written, answers
+that the outcome is unknown. It never reports a failure for an event that may still be
+committed.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+from app.services.event_ingest import build_event, event_values
+from app.services.sync_metrics import PUSH_BATCH_SIZE
+
+logger = logging.getLogger('app.group_commit')
+
+
+class CommitTimeout(Exception):
+    """
+    A push was not committed in time. withdrawn: it was taken off the queue and is not stored;
+    otherwise its batch is still being written and the outcome is unknown.
+    """
+    def __init__(self, withdrawn):
+        super().__init__('Push withdrawn before commit' if withdrawn else 'Commit still in progress')
+        self.withdrawn = withdrawn
+
+
+class GroupCommitWriter:
+    def __init__(self, app, max_batch=256, idle_timeout=5.0):
+        """The writer thread starts on the first submit and exits after idle_timeout seconds without work."""
+        self.app = app
+        self.max_batch = max_batch
+        self.idle_timeout = idle_timeout
+        self.stats = {'batches': 0, 'events': 0, 'largest_batch': 0, 'fallbacks': 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, data):
+        """
+        Queue a validated push for the next commit. The returned Future resolves to
+        (event_id, duplicate) once the batch holding it is committed, or raises the batch's error.
+        """
+        future = Future()
+        self._queue.put((data, future))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='push-group-commit', daemon=True)
+                self._thread.start()
+        return future
+
+    def wait(self, future, timeout):
+        """The submitted push's (event_id, duplicate); raises CommitTimeout when not committed within timeout."""
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise CommitTimeout(withdrawn=True)
+        # Already taken by the writer: its batch commits or fails as a whole
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            raise CommitTimeout(withdrawn=False)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.idle_timeout)]
+                except queue.Empty:
+                    with self._lock:
+                        # A submit racing with the timeout finds the thread alive and relies on it
+                        if self._queue.empty():
+                            self._thread = None
+                            return
+                    continue
+                # Everything that arrived while the previous batch was committing goes into this one
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                # Pushes whose request timed out and withdrew them are dropped; the rest can no longer be cancelled
+                batch = [(data, future) for data, future in batch if future.set_running_or_notify_cancel()]
+                if batch:
+                    self._commit(batch)
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        try:
+            try:
+                results = self._insert(batch)
+            except IntegrityError:
+                # A key stored after the handler's idempotency lookup; retry event by event
+                db.session.rollback()
+                self.stats['fallbacks'] += 1
+                results = self._insert_one_by_one(batch)
+        except Exception as e:
+            db.session.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.session.remove()
+        index = self.app.idempotency_index
+        for (data, future), (event_id, duplicate) in zip(batch, results):
+            if data.get('idempotency_key'):
+                index.add(data['idempotency_key'])
+            future.set_result((event_id, duplicate))
+        self.stats['batches'] += 1
+        self.stats['events'] += len(batch)
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+        PUSH_BATCH_SIZE.observe(len(batch))
+        logger.debug('Committed %d pushes in %.1f ms', len(batch), (time.perf_counter() - started) * 1000)
+
+    def _insert(self, batch):
+        """Insert the batch in one transaction; returns [(event_id, duplicate)] in batch order."""
+        rows, first_by_key, positions = [], {}, []
+        for data, _ in batch:
+            key = data.get('idempotency_key')
+            if key and key in first_by_key:
+                positions.append(first_by_key[key])   # retry of a push earlier in this batch
+                continue
+            if key:
+                first_by_key[key] = len(rows)
+            positions.append(len(rows))
+            rows.append(event_values(data))
+        # Bulk INSERT ... RETURNING: one statement per batch instead of a unit-of-work flush per object
+        ids = db.session.execute(
+            insert(SyncEvent).returning(SyncEvent.id, sort_by_parameter_order=True), rows).scalars().all()
+        results, audited = [], set()
+        for (data, _), position in zip(batch, positions):
+            results.append((ids[position], position in audited))
+            audited.add(position)
+        db.session.execute(insert(SyncAuditLog), [
+            _audit_values(data, event_id) for (data, _), (event_id, duplicate) in zip(batch, results) if not duplicate])
+        db.session.commit()
+        return results
+
+    def _insert_one_by_one(self, batch):
+        """Slow path: each event in its own savepoint, duplicates resolved to the stored id."""
+        results = []
+        for data, _ in batch:
+            key = data.get('idempotency_key')
+            try:
+                with db.session.begin_nested():
+                    event = build_event(data)
+                    db.session.add(event)
+                    db.session.flush()
+                    db.session.add(SyncAuditLog(**_audit_values(data, event.id)))
+                results.append((event.id, False))
+            except IntegrityError:
+                if not key:
+                    raise
+                existing_id = db.session.execute(select(SyncEvent.id).where(SyncEvent.idempotency_key == key)).scalar()
+                results.append((existing_id, True))
+        db.session.commit()
+        return results
+
+
+def _audit_values(data, event_id):
+    return {
+        'event_type': data['event_type'],
+        'operation': 'push',
+        'status': 'success',
+        'device_id': data['device_id'],
+        'user_id': data.get('user_id'),
+        'details': f'Event {event_id} pushed',
+    }
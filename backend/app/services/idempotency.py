@@ -0,0 +1,153 @@
+"""
+IdempotencyIndex: Detects retried sync events by their client-supplied idempotency key.
+A Bloom filter built from the keys already stored sits in front of the unique index on
+sync_events.idempotency_key, so most new keys are accepted without an index probe.
+
+With EVENT_PARTITIONING, keys of events moved into partition tables stay known: the filter is
+built from, and probes look in, the hot table and every partition. A key is remembered until
+retention drops the partition holding its event; a retry arriving after that is stored again.
+
+When more keys than the filter was sized for have been added, a larger filter is built in a
+background thread. Lookups keep using the current one meanwhile (its false-positive rate rises
+a little, which only costs index probes), and keys added during the rebuild go into both.
+"""
+
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.utils.bloom_filter import BloomFilter
+
+
+class IdempotencyIndex:
+    def __init__(self, capacity=100000, error_rate=0.01, recent_broadcasts=10000, partitions=None):
+        """
+        Initialize an empty index; call rebuild() (inside an app context) to load existing keys.
+        partitions: the app's EventPartitions, whose tables hold keys of older events.
+        """
+        self.capacity = capacity
+        self.partitions = partitions
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.built = False
+        self._lock = threading.Lock()
+        self._rebuilds = 0         # rebuilds reading the tables right now
+        self._late_keys = []       # keys added while they read, for the filters they build
+        self._growing = False      # a background rebuild for a larger filter is running
+        # Keys of socket-only critical events already broadcast (these are not stored in sync_events)
+        self._recent_broadcasts = OrderedDict()
+        self._recent_limit = recent_broadcasts
+        self.stats = {'bloom_negative': 0, 'index_probes': 0, 'duplicates': 0, 'false_positives': 0}
+
+    def rebuild(self):
+        """Rebuild the Bloom filter from every idempotency key stored in sync_events and its partitions."""
+        with self._lock:
+            self._rebuilds += 1
+            late_from = len(self._late_keys)
+        try:
+            with db.engine.connect() as conn:
+                statements = [select(table.c.idempotency_key).where(table.c.idempotency_key.isnot(None))
+                              for table in self._tables(conn)]
+                count = sum(conn.execute(select(db.func.count()).select_from(statement.subquery())).scalar()
+                            for statement in statements)
+                # Leave headroom so the false-positive rate holds as new keys arrive
+                bloom = BloomFilter(max(self.capacity, count * 2), self.error_rate)
+                for statement in statements:
+                    result = conn.execution_options(stream_results=True, yield_per=5000).execute(statement)
+                    for (key,) in result:
+                        bloom.add(key)
+        except OperationalError:
+            # Table not created yet (fresh database); retry on first use
+            with self._lock:
+                self._finish_rebuild()
+            return False
+        with self._lock:
+            # Keys stored after the read began may be missing from what it saw
+            for key in self._late_keys[late_from:]:
+                bloom.add(key)
+            self.bloom = bloom
+            self.built = True
+            self._finish_rebuild()
+        return True
+
+    def _finish_rebuild(self):
+        # Called with the lock held
+        self._rebuilds -= 1
+        if not self._rebuilds:
+            self._late_keys = []
+
+    def _grow(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        finally:
+            self._growing = False
+
+    def _tables(self, session):
+        """sync_events followed by its partitions, newest first."""
+        tables = [SyncEvent.__table__]
+        if self.partitions is not None:
+            tables += [self.partitions.table(partition.name) for partition in reversed(self.partitions.partitions(session))]
+        return tables
+
+    def _ensure_built(self):
+        if not self.built:
+            self.rebuild()
+
+    def lookup(self, key):
+        """Return the id of the stored event with this idempotency key, or None if it has not been seen."""
+        self._ensure_built()
+        if key not in self.bloom:
+            self._count('bloom_negative')
+            return None
+        self._count('index_probes')
+        event_id = None
+        # Newest first: a retry is most likely of a recent event
+        for table in self._tables(db.session):
+            event_id = db.session.execute(select(table.c.id).where(table.c.idempotency_key == key)).scalar()
+            if event_id is not None:
+                break
+        if event_id is None:
+            self._count('false_positives')
+        else:
+            self._count('duplicates')
+        return event_id
+
+    def _count(self, name):
+        # Request threads and the background rebuild share the counters
+        with self._lock:
+            self.stats[name] += 1
+
+    def add(self, key):
+        """Record a newly stored key. Starts growing the filter when it passes its design capacity."""
+        with self._lock:
+            self.bloom.add(key)
+            if self._rebuilds:
+                self._late_keys.append(key)
+            grow = self.built and not self._growing and self.bloom.count > self.bloom.capacity
+            if grow:
+                self._growing = True
+        if grow:
+            threading.Thread(target=self._grow, args=(current_app._get_current_object(),),
+                             name='idempotency-rebuild', daemon=True).start()
+
+    def claim_broadcast(self, key):
+        """
+        Claim a key for a socket-only broadcast. Returns False if the key was already broadcast
+        or stored as an event, i.e. the emit is a retry and must not be broadcast again.
+        """
+        with self._lock:
+            if key in self._recent_broadcasts:
+                self._recent_broadcasts.move_to_end(key)
+                self.stats['duplicates'] += 1
+                return False
+        if self.lookup(key) is not None:
+            return False
+        with self._lock:
+            self._recent_broadcasts[key] = True
+            if len(self._recent_broadcasts) > self._recent_limit:
+                self._recent_broadcasts.popitem(last=False)
+        return True
@@ -0,0 +1,292 @@
+"""
+Streaming import of supplier invoice files (invoice_items in the PRD) as grouped sync events.
+
+A delivery of several hundred lines used to reach the master as one /sync/push per line. The
+importer reads a CSV, NDJSON or JSON-array file line by line and validates each line against a
+compiled schema. Valid lines are grouped into `invoice_batch` events of up to
+INVOICE_IMPORT_BATCH_LINES lines of the same invoice. Every INVOICE_IMPORT_TRANSACTION_BATCHES
+events are stored in one transaction through the bulk ingest path. Memory is bounded by one
+transaction's worth of lines, plus an 8-byte digest per line already stored for the invoices
+in the file.
+
+Lines are deduplicated one by one against the lines of the invoice already stored, in sync_events
+or its history partitions, found through a range of the idempotency key index. A line
+whose contents match a stored, not yet matched line is skipped. Importing the same file again,
+or a fixed copy of a file that had rejected lines, stores only the lines that are missing,
+whatever the batch size of either run. Each event's idempotency key is made from the invoice,
+its first line number and a digest of its lines, so a retried transaction is not stored twice.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.event_ingest import ingest_events
+from app.utils.event_schemas import NUMBER, compile_schema
+
+INVOICE_BATCH_EVENT = 'invoice_batch'
+
+INVOICE_LINE_SCHEMA = {
+    'invoice_number': {'type': str, 'required': True, 'min_length': 1},
+    'supplier_id': {'type': (int, str), 'required': True},
+    'product_id': {'type': (int, str), 'required': True},
+    'quantity': {'type': NUMBER, 'required': True, 'min': 0},
+    'cost_price': {'type': NUMBER, 'required': True, 'min': 0},
+    'batch_number': {'type': str, 'nullable': True},
+    'expiry_date': {'type': str, 'nullable': True, 'format': 'iso_datetime'},
+}
+
+# Columns converted from CSV text before validation; the invoice fields are hoisted into the event payload
+CSV_NUMBER_COLUMNS = ('quantity', 'cost_price')
+CSV_INT_COLUMNS = ('supplier_id', 'product_id')
+INVOICE_FIELDS = ('invoice_number', 'supplier_id')
+
+validate_invoice_line = compile_schema(INVOICE_LINE_SCHEMA)
+
+
+def line_digest(line):
+    """Digest of an invoice line's stored fields; equal lines have equal digests."""
+    return hashlib.blake2b(json.dumps(line, sort_keys=True, separators=(',', ':')).encode(), digest_size=8).digest()
+
+
+def invoice_key_prefix(supplier_id, invoice_number):
+    return f'invoice:{supplier_id}:{invoice_number}:'
+
+
+def read_invoice_lines(stream, fmt, chunk_size=65536):
+    """Yield (line_number, record) from a text stream holding CSV (with a header row), NDJSON or a JSON array."""
+    if fmt == 'csv':
+        # Line numbers count data rows from 1, like the JSON formats
+        for line_number, row in enumerate(csv.DictReader(stream), 1):
+            yield line_number, _coerce_csv_row(row)
+    elif fmt in ('json', 'ndjson'):
+        yield from enumerate(_iter_json_values(stream, chunk_size), 1)
+    else:
+        raise ValueError(f'Unsupported invoice format: {fmt}')
+
+
+def _coerce_csv_row(row):
+    record = {name: (value.strip() or None) if isinstance(value, str) else value
+              for name, value in row.items() if name is not None}
+    for name in CSV_INT_COLUMNS:
+        value = record.get(name)
+        if value is not None and value.isdigit():
+            record[name] = int(value)
+    for name in CSV_NUMBER_COLUMNS:
+        value = record.get(name)
+        if value is not None:
+            try:
+                record[name] = int(value) if value.isdigit() else float(value)
+            except ValueError:
+                pass   # left as text: validation reports the type
+    return record
+
+
+def _iter_json_values(stream, chunk_size):
+    """
+    Values of a JSON array or of whitespace-separated JSON documents (NDJSON), decoded a chunk
+    at a time so the whole file is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof, started = '', 0, False, False
+    while True:
+        # Skip separators; the top-level array's brackets and commas are not part of any value
+        while position < len(buffer):
+            char = buffer[position]
+            if char == '[' and not started:
+                started = True
+            elif not (char.isspace() or char in ',]'):
+                break
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = stream.read(chunk_size), 0
+            eof = not buffer
+            continue
+        started = True
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError(f'Invalid JSON near: {buffer[position:position + 40]!r}')
+            # The value continues in the next chunk
+            more = stream.read(chunk_size)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+        if end == len(buffer) and not eof and not isinstance(value, (dict, list)):
+            # A bare number or literal may continue in the next chunk
+            more = stream.read(chunk_size)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+        position = end
+        yield value
+
+
+class InvoiceImporter:
+    def __init__(self, idempotency_index, batch_lines=500, batches_per_transaction=10, device_id='import',
+                 user_id=None, defaults=None, max_errors=100, progress=None, partitions=None):
+        """
+        defaults: invoice fields (invoice_number, supplier_id) for lines that leave them out.
+        partitions: the app's EventPartitions; earlier imports moved into them are found there too.
+        At most max_errors rejected lines are reported in full; all of them are counted.
+        progress is called with the stats dict after every transaction.
+        """
+        self.idempotency_index = idempotency_index
+        self.batch_lines = batch_lines
+        self.batches_per_transaction = batches_per_transaction
+        self.device_id = device_id
+        self.user_id = user_id
+        # Given as text (query string, command line): coerced like CSV columns
+        self.defaults = {name: value for name, value in _coerce_csv_row(defaults or {}).items() if value is not None}
+        self.max_errors = max_errors
+        self.progress = progress
+        self.partitions = partitions
+        self.stats = {'lines': 0, 'accepted_lines': 0, 'rejected_lines': 0, 'duplicate_lines': 0, 'events': 0,
+                      'duplicate_events': 0, 'transactions': 0, 'elapsed': 0.0}
+        self.errors = []         # [{line, errors}] of the first max_errors rejected lines
+        self._open = {}          # (supplier_id, invoice_number) -> (first line number, lines) of the batch being filled
+        self._sequence = {}      # (supplier_id, invoice_number) -> batches emitted so far
+        self._stored = {}        # (supplier_id, invoice_number) -> Counter of digests of stored lines not matched yet
+        self._ready = []         # (event, line count) waiting for the next transaction
+        self._started = None
+
+    def run(self, records):
+        """Import (line_number, record) pairs; returns the stats dict with 'errors' added."""
+        for line_number, record in records:
+            self.add(line_number, record)
+        return self.finish()
+
+    def add(self, line_number, record):
+        if self._started is None:
+            self._started = time.perf_counter()
+        self.stats['lines'] += 1
+        if isinstance(record, dict) and self.defaults:
+            record = {**self.defaults, **{name: value for name, value in record.items() if value is not None}}
+        errors = validate_invoice_line(record) if isinstance(record, dict) else ['Line must be a JSON object']
+        if errors:
+            self.stats['rejected_lines'] += 1
+            if len(self.errors) < self.max_errors:
+                self.errors.append({'line': line_number, 'errors': errors})
+            return
+        invoice = (record['supplier_id'], record['invoice_number'])
+        line = {name: value for name, value in record.items()
+                if name not in INVOICE_FIELDS and name in INVOICE_LINE_SCHEMA}
+        stored = self._stored.get(invoice)
+        if stored is None:
+            stored = self._stored[invoice] = self._load_stored_lines(invoice)
+        digest = line_digest(line)
+        if stored[digest]:
+            # Stored by an earlier import of this invoice
+            stored[digest] -= 1
+            self.stats['duplicate_lines'] += 1
+            return
+        first_line, lines = self._open.setdefault(invoice, (line_number, []))
+        lines.append(line)
+        if len(lines) >= self.batch_lines:
+            self._close_batch(invoice)
+
+    def finish(self):
+        for invoice in list(self._open):
+            self._close_batch(invoice)
+        self._commit()
+        return {**self.stats, 'errors': self.errors}
+
+    def _close_batch(self, invoice):
+        first_line, lines = self._open.pop(invoice)
+        sequence = self._sequence.get(invoice, 0)
+        self._sequence[invoice] = sequence + 1
+        supplier_id, invoice_number = invoice
+        self._ready.append(({
+            'event_type': INVOICE_BATCH_EVENT,
+            'device_id': self.device_id,
+            'user_id': self.user_id,
+            'idempotency_key': f'{invoice_key_prefix(supplier_id, invoice_number)}{first_line}:'
+                               f'{hashlib.blake2b(b"".join(map(line_digest, lines)), digest_size=8).hexdigest()}',
+            'payload': {'invoice_number': invoice_number, 'supplier_id': supplier_id, 'batch': sequence,
+                        'first_line': first_line, 'lines': lines},
+        }, len(lines)))
+        if len(self._ready) >= self.batches_per_transaction:
+            self._commit()
+
+    def _load_stored_lines(self, invoice):
+        supplier_id, invoice_number = invoice
+        prefix = invoice_key_prefix(supplier_id, invoice_number)
+        stored = Counter()
+        tables = self.partitions.sources() if self.partitions is not None else [SyncEvent.__table__]
+        for table in tables:
+            # A key range rather than LIKE, so the idempotency key index is searched instead of the table scanned
+            rows = db.session.execute(
+                db.select(table.c.payload).where(table.c.idempotency_key >= prefix,
+                                                 table.c.idempotency_key < prefix + '\uffff',
+                                                 table.c.event_type == INVOICE_BATCH_EVENT))
+            for (payload,) in rows:
+                # The prefix also matches invoice numbers that extend this one with ':'
+                if str(payload.get('supplier_id')) == str(supplier_id) and payload.get('invoice_number') == invoice_number:
+                    stored.update(line_digest(line) for line in payload['lines'])
+        return stored
+
+    def _commit(self):
+        if not self._ready:
+            return
+        events = [event for event, _ in self._ready]
+        result = ingest_events(events, self.idempotency_index, operation='invoice_import', device_id=self.device_id)
+        for item in result['accepted']:
+            self.stats['events'] += 1
+            self.stats['accepted_lines'] += self._ready[item['index']][1]
+        self.stats['duplicate_events'] += len(result['duplicates'])
+        self.stats['transactions'] += 1
+        self.stats['elapsed'] = round(time.perf_counter() - self._started, 3) if self._started else 0.0
+        self._ready = []
+        if self.progress is not None:
+            self.progress(dict(self.stats))
+
+
+def text_stream(binary):
+    """A UTF-8 text view of a binary stream (e.g. a request body), read as it arrives."""
+    if isinstance(binary, io.RawIOBase):
+        binary = io.BufferedReader(binary)
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def create_invoice_importer(**kwargs):
+    """An InvoiceImporter with the current app's idempotency index and configured batch sizes."""
+    return InvoiceImporter(current_app.idempotency_index, current_app.config['INVOICE_IMPORT_BATCH_LINES'],
+                           current_app.config['INVOICE_IMPORT_TRANSACTION_BATCHES'],
+                           partitions=current_app.event_partitions, **kwargs)
+
+
+invoices_cli = AppGroup('invoices', help='Import supplier invoice files.')
+
+
+@invoices_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'ndjson']), default=None,
+              help='File format (default: from the file extension).')
+@click.option('--supplier-id', default=None, help='Supplier of lines without a supplier_id column.')
+@click.option('--invoice-number', default=None, help='Invoice of lines without an invoice_number column.')
+@click.option('--device-id', default='import', show_default=True, help='device_id of the imported events.')
+def import_command(path, fmt, supplier_id, invoice_number, device_id):
+    """Import an invoice file as grouped invoice_batch events."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'json')
+    importer = create_invoice_importer(
+        device_id=device_id, defaults={'supplier_id': supplier_id, 'invoice_number': invoice_number},
+        progress=lambda stats: click.echo(f"{stats['lines']} lines read, {stats['accepted_lines']} stored "
+                                          f"in {stats['events']} events ({stats['elapsed']:.1f}s)"))
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        result = importer.run(read_invoice_lines(stream, fmt))
+    for error in result['errors']:
+        click.echo(f"line {error['line']}: {'; '.join(error['errors'])}", err=True)
+    click.echo(f"Imported {result['accepted_lines']} of {result['lines']} lines as {result['events']} events "
+               f"({result['duplicate_lines']} already imported, {result['rejected_lines']} rejected)")
@@ -0,0 +1,137 @@
+"""
+Field-level three-way merge of record versions (e.g. a product edited on two tills while offline).
+
+three_way_merge(base, ours, theirs) compares both edited versions with their common ancestor
+field by field, descending into nested objects. A field changed on one side only takes that
+side's value. A field changed identically on both sides is taken once. A field changed
+differently on both sides is a conflict. It is settled by the `prefer` side and reported, except
+for `additive` fields (stock counters): there both changes are kept by applying both deltas
+to the ancestor's value. Lists and scalars are compared as whole values.
+
+MergeEngine runs large batches (e.g. a bulk price-list update) on a small process pool, so the
+merge work runs on other cores and is not held behind the GIL with the request threads.
+
+The server is multithreaded by the time the first batch arrives. Forking it then could leave a
+worker waiting forever on a lock that another thread held (logging, the SQLAlchemy pool). So
+workers are forked from a forkserver, a fresh single-threaded process that has imported this
+module, or spawned where forkserver is unavailable. Either way a worker imports the server's
+entry module as __mp_main__. run.py and app.py skip building the app in that case.
+"""
+
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+
+class _Missing:
+    """A field absent from one version (added or deleted on the other side)."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'   # unpickles to this module's singleton in pool workers
+
+
+MISSING = _Missing()
+
+# path: tuple of keys from the record root; resolved: the value kept in the merged record
+Conflict = namedtuple('Conflict', 'path base ours theirs resolved')
+MergeResult = namedtuple('MergeResult', 'merged conflicts')
+
+
+def three_way_merge(base, ours, theirs, prefer='ours', additive=()):
+    """
+    Merge two versions of a record against their common ancestor. base may be None when the
+    ancestor is unknown; then every field both sides set differently is a conflict.
+    Returns MergeResult(merged, conflicts).
+    """
+    if prefer not in ('ours', 'theirs'):
+        raise ValueError(f"prefer must be 'ours' or 'theirs', not {prefer!r}")
+    conflicts = []
+    merged = _merge((), MISSING if base is None else base, ours, theirs, prefer, frozenset(additive), conflicts)
+    return MergeResult(merged, conflicts)
+
+
+def _merge(path, base, ours, theirs, prefer, additive, conflicts):
+    if ours == theirs:
+        return ours
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in (*ours, *(key for key in theirs if key not in ours)):
+            value = _merge(path + (key,), base.get(key, MISSING), ours.get(key, MISSING),
+                           theirs.get(key, MISSING), prefer, additive, conflicts)
+            if value is not MISSING:
+                merged[key] = value
+        return merged
+    if path and path[-1] in additive and all(_is_number(v) for v in (base, ours, theirs)):
+        # Both sides moved a counter: keep both movements
+        return ours + theirs - base
+    resolved = ours if prefer == 'ours' else theirs
+    conflicts.append(Conflict(path, base, ours, theirs, resolved))
+    return resolved
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _merge_chunk(items, prefer, additive):
+    return [three_way_merge(base, ours, theirs, prefer, additive) for base, ours, theirs in items]
+
+
+class MergeEngine:
+    def __init__(self, workers=2, parallel_threshold=500, chunk_size=200):
+        """
+        Batches of at least parallel_threshold records are split into chunk_size chunks and merged
+        on a pool of `workers` processes (None: one per CPU; 0 or 1 merges everything inline).
+        """
+        self.workers = os.cpu_count() if workers is None else workers
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+        self.stats = {'batches': 0, 'parallel_batches': 0, 'records': 0, 'conflicts': 0}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def merge_many(self, items, prefer='ours', additive=()):
+        """Merge (base, ours, theirs) triples; returns their MergeResults in order."""
+        items = list(items)
+        additive = tuple(additive)
+        if self.workers and self.workers > 1 and len(items) >= self.parallel_threshold:
+            chunks = [items[start:start + self.chunk_size] for start in range(0, len(items), self.chunk_size)]
+            pool = self._executor()
+            results = [result for chunk in pool.map(_merge_chunk, chunks, [prefer] * len(chunks),
+                                                    [additive] * len(chunks))
+                       for result in chunk]
+            self.stats['parallel_batches'] += 1
+        else:
+            results = _merge_chunk(items, prefer, additive)
+        self.stats['batches'] += 1
+        self.stats['records'] += len(items)
+        self.stats['conflicts'] += sum(len(result.conflicts) for result in results)
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # Never fork the multithreaded server itself (see the module docstring)
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                context = multiprocessing.get_context(method)
+                if method == 'forkserver':
+                    context.set_forkserver_preload([__name__])
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+            return self._pool
@@ -0,0 +1,87 @@
+"""
+Local message bus for running several server worker processes side by side.
+Socket.IO emits made in one worker (SyncManager broadcasts, critical_event fan-out, flush
+credit grants) are published on the bus and replayed by every other worker to the clients
+it holds. The SQLite backend needs no broker: workers share a single database file and
+poll it for new messages.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from socketio.pubsub_manager import PubSubManager
+
+BUS_SCHEMES = ('sqlite',)
+
+
+def bus_path(url):
+    """Return the database file of a sqlite:/// bus URL (the same form SQLAlchemy uses)."""
+    scheme, sep, path = (url or '').partition(':///')
+    if not sep or scheme not in BUS_SCHEMES:
+        raise ValueError(f'Unsupported message bus URL {url!r}; expected one of: '
+                         + ', '.join(f'{s}:///path' for s in BUS_SCHEMES))
+    if not path:
+        raise ValueError('Message bus URL is missing a database path')
+    return path
+
+
+def connect_bus(path):
+    """Open a connection to a shared bus file; WAL lets workers publish while others read."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class SQLiteMessageBus(PubSubManager):
+    """Socket.IO client manager that exchanges pub/sub messages through a SQLite table."""
+    name = 'sqlite'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, json=None,
+                 poll_interval=0.02, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = bus_path(url)
+        self.poll_interval = poll_interval
+        self.retention = retention     # seconds a message is kept for slow listeners
+        self._published = 0
+        self._lock = threading.Lock()
+        self._conn = connect_bus(self.path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS bus_messages ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+            'created REAL NOT NULL, data TEXT NOT NULL)')
+        # Listening starts from messages published after this worker came up
+        self._start_id = self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM bus_messages').fetchone()[0]
+
+    def _publish(self, data):
+        """Append a message to the bus; old messages are pruned every few hundred publishes."""
+        message = self.json.dumps(data)
+        with self._lock:
+            self._conn.execute('INSERT INTO bus_messages (channel, created, data) VALUES (?, ?, ?)',
+                               (self.channel, time.time(), message))
+            self._published += 1
+            if self._published % 500 == 0:
+                self._conn.execute('DELETE FROM bus_messages WHERE created < ?', (time.time() - self.retention,))
+
+    def _listen(self):
+        """Yield messages published after this worker started, polling the bus table in id order."""
+        conn = connect_bus(self.path)
+        last_id = self._start_id
+        sleep = self.server.sleep if self.server is not None else time.sleep
+        while True:
+            rows = conn.execute('SELECT id, data FROM bus_messages WHERE id > ? AND channel = ? ORDER BY id',
+                                (last_id, self.channel)).fetchall()
+            for last_id, data in rows:
+                yield data
+            if not rows:
+                sleep(self.poll_interval)
+
+
+def create_message_bus(url, channel='socketio', write_only=False):
+    """Build the Socket.IO client manager for MESSAGE_BUS_URL; None keeps the in-process manager."""
+    if not url:
+        return None
+    return SQLiteMessageBus(url, channel=channel, write_only=write_only)
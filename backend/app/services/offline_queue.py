@@ -0,0 +1,270 @@
+"""
+OfflineQueue: Durable, memory-bounded FIFO of events a device could not send yet.
+
+Every event is appended to an append-only log of memory-mapped segment files before
+append() returns, so a crash or power cut (with fsync on) loses nothing. The front of the
+queue is also cached in a RingBuffer bounded by a slot count and a byte budget. While the
+cache has room, draining never reads the files. Once it is full, later events live only in
+the log ("spilled") and are read back through the mmap as the front is acknowledged. A long
+outage therefore costs disk space, not memory.
+
+Log records: <u32 length><u32 crc32><u64 seq><payload JSON>. A zero length marks the end of
+a segment's data. On open, records after the last valid one (a torn write) are discarded.
+The `ack` file holds the highest acknowledged sequence number. Fully acknowledged segments
+are deleted.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from app.utils.event_encoding import json_dumps, json_loads
+
+RECORD_HEADER = struct.Struct('<IIQ')
+ACK_RECORD = struct.Struct('<QI')
+SEGMENT_SUFFIX = '.seg'
+
+
+class RingBuffer:
+    """Fixed-slot circular FIFO whose items also count against a byte budget."""
+
+    def __init__(self, slots, max_bytes):
+        self._slots = [None] * slots
+        self._head = 0
+        self._count = 0
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, item, size):
+        """Append item (size bytes); False when the slots or the budget are used up. An empty buffer takes anything."""
+        if self._count and (self._count == len(self._slots) or self.bytes + size > self.max_bytes):
+            return False
+        self._slots[(self._head + self._count) % len(self._slots)] = (item, size)
+        self._count += 1
+        self.bytes += size
+        return True
+
+    def peek(self, n):
+        return [self._slots[(self._head + i) % len(self._slots)][0] for i in range(min(n, self._count))]
+
+    def pop(self):
+        item, size = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % len(self._slots)
+        self._count -= 1
+        self.bytes -= size
+        return item
+
+
+class Segment:
+    """A memory-mapped, preallocated file of CRC-checked records (also used by the master's EventLog)."""
+
+    def __init__(self, path, first_seq, size):
+        self.path = path
+        self.first_seq = first_seq
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)   # sparse: zero-filled, so an unwritten header reads as length 0
+        self.size = os.fstat(self.fd).st_size
+        self.mm = mmap.mmap(self.fd, self.size)
+        self.end = 0   # offset after the last valid record
+
+    def read(self, offset):
+        """(seq, payload, next offset) of the record at offset, or None at the end of valid data."""
+        if offset + RECORD_HEADER.size > self.size:
+            return None
+        length, crc, seq = RECORD_HEADER.unpack_from(self.mm, offset)
+        start = offset + RECORD_HEADER.size
+        if length == 0 or start + length > self.size:
+            return None
+        payload = self.mm[start:start + length]
+        if zlib.crc32(payload, seq) != crc:
+            return None
+        return seq, payload, start + length
+
+    def write(self, seq, payload):
+        offset = self.end
+        self.mm[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + len(payload)] = payload
+        # Header last: a record is only visible once it is complete
+        RECORD_HEADER.pack_into(self.mm, offset, len(payload), zlib.crc32(payload, seq), seq)
+        self.end = offset + RECORD_HEADER.size + len(payload)
+
+    def close(self):
+        self.mm.close()
+        os.close(self.fd)
+
+
+class OfflineQueue:
+    def __init__(self, directory, memory_bytes=2 * 1024 * 1024, memory_events=4096,
+                 segment_bytes=4 * 1024 * 1024, fsync=True):
+        """Open (or recover) the queue stored in directory."""
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.stats = {'appended': 0, 'acked': 0, 'spilled': 0, 'recovered': 0, 'torn_records': 0}
+        self._ring = RingBuffer(memory_events, memory_bytes)
+        self._lock = threading.Lock()
+        self._segments = []
+        self._spilled = 0          # queued events held only in the log
+        self._cursor = None        # (segment, offset) of the first spilled event
+        os.makedirs(directory, exist_ok=True)
+        self._acked = self._read_ack()
+        self._next_seq = self._acked + 1
+        self._recover()
+
+    def __len__(self):
+        return len(self._ring) + self._spilled
+
+    @property
+    def memory_bytes(self):
+        return self._ring.bytes
+
+    # -- public API ------------------------------------------------------------------------------
+
+    def append(self, record):
+        """Durably append a JSON-serializable record; returns its sequence number."""
+        payload = json_dumps(record)
+        with self._lock:
+            seq = self._next_seq
+            segment = self._writable_segment(len(payload))
+            offset = segment.end
+            segment.write(seq, payload)
+            if self.fsync:
+                segment.mm.flush()
+            self._next_seq += 1
+            self.stats['appended'] += 1
+            self._hold(seq, payload, segment, offset)
+            return seq
+
+    def peek(self, n):
+        """The first n queued (seq, record) pairs, oldest first (they stay queued until ack())."""
+        with self._lock:
+            return [(seq, json_loads(payload)) for seq, payload in self._ring.peek(n)]
+
+    def ack(self, seq):
+        """Remove every queued record up to and including seq."""
+        with self._lock:
+            while len(self._ring) and self._ring.peek(1)[0][0] <= seq:
+                self._ring.pop()
+                self.stats['acked'] += 1
+            self._acked = max(self._acked, seq)
+            self._write_ack()
+            self._drop_acked_segments()
+            self._refill()
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    # -- internals -------------------------------------------------------------------------------
+
+    def _hold(self, seq, payload, segment, offset):
+        # Keep FIFO order: once anything is spilled, newer records are spilled too
+        if not self._spilled and self._ring.push((seq, payload), len(payload) + RECORD_HEADER.size):
+            return
+        if not self._spilled:
+            self._cursor = (segment, offset)
+        self._spilled += 1
+        self.stats['spilled'] += 1
+
+    def _refill(self):
+        """Move spilled records into the ring buffer until it is full again."""
+        while self._spilled:
+            segment, offset = self._cursor
+            record = segment.read(offset) if offset < segment.end else None
+            if record is None:
+                segment = self._segments[self._segments.index(segment) + 1]
+                self._cursor = (segment, 0)
+                continue
+            seq, payload, next_offset = record
+            if not self._ring.push((seq, payload), len(payload) + RECORD_HEADER.size):
+                return
+            self._cursor = (segment, next_offset)
+            self._spilled -= 1
+        self._cursor = None
+
+    def _writable_segment(self, payload_size):
+        needed = RECORD_HEADER.size + payload_size + RECORD_HEADER.size
+        if self._segments and self._segments[-1].end + needed <= self._segments[-1].size:
+            return self._segments[-1]
+        if self._segments:
+            self._segments[-1].mm.flush()
+        path = os.path.join(self.directory, f'{self._next_seq:020d}{SEGMENT_SUFFIX}')
+        segment = Segment(path, self._next_seq, max(self.segment_bytes, needed))
+        self._segments.append(segment)
+        if self.fsync:
+            self._sync_directory()
+        return segment
+
+    def _drop_acked_segments(self):
+        if not len(self) and self._segments:
+            # Fully drained: start the next append on a fresh segment
+            for segment in self._segments:
+                segment.close()
+                os.remove(segment.path)
+            self._segments = []
+            return
+        while len(self._segments) > 1 and self._segments[1].first_seq <= self._acked + 1:
+            segment = self._segments.pop(0)
+            segment.close()
+            os.remove(segment.path)
+
+    def _recover(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if os.path.getsize(path) == 0:
+                os.remove(path)   # crashed between creating and sizing the file
+                continue
+            segment = Segment(path, int(name[:-len(SEGMENT_SUFFIX)]), 0)
+            self._segments.append(segment)
+            offset = 0
+            while True:
+                record = segment.read(offset)
+                if record is None:
+                    break
+                seq, payload, next_offset = record
+                segment.end = next_offset
+                if seq > self._acked:
+                    self._hold(seq, payload, segment, offset)
+                    self.stats['recovered'] += 1
+                self._next_seq = max(self._next_seq, seq + 1)
+                offset = next_offset
+            if offset + RECORD_HEADER.size <= segment.size and segment.mm[offset:offset + 4] != b'\0\0\0\0':
+                self.stats['torn_records'] += 1
+        if self._segments:
+            # Never append after a torn record: later data goes to a new segment
+            last = self._segments[-1]
+            last.size = last.end
+        self._drop_acked_segments()
+
+    def _read_ack(self):
+        try:
+            with open(os.path.join(self.directory, 'ack'), 'rb') as fh:
+                seq, crc = ACK_RECORD.unpack(fh.read(ACK_RECORD.size))
+        except (FileNotFoundError, struct.error):
+            return 0
+        return seq if zlib.crc32(struct.pack('<Q', seq)) == crc else 0
+
+    def _write_ack(self):
+        path = os.path.join(self.directory, 'ack')
+        with open(path + '.tmp', 'wb') as fh:
+            fh.write(ACK_RECORD.pack(self._acked, zlib.crc32(struct.pack('<Q', self._acked))))
+            if self.fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
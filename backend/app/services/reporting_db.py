@@ -0,0 +1,126 @@
+"""
+ReportingDatabase: Read-only connections for history and reporting queries.
+
+/sync/status, /sync/export/* and /sync/audit read through their own small connection pool
+instead of the session /sync/push writes through, so a long report never holds a connection
+or lock that a sync writer is waiting on. The primary database is switched to WAL journaling,
+where readers work on a snapshot and never block writers (nor writers them).
+
+Modes (REPORTING_DB_MODE):
+  snapshot  read-only (query_only) connections to the live database file (default)
+  replica   connections to a copy of the database refreshed with the SQLite backup API once
+            it is older than REPORTING_REPLICA_MAX_AGE seconds; reports may lag by that much
+  primary   no isolation: reports use the application session (also used for in-memory databases)
+"""
+
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+
+logger = logging.getLogger('app.reporting_db')
+
+REPORTING_MODES = ('snapshot', 'replica', 'primary')
+
+
+def sqlite_file(uri):
+    """Path of the SQLite database file behind uri, or None for other backends and in-memory databases."""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+
+def enable_wal(engine):
+    """Put the SQLite database behind engine in WAL mode as connections are opened (persists in the file)."""
+    @event.listens_for(engine, 'connect')
+    def _set_wal(dbapi_connection, connection_record):
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+
+class ReportingDatabase:
+    def __init__(self, uri, mode='snapshot', pool_size=4, replica_path=None, replica_max_age=30):
+        """uri is the primary SQLALCHEMY_DATABASE_URI; modes other than 'primary' need an SQLite file."""
+        if mode not in REPORTING_MODES:
+            raise ValueError(f'Unsupported reporting mode: {mode}. Use one of: {", ".join(REPORTING_MODES)}')
+        self.path = sqlite_file(uri)
+        self.mode = mode if self.path else 'primary'
+        self.replica_path = replica_path or (f'{self.path}.replica' if self.path else None)
+        self.replica_max_age = replica_max_age
+        self.refreshed_at = None
+        self.refreshes = 0
+        self._refresh_lock = threading.Lock()
+        self.engine = None
+        if self.mode != 'primary':
+            target = self.path if self.mode == 'snapshot' else self.replica_path
+            self.engine = create_engine(f'sqlite:///{target}', pool_size=pool_size, max_overflow=0)
+
+            @event.listens_for(self.engine, 'connect')
+            def _read_only(dbapi_connection, connection_record):
+                dbapi_connection.execute('PRAGMA query_only=ON')
+                # pysqlite does not open a transaction for SELECTs; BEGIN explicitly (below) so every
+                # query of one report reads the same snapshot
+                dbapi_connection.isolation_level = None
+
+            @event.listens_for(self.engine, 'begin')
+            def _begin_snapshot(connection):
+                # On the driver connection, so statement hooks (profiler, metrics) only see the report's queries
+                connection.connection.driver_connection.execute('BEGIN')
+
+    @property
+    def isolated(self):
+        return self.engine is not None
+
+    def bind(self):
+        """Engine reporting queries run on (the primary engine when not isolated)."""
+        if self.mode == 'replica':
+            self.refresh_if_stale()
+        return self.engine if self.isolated else db.engine
+
+    @contextlib.contextmanager
+    def session(self):
+        """ORM session for one reporting request; closed (and its connection returned) on exit."""
+        if not self.isolated:
+            yield db.session
+            return
+        session = Session(bind=self.bind())
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def refresh_if_stale(self):
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.replica_max_age:
+            # One request refreshes; concurrent ones keep reading the current copy
+            if self._refresh_lock.acquire(blocking=self.refreshed_at is None):
+                try:
+                    self.refresh()
+                finally:
+                    self._refresh_lock.release()
+
+    def refresh(self):
+        """Copy the primary database into a new replica file with the backup API and swap it in."""
+        started = time.perf_counter()
+        staging = f'{self.replica_path}.tmp'
+        source = sqlite3.connect(self.path)
+        target = sqlite3.connect(staging)
+        try:
+            # A single step reads one WAL snapshot, so the copy is consistent and writers keep going
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.replace(staging, self.replica_path)
+        # Pooled connections still hold the previous file; new checkouts open the new copy
+        self.engine.dispose()
+        self.refreshed_at = time.monotonic()
+        self.refreshes += 1
+        logger.info('Reporting replica refreshed in %.1f ms', (time.perf_counter() - started) * 1000)
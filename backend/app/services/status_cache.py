@@ -0,0 +1,192 @@
+"""
+StatusCache: Bounded LRU/TTL cache of /sync/status responses with write-driven invalidation.
+
+Dashboards poll /sync/status for the same devices every few seconds. The encoded response is
+cached under (device_id, user_id, limit) for up to STATUS_CACHE_TTL seconds, holding at most
+STATUS_CACHE_SIZE entries. Each entry is tagged with its device and user.
+
+Session listeners collect the devices and users of every SyncEvent a transaction inserts,
+updates or deletes. That covers ORM objects, bulk INSERTs (their parameters) and bulk UPDATEs
+(a SELECT with the statement's WHERE clause, run just before it). After the commit, the entries
+with those tags are dropped. Other entries stay. Every invalidation also takes a sequence
+number. A response computed from a read that began before an invalidation of one of its tags
+is not stored, so a cached response never predates a committed write.
+
+With a message bus, commits in other worker processes do not reach this cache. Entries are
+then also checked against the shared event watermark, and any change to sync_events expires
+them.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.models.sync_event import SyncEvent
+
+ALL = ('all',)   # tag of a write whose devices and users are unknown (e.g. an unfiltered DELETE)
+
+_listeners_installed = False
+
+
+def status_tags(device_id, user_id):
+    tags = []
+    if device_id:
+        tags.append(('device', device_id))
+    if user_id:
+        tags.append(('user', user_id))
+    return tags
+
+
+class StatusCache:
+    def __init__(self, max_entries=1024, ttl=30.0, watermark=None, clock=time.monotonic):
+        """watermark: the shared EventWatermark when several worker processes write sync_events."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.watermark = watermark
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0, 'discarded_fills': 0}
+        self._entries = OrderedDict()   # key -> (body, expires, watermark version), least recently used first
+        self._by_tag = {}               # tag -> keys of the entries carrying it
+        self._seq = 0                   # invalidation sequence number
+        self._tag_seq = OrderedDict()   # tag -> sequence number of its last invalidation
+        self._floor = 0                 # last invalidation of any tag no longer in _tag_seq
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def snapshot(self):
+        """Counters plus size and hit rate, for /sync/cache/stats."""
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'hit_rate': round(self.hit_rate(), 4)}
+
+    def get(self, key):
+        """The cached body for key, or None."""
+        version = self.watermark.version if self.watermark is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.clock() and entry[2] == version:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.stats['misses'] += 1
+            return None
+
+    def begin(self):
+        """Token to pass to put() for a response about to be computed; take it before reading."""
+        version = self.watermark.version if self.watermark is not None else None
+        with self._lock:
+            return self._seq, version
+
+    def put(self, key, body, token):
+        """Store body unless one of its tags was invalidated after token was taken."""
+        seq, version = token
+        tags = status_tags(key[0], key[1])
+        with self._lock:
+            if any(self._tag_seq.get(tag, self._floor) > seq for tag in tags):
+                self.stats['discarded_fills'] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, self.clock() + self.ttl, version)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def invalidate(self, tags):
+        """Drop the entries of these ('device', id) / ('user', id) tags, or all of them for ALL."""
+        with self._lock:
+            self._seq += 1
+            self.stats['invalidations'] += 1
+            if ALL in tags:
+                self._floor = self._seq
+                self._tag_seq.clear()
+                self._entries.clear()
+                self._by_tag.clear()
+                return
+            for tag in tags:
+                self._tag_seq.pop(tag, None)
+                self._tag_seq[tag] = self._seq
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+            # Forget the oldest invalidations; put() then treats their tags as invalidated at _floor
+            while len(self._tag_seq) > 4 * self.max_entries:
+                _, seq = self._tag_seq.popitem(last=False)
+                self._floor = max(self._floor, seq)
+
+    def _remove(self, key):
+        del self._entries[key]
+        for tag in status_tags(key[0], key[1]):
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+def _active_cache():
+    return getattr(current_app, 'status_cache', None) if has_app_context() else None
+
+
+def install_status_cache_listeners():
+    """Invalidate the current app's status cache after commits that changed sync_events. Installed once per process."""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+
+    @event.listens_for(Session, 'after_flush')
+    def _after_flush(session, flush_context):
+        if _active_cache() is None:
+            return
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, SyncEvent):
+                session.info.setdefault('status_cache_tags', set()).update(status_tags(obj.device_id, obj.user_id))
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _on_execute(orm_execute_state):
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+            return
+        if getattr(orm_execute_state.statement.table, 'name', None) != SyncEvent.__tablename__ or \
+                _active_cache() is None:
+            return
+        session = orm_execute_state.session
+        tags = session.info.setdefault('status_cache_tags', set())
+        statement = orm_execute_state.statement
+        if orm_execute_state.is_insert and orm_execute_state.parameters:
+            # Bulk INSERT (e.g. the group-commit writer): the rows are in the parameters
+            parameters = orm_execute_state.parameters
+            for row in (parameters if isinstance(parameters, list) else [parameters]):
+                tags.update(status_tags(row.get('device_id'), row.get('user_id')))
+        elif orm_execute_state.is_update and statement.whereclause is not None:
+            # Bulk UPDATE (e.g. periodic sync marking events synced): find the rows it is about to change
+            rows = session.execute(select(SyncEvent.device_id, SyncEvent.user_id)
+                                   .where(statement.whereclause).distinct())
+            for device_id, user_id in rows:
+                tags.update(status_tags(device_id, user_id))
+        else:
+            tags.add(ALL)
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        tags = session.info.pop('status_cache_tags', None)
+        cache = _active_cache()
+        if tags and cache is not None:
+            cache.invalidate(tags)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(session):
+        session.info.pop('status_cache_tags', None)
+
+    _listeners_installed = True
@@ -1,21 +1,129 @@
 """
 SyncManager: Handles core synchronization logic between devices and the master node.
 Responsible for queuing events, triggering sync, and managing periodic and immediate syncs.
+
+On a device, queue_event() stores each pending action in a durable OfflineQueue and
+perform_periodic_sync() drains it to the master in order. Draining stops at the first
+failure (the router is down) and resumes from the same event on the next call. Every
+queued event carries an idempotency key, so an event resent after a crash between sending
+and acknowledging it is dropped by the master as a duplicate.
 """
 
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+import uuid
+
+from app.services.offline_queue import OfflineQueue
+from app.utils.event_encoding import json_dumps
+
+logger = logging.getLogger('app.sync_manager')
+
+
+class RejectedEvent(Exception):
+    """The master refused an event as invalid; resending it will never succeed."""
+
+
+class HttpPushTransport:
+    """Send one queued event to the master's /sync/push."""
+
+    def __init__(self, master_url, timeout=10):
+        self.url = master_url.rstrip('/') + '/sync/push'
+        self.timeout = timeout
+
+    def __call__(self, event):
+        request = urllib.request.Request(self.url, data=json_dumps(event), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 400:
+                raise RejectedEvent(e.read().decode(errors='replace')) from e
+            raise
+
+
 class SyncManager:
-    def __init__(self):
-        """Initialize SyncManager state and dependencies."""
-        pass  # TODO: Add initialization logic
+    def __init__(self, queue_dir=None, transport=None, memory_bytes=2 * 1024 * 1024, memory_events=4096,
+                 segment_bytes=4 * 1024 * 1024, fsync=True, batch_size=100):
+        """
+        Initialize SyncManager state and dependencies. The offline queue in queue_dir is opened
+        on first use; transport(event) sends one event to the master and raises when it cannot.
+        """
+        self.queue_dir = queue_dir
+        self.transport = transport
+        self.batch_size = batch_size
+        self._queue_options = {'memory_bytes': memory_bytes, 'memory_events': memory_events,
+                               'segment_bytes': segment_bytes, 'fsync': fsync}
+        self._queue = None
+        self._open_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            with self._open_lock:
+                if self._queue is None:
+                    if not self.queue_dir:
+                        raise RuntimeError('No offline queue directory configured (OFFLINE_QUEUE_DIR)')
+                    self._queue = OfflineQueue(self.queue_dir, **self._queue_options)
+        return self._queue
 
     def queue_event(self, event):
-        """Queue a sync event for later synchronization."""
-        pass  # TODO: Implement event queuing
+        """
+        Queue a sync event for later synchronization. The event is on disk when this returns;
+        returns its idempotency key (assigned here when the event has none).
+        """
+        if not event.get('idempotency_key'):
+            event = {**event, 'idempotency_key': uuid.uuid4().hex}
+        self.queue.append(event)
+        return event['idempotency_key']
 
     def perform_periodic_sync(self):
-        """Perform periodic sync of queued events (e.g., every 30 seconds)."""
-        pass  # TODO: Implement periodic sync logic
+        """
+        Perform periodic sync of queued events (e.g., every 30 seconds): send them to the master
+        oldest first until the queue is empty or sending fails.
+        Returns {'sent', 'rejected', 'remaining', 'error'}.
+        """
+        if self.transport is None:
+            raise RuntimeError('No transport to the master configured (SYNC_MASTER_URL)')
+        result = {'sent': 0, 'rejected': 0, 'remaining': 0, 'error': None}
+        # One drain at a time keeps events in order even if syncs overlap
+        with self._drain_lock:
+            queue = self.queue
+            while True:
+                batch = queue.peek(self.batch_size)
+                if not batch:
+                    break
+                delivered = None
+                for seq, event in batch:
+                    try:
+                        self.transport(event)
+                        result['sent'] += 1
+                    except RejectedEvent as e:
+                        # Keep the event for inspection instead of blocking the queue forever
+                        self._dead_letter(event, str(e))
+                        result['rejected'] += 1
+                    except Exception as e:
+                        result['error'] = str(e)
+                        break
+                    delivered = seq
+                if delivered is not None:
+                    queue.ack(delivered)
+                if result['error']:
+                    logger.info('Offline queue drain stopped after %d events: %s', result['sent'], result['error'])
+                    break
+            result['remaining'] = len(queue)
+        return result
 
     def perform_immediate_sync(self, event):
         """Immediately sync a critical event and broadcast if needed."""
-        pass  # TODO: Implement immediate sync logic 
\ No newline at end of file
+        pass  # TODO: Implement immediate sync logic
+
+    def _dead_letter(self, event, reason):
+        logger.warning('Event %s rejected by the master: %s', event.get('idempotency_key'), reason)
+        with open(os.path.join(self.queue_dir, 'rejected.ndjson'), 'ab') as fh:
+            fh.write(json_dumps({'event': event, 'reason': reason}) + b'\n')
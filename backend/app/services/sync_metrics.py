@@ -0,0 +1,117 @@
+"""
+Metrics for the sync hot paths, registered in the process-wide registry and exported at /metrics.
+init_metrics(app) wires the database timings (SQLAlchemy events) and the scrape-time gauges.
+"""
+
+import time
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.utils.event_schemas import event_schemas
+from app.utils.metrics import DEFAULT_SIZE_BUCKETS, metrics
+from app.utils.startup import startup
+
+PUSH_LATENCY = metrics.histogram('sync_push_latency_seconds', 'Latency of /sync/push requests')
+PULL_LATENCY = metrics.histogram('sync_pull_latency_seconds', 'Latency of /sync/pull requests')
+DB_COMMIT = metrics.histogram('sync_db_commit_seconds', 'ORM session commit time (flush + COMMIT)')
+DB_TRANSACTION = metrics.histogram('sync_db_transaction_seconds', 'Time from BEGIN to COMMIT on a pooled connection')
+BROADCAST_FANOUT = metrics.histogram('sync_broadcast_fanout_seconds', 'Time to fan a broadcast out to all connected clients', ('event',))
+PUSH_BATCH_SIZE = metrics.histogram('sync_push_batch_size', 'Pushes committed together by the group-commit writer', (),
+                                    (1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+ADMISSION_REJECTED = metrics.counter('sync_admission_rejected', 'Requests and Socket.IO events refused by admission control',
+                                     ('traffic', 'limit'))
+EVENT_STAGE_LATENCY = metrics.histogram('sync_event_stage_seconds', 'Latency of each stage of sampled sync events, push to first acknowledgement',
+                                        ('stage', 'event_type'), (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                                                  1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+PAYLOAD_BYTES = metrics.histogram('sync_payload_bytes', 'Request/response payload sizes of the sync routes', ('route',), DEFAULT_SIZE_BUCKETS)
+
+_session_listeners_installed = False
+
+
+def _events_by_status():
+    """Pending and queued SyncEvent counts (one GROUP BY over the status index)."""
+    rows = db.session.execute(
+        select(SyncEvent.status, func.count()).where(SyncEvent.status.in_(('pending', 'queued'))).group_by(SyncEvent.status)
+    ).all()
+    counts = {('pending',): 0, ('queued',): 0}
+    counts.update({(status,): count for status, count in rows})
+    return counts
+
+
+def _validation_cost():
+    return {(event_type,): stats['mean_us'] / 1e6 for event_type, stats in event_schemas.stats().items()}
+
+
+def _startup_phases():
+    # A phase that ran more than once (several create_app calls in one process) reports its latest run
+    return {(phase['name'],): phase['seconds'] for phase in startup.phases}
+
+
+def _startup_milestones():
+    return {(name,): seconds for name, seconds in startup.milestones.items()}
+
+
+def _install_session_listeners():
+    """Time ORM commits. Session events are class-wide, so install them once per process."""
+    global _session_listeners_installed
+    if _session_listeners_installed:
+        return
+
+    @event.listens_for(Session, 'before_commit')
+    def _before_commit(session):
+        session.info['commit_started'] = time.perf_counter()
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        started = session.info.pop('commit_started', None)
+        if started is not None:
+            DB_COMMIT.observe(time.perf_counter() - started)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(session):
+        session.info.pop('commit_started', None)
+
+    _session_listeners_installed = True
+
+
+def _install_engine_listeners(engine):
+    """Time transactions on the connection level using engine events."""
+    def _on_begin(conn):
+        conn.info['txn_started'] = time.perf_counter()
+
+    def _on_commit(conn):
+        started = conn.info.pop('txn_started', None)
+        if started is not None:
+            DB_TRANSACTION.observe(time.perf_counter() - started)
+
+    def _on_rollback(conn):
+        conn.info.pop('txn_started', None)
+
+    if not event.contains(engine, 'begin', _on_begin):
+        event.listen(engine, 'begin', _on_begin)
+        event.listen(engine, 'commit', _on_commit)
+        event.listen(engine, 'rollback', _on_rollback)
+
+
+def init_metrics(app):
+    """Install database timing listeners and scrape-time gauges for this app. Call inside an app context."""
+    _install_session_listeners()
+    _install_engine_listeners(db.engine)
+    metrics.gauge('sync_events', 'SyncEvent rows waiting to be synced, by status', ('status',), collect=_events_by_status)
+    metrics.gauge('sync_connected_devices', 'Devices registered over Socket.IO').set_function(
+        app.device_registry.count)
+    metrics.gauge('sync_flush_credits_in_flight', 'Offline queue flush credits granted or being processed').set_function(
+        app.flush_controller.in_flight)
+    metrics.gauge('sync_validation_mean_seconds', 'Mean validation cost per event, by event_type', ('event_type',),
+                  collect=_validation_cost)
+    metrics.gauge('sync_startup_phase_seconds', 'Duration of each server boot phase', ('phase',),
+                  collect=_startup_phases)
+    if app.status_cache is not None:
+        cache = app.status_cache
+        metrics.gauge('sync_status_cache_lookups', '/sync/status cache lookups since start, by result', ('result',),
+                      collect=lambda: {('hit',): cache.stats['hits'], ('miss',): cache.stats['misses']})
+        metrics.gauge('sync_status_cache_hit_ratio', 'Share of /sync/status requests served from the cache').set_function(
+            cache.hit_rate)
+    metrics.gauge('sync_startup_milestone_seconds', 'Seconds from process start to each startup milestone',
+                  ('milestone',), collect=_startup_milestones)
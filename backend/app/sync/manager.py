@@ -1,7 +1,14 @@
+from flask import current_app
 from app.extensions import db, socketio
 from app.models.sync_event import SyncEvent
 from app.services.conflict_resolver import ConflictResolver
 from app.models.sync_audit_log import SyncAuditLog
+from app.services.sync_metrics import BROADCAST_FANOUT
+from app.utils.event_encoding import EncodedEvent, event_row, select_events
+from sqlalchemy import update
+
+# Event ids per UPDATE when marking broadcast events synced, well under SQLite's host-parameter limit
+SYNCED_UPDATE_CHUNK = 500
 
 class SyncManager:
     """
@@ -27,43 +34,62 @@ class SyncManager:
 
     def periodic_sync(self):
         """Trigger periodic sync for queued changes (to be called every 30 seconds)."""
-        # Query all pending (non-critical) sync events
-        pending_events = SyncEvent.query.filter(SyncEvent.status == 'pending').all()
-        for event in pending_events:
+        event_log = current_app.event_log
+        if event_log is not None:
+            # Pending events read from the event log's segment files, already encoded
+            pending_events = event_log.pending_events()
+        else:
+            # Query all pending (non-critical) sync events as column tuples; no ORM objects are built
+            pending_events = [(row.id, row.device_id, row.user_id, row)
+                              for row in db.session.execute(select_events(SyncEvent.status == 'pending')).all()]
+        tracer = current_app.event_tracer
+        synced_ids = []
+        for event_id, device_id, user_id, event in pending_events:
             try:
-                # Broadcast event to all clients (non-critical events)
-                socketio.emit('sync_update', {
-                    'id': event.id,
-                    'event_type': event.event_type,
-                    'payload': event.payload,
-                    'timestamp': event.timestamp.isoformat() if event.timestamp else None,
-                    'status': event.status,
-                    'device_id': event.device_id,
-                    'user_id': event.user_id
-                }, broadcast=True)
-                # Mark event as synced
-                event.status = 'synced'
-                self.log_audit('sync', 'periodic_broadcast', 'success', event.device_id, event.user_id, f'Event {event.id} broadcasted')
+                traced = tracer is not None and tracer.tracing(event_id)
+                started = tracer.clock() if traced else None
+                # Broadcast event to all clients (non-critical events), pre-encoded once for every recipient
+                with BROADCAST_FANOUT.labels('sync_update').time():
+                    socketio.emit('sync_update', event if event_log is not None else EncodedEvent(event))
+                if traced:
+                    tracer.broadcast(event_id, 'periodic', started, tracer.clock())
+                synced_ids.append(event_id)
+                db.session.add(SyncAuditLog(event_type='sync', operation='periodic_broadcast', status='success',
+                                            device_id=device_id, user_id=user_id, details=f'Event {event_id} broadcasted'))
             except Exception as e:
-                db.session.rollback()
-                self.log_audit('sync', 'periodic_broadcast', 'error', event.device_id, event.user_id, str(e))
+                db.session.add(SyncAuditLog(event_type='sync', operation='periodic_broadcast', status='error',
+                                            device_id=device_id, user_id=user_id, details=str(e)))
+        if event_log is not None:
+            # One byte per event in the log's status index; sync_events follows at the next checkpoint
+            event_log.mark(synced_ids, 'synced')
+            db.session.commit()
+            event_log.checkpoint()
+            return
+        # Mark broadcast events as synced (a statement per chunk of ids), committed together with their audit entries
+        for start in range(0, len(synced_ids), SYNCED_UPDATE_CHUNK):
+            db.session.execute(update(SyncEvent).where(SyncEvent.id.in_(synced_ids[start:start + SYNCED_UPDATE_CHUNK]))
+                               .values(status='synced'))
         db.session.commit()
 
     def immediate_sync(self, event):
         """Process an immediate sync event (e.g., critical stock change)."""
         try:
-            socketio.emit('critical_event', {
-                'id': event.id,
-                'event_type': event.event_type,
-                'payload': event.payload,
-                'timestamp': event.timestamp.isoformat() if event.timestamp else None,
-                'status': event.status,
-                'device_id': event.device_id,
-                'user_id': event.user_id
-            }, broadcast=True)
-            event.status = 'synced'
+            tracer = current_app.event_tracer
+            traced = tracer is not None and tracer.tracing(event.id)
+            started = tracer.clock() if traced else None
+            with BROADCAST_FANOUT.labels('critical_event').time():
+                socketio.emit('critical_event', EncodedEvent(event_row(event)))
+            if traced:
+                tracer.broadcast(event.id, 'immediate', started, tracer.clock())
+            event_log = current_app.event_log
+            if event_log is not None:
+                event_log.mark([event.id], 'synced')
+            else:
+                event.status = 'synced'
             self.log_audit('sync', 'immediate_broadcast', 'success', event.device_id, event.user_id, f'Critical event {event.id} broadcasted')
             db.session.commit()
+            if event_log is not None:
+                event_log.checkpoint()
         except Exception as e:
             db.session.rollback()
             self.log_audit('sync', 'immediate_broadcast', 'error', event.device_id, event.user_id, str(e))
@@ -79,7 +105,17 @@ class SyncManager:
         # Find existing event for the same record (if any)
         existing_event = SyncEvent.query.filter_by(payload={'record_id': record_id}).first()
         if existing_event:
-            # Resolve conflict
+            base_id = event.payload.get('base_event_id')
+            base_event = db.session.get(SyncEvent, base_id) if base_id else None
+            if base_event is not None:
+                # Both versions descend from base_event: keep every field either side changed
+                result = self.conflict_resolver.merge(base_event, existing_event, event,
+                                                      additive=current_app.config['MERGE_ADDITIVE_FIELDS'])
+                event.payload = result.merged
+                db.session.add(event)
+                db.session.commit()
+                return {'result': 'merged', 'event_id': event.id, 'conflicts': len(result.conflicts)}
+            # Resolve conflict (common ancestor unknown: the whole earlier event wins)
             winner, status = self.conflict_resolver.resolve(existing_event, event)
             if winner == event:
                 db.session.add(event)
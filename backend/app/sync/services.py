@@ -1,16 +1,47 @@
+from app.services.merge import MergeEngine, MergeResult, three_way_merge
+
+MERGE_SIDES = {'local': 'ours', 'incoming': 'theirs'}
+
+
 class SyncService:
     """
     Business logic for applying sync events, merging data, and updating the local DB.
     Handles audit logging and error handling for sync operations.
     """
+    def __init__(self, merge_engine=None):
+        self.merge_engine = merge_engine if merge_engine is not None else MergeEngine(workers=0)
+
     def apply_sync_event(self, event):
         """Apply a sync event to the local database."""
         pass
 
-    def merge_data(self, incoming_data):
-        """Merge incoming data from master/client with local data, resolving conflicts."""
-        pass
+    def merge_data(self, incoming_data, local_data=None, base_data=None, prefer='local', additive=()):
+        """
+        Merge incoming data from master/client with local data, resolving conflicts field by field
+        against their common ancestor (base_data). A single record gives a MergeResult; lists of
+        records (matched by position) are merged as one batch, on the engine's process pool when
+        large. Fields both sides changed keep the `prefer` side ('local' or 'incoming').
+        """
+        side = MERGE_SIDES[prefer]
+        if isinstance(incoming_data, dict):
+            if local_data is None:
+                return MergeResult(incoming_data, [])
+            return three_way_merge(base_data, local_data, incoming_data, side, additive)
+        if base_data is None:
+            base_data = [None] * len(incoming_data)
+        if local_data is None:
+            local_data = [None] * len(incoming_data)
+        if not len(base_data) == len(local_data) == len(incoming_data):
+            raise ValueError('incoming_data, local_data and base_data must have the same length')
+        # Records without a local version are taken as they come; the rest are merged as one batch
+        pending = [index for index, local in enumerate(local_data) if local is not None]
+        results = [MergeResult(incoming, []) for incoming in incoming_data]
+        merged = self.merge_engine.merge_many(
+            [(base_data[index], local_data[index], incoming_data[index]) for index in pending], side, additive)
+        for index, result in zip(pending, merged):
+            results[index] = result
+        return results
 
     def log_audit(self, event, status):
         """Log sync events and their status for audit trail."""
-        pass 
\ No newline at end of file
+        pass
@@ -0,0 +1,35 @@
+"""
+Minimal in-memory Bloom filter used to short-circuit lookups for keys that were never seen.
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized from an expected capacity and target false-positive rate.
+    Uses double hashing over a single blake2b digest to derive the k bit positions.
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        """False means the key was definitely never added; True means it probably was."""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
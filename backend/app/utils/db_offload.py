@@ -0,0 +1,87 @@
+"""
+Offloading of blocking database work in cooperative (gevent/eventlet) server modes.
+
+In those modes every Socket.IO connection is a greenlet, so an idle device costs only a few KB,
+but a blocking SQLite call inside a handler would stall every connection on the hub. Handlers
+run such work through BlockingPool.run(), which executes it on a bounded pool of real OS threads
+(inside a fresh app context, hence its own SQLAlchemy session) and yields until it finishes.
+In the default threading mode handlers already run on their own threads, so work runs inline.
+"""
+
+from flask import current_app
+
+ASYNC_MODES = ('threading', 'gevent', 'eventlet')
+
+
+class BlockingPool:
+    def __init__(self, async_mode='threading', max_workers=8):
+        """Create the pool for the given Socket.IO async mode; max_workers bounds concurrent DB work."""
+        if async_mode not in ASYNC_MODES:
+            raise ValueError(f'Unsupported async mode: {async_mode}. Use one of: {", ".join(ASYNC_MODES)}')
+        self.async_mode = async_mode
+        self.max_workers = max_workers
+        self._pool = None
+        if async_mode == 'gevent':
+            from gevent.threadpool import ThreadPool
+            self._pool = ThreadPool(max_workers)
+        elif async_mode == 'eventlet':
+            from eventlet import tpool
+            tpool.set_num_threads(max_workers)
+            self._pool = tpool
+
+    @property
+    def cooperative(self):
+        return self._pool is not None
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) inside an app context and return its result (exceptions propagate)."""
+        if self._pool is None:
+            return fn(*args, **kwargs)
+        app = current_app._get_current_object()
+
+        def call():
+            with app.app_context():
+                return fn(*args, **kwargs)
+
+        return self.run_raw(call)
+
+    def run_raw(self, fn, *args):
+        """Run fn(*args) on the pool without pushing an app context."""
+        if self._pool is None:
+            return fn(*args)
+        if self.async_mode == 'gevent':
+            return self._pool.spawn(fn, *args).get()
+        return self._pool.execute(fn, *args)
+
+
+class OffloadedWSGI:
+    """
+    WSGI wrapper that runs Flask request handling (and each chunk of a streamed body) on the
+    blocking pool, so REST routes doing SQLite work do not stall the cooperative hub.
+    It must wrap app.wsgi_app before Socket.IO's middleware, which keeps /socket.io traffic on greenlets.
+    """
+    def __init__(self, wsgi_app, pool):
+        self.wsgi_app = wsgi_app
+        self.pool = pool
+
+    def __call__(self, environ, start_response):
+        result = self.pool.run_raw(self.wsgi_app, environ, start_response)
+        return _OffloadedIterable(result, self.pool)
+
+
+class _OffloadedIterable:
+    def __init__(self, result, pool):
+        self.result = result
+        self.pool = pool
+        self.iterator = None
+
+    def __iter__(self):
+        self.iterator = iter(self.result)
+        return self
+
+    def __next__(self):
+        return self.pool.run_raw(next, self.iterator)
+
+    def close(self):
+        if hasattr(self.result, 'close'):
+            self.pool.run_raw(self.result.close)
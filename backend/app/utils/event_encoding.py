@@ -0,0 +1,132 @@
+"""
+Column-projected, ORM-free encoding of SyncEvents for the read paths (/sync/pull, /sync/status)
+and the SyncManager broadcasts.
+
+Events are selected as plain column tuples (EVENT_COLUMNS), with the payload kept as the JSON
+text stored in the database, and encoded straight to bytes. The stored payload is spliced in
+as-is rather than parsed and re-serialized. orjson is used for the remaining fields when it is
+installed; otherwise the standard library encoder is used.
+"""
+
+import json
+
+from sqlalchemy import Text, select, type_coerce
+
+from app.models.sync_event import SyncEvent
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Field order of a projected event row; payload is the raw JSON text, timestamp a datetime
+EVENT_FIELDS = ('id', 'event_type', 'payload', 'timestamp', 'status', 'device_id', 'user_id')
+EVENT_COLUMNS = (SyncEvent.id, SyncEvent.event_type, type_coerce(SyncEvent.payload, Text).label('payload'),
+                 SyncEvent.timestamp, SyncEvent.status, SyncEvent.device_id, SyncEvent.user_id)
+
+
+def _encoded(value):
+    # Values outside the JSON types (e.g. an EncodedEvent nested in a message bus envelope)
+    if isinstance(value, EncodedEvent):
+        return value.decode()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def json_dumps(obj):
+        """Encode obj as compact JSON bytes."""
+        return orjson.dumps(obj, default=_encoded)
+
+    json_loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), default=_encoded)
+
+    def json_dumps(obj):
+        """Encode obj as compact JSON bytes."""
+        return _encoder.encode(obj).encode()
+
+    json_loads = json.loads
+
+
+def event_columns(table):
+    """EVENT_COLUMNS for another table with the sync_events columns (e.g. a history partition)."""
+    return (table.c.id, table.c.event_type, type_coerce(table.c.payload, Text).label('payload'),
+            table.c.timestamp, table.c.status, table.c.device_id, table.c.user_id)
+
+
+def select_events(*criteria):
+    """A SELECT of EVENT_COLUMNS filtered by criteria; add ordering/limits as needed."""
+    return select(*EVENT_COLUMNS).where(*criteria)
+
+
+def event_row(event):
+    """Project a SyncEvent instance onto the EVENT_COLUMNS row shape."""
+    return (event.id, event.event_type, json_dumps(event.payload), event.timestamp,
+            event.status, event.device_id, event.user_id)
+
+
+def encode_event(row):
+    """Encode one projected event row as JSON bytes (an object with the EVENT_FIELDS keys)."""
+    event_id, event_type, payload, timestamp, status, device_id, user_id = row
+    head = json_dumps({
+        'id': event_id,
+        'event_type': event_type,
+        'timestamp': timestamp.isoformat() if timestamp else None,
+        'status': status,
+        'device_id': device_id,
+        'user_id': user_id,
+    })
+    if payload is None:
+        payload = b'null'
+    elif isinstance(payload, str):
+        payload = payload.encode()
+    elif not isinstance(payload, bytes):
+        # Drivers that decode JSON columns themselves hand back Python objects
+        payload = json_dumps(payload)
+    return head[:-1] + b',"payload":' + payload + b'}'
+
+
+def encode_event_list(rows):
+    """Encode projected event rows as a JSON array."""
+    return b'[' + b','.join(encode_event(row) for row in rows) + b']'
+
+
+def encode_object(fields):
+    """Encode a JSON object from (key, value) pairs whose values are already encoded JSON bytes."""
+    return b'{' + b','.join(json_dumps(key) + b':' + value for key, value in fields) + b'}'
+
+
+class EncodedEvent:
+    """A pre-encoded event that can be passed to socketio.emit() and is sent without re-encoding."""
+    __slots__ = ('json',)
+
+    def __init__(self, row):
+        self.json = encode_event(row)
+
+    @classmethod
+    def from_json(cls, data):
+        """Wrap an event already encoded by encode_event (e.g. read back from the event log)."""
+        encoded = cls.__new__(cls)
+        encoded.json = data
+        return encoded
+
+    def decode(self):
+        return json_loads(self.json)
+
+
+class SocketIOJSON:
+    """
+    JSON module for the Socket.IO server. Event packets (a list of the event name and its
+    arguments) splice EncodedEvent arguments in verbatim; everything else is plain JSON.
+    """
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if type(obj) is list and any(isinstance(item, EncodedEvent) for item in obj):
+            return (b'[' + b','.join(item.json if isinstance(item, EncodedEvent) else json_dumps(item)
+                                     for item in obj) + b']').decode()
+        return json_dumps(obj).decode()
+
+    @staticmethod
+    def loads(text, **kwargs):
+        return json_loads(text)
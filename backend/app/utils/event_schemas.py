@@ -0,0 +1,178 @@
+"""
+Schema registry and compiler for incoming sync events.
+
+Schemas are plain dicts describing fields; each one is compiled once into a validator function
+(a closure over precomputed checks) that returns a list of error strings. The same compiled
+validators are shared by the REST routes, the Socket.IO handlers and bulk ingest.
+"""
+
+import datetime
+import threading
+import time
+
+NUMBER = (int, float)
+
+# Envelope every sync event must satisfy, regardless of event_type
+ENVELOPE_SCHEMA = {
+    'event_type': {'type': str, 'required': True, 'min_length': 1},
+    'payload': {'type': dict, 'required': True},
+    'device_id': {'type': str, 'required': True, 'min_length': 1},
+    'user_id': {'type': str, 'nullable': True},
+    'timestamp': {'type': str, 'nullable': True, 'format': 'iso_datetime'},
+    'idempotency_key': {'type': str, 'nullable': True, 'min_length': 1},
+}
+
+# Payload schemas for known event types. Unknown event types only need a JSON object payload.
+DEFAULT_PAYLOAD_SCHEMAS = {
+    'stock_update': {
+        # Optional: the baseline accepted stock updates without it, and deployed tills still send them
+        'product_id': {'type': (int, str), 'nullable': True},
+        'qty': {'type': NUMBER, 'nullable': True},
+        'new_stock': {'type': NUMBER, 'nullable': True, 'min': 0},
+    },
+    # Lines of a supplier invoice imported together (app/services/invoice_import.py)
+    'invoice_batch': {
+        'invoice_number': {'type': str, 'required': True, 'min_length': 1},
+        'supplier_id': {'type': (int, str), 'required': True},
+        'batch': {'type': int, 'required': True, 'min': 0},
+        'lines': {'type': list, 'required': True, 'min_length': 1},
+    },
+}
+
+
+def _is_iso_datetime(value):
+    try:
+        datetime.datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+FORMAT_CHECKS = {
+    'iso_datetime': _is_iso_datetime,
+}
+
+
+def compile_schema(schema, prefix=''):
+    """
+    Compile a field schema into a validator function.
+    Supported field options: type (type or tuple), required, nullable, min_length, min, choices, format.
+    The returned function takes a dict and returns a list of error strings (empty when valid).
+    """
+    required = tuple(name for name, spec in schema.items() if spec.get('required'))
+    checks = []
+    for name, spec in schema.items():
+        types = spec.get('type')
+        if isinstance(types, type):
+            types = (types,)
+        # bool is a subclass of int; only accept it when the schema asks for bool explicitly
+        reject_bool = types is not None and bool not in types and any(t in (int, float) for t in types)
+        checks.append((
+            name,
+            types,
+            reject_bool,
+            spec.get('nullable', False),
+            spec.get('min_length'),
+            spec.get('min'),
+            frozenset(spec['choices']) if 'choices' in spec else None,
+            FORMAT_CHECKS[spec['format']] if 'format' in spec else None,
+        ))
+    checks = tuple(checks)
+
+    def validate(data):
+        missing = [name for name in required if name not in data]
+        errors = [f'Missing fields: {", ".join(prefix + name for name in missing)}'] if missing else []
+        for name, types, reject_bool, nullable, min_length, minimum, choices, format_check in checks:
+            if name not in data:
+                continue
+            value = data[name]
+            if value is None:
+                if not nullable:
+                    errors.append(f'Field {prefix}{name} must not be null')
+                continue
+            if types is not None and (not isinstance(value, types) or (reject_bool and isinstance(value, bool))):
+                expected = ' or '.join(t.__name__ for t in types)
+                errors.append(f'Field {prefix}{name} must be of type {expected}')
+                continue
+            if min_length is not None and len(value) < min_length:
+                errors.append(f'Field {prefix}{name} must have length >= {min_length}')
+            if minimum is not None and value < minimum:
+                errors.append(f'Field {prefix}{name} must be >= {minimum}')
+            if choices is not None and value not in choices:
+                errors.append(f'Field {prefix}{name} must be one of: {", ".join(sorted(map(str, choices)))}')
+            if format_check is not None and not format_check(value):
+                errors.append(f'Field {prefix}{name} has invalid format')
+        return errors
+
+    return validate
+
+
+class EventSchemaRegistry:
+    """
+    Registry of compiled per-event_type validators.
+    Keeps per-event_type counters (validated, rejected, total time) so validation cost can be measured.
+    """
+    def __init__(self):
+        self._envelope = compile_schema(ENVELOPE_SCHEMA)
+        self._payload_validators = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        for event_type, schema in DEFAULT_PAYLOAD_SCHEMAS.items():
+            self.register(event_type, schema)
+
+    def register(self, event_type, payload_schema):
+        """Compile and register the payload schema for an event_type (replaces any existing one)."""
+        self._payload_validators[event_type] = compile_schema(payload_schema, prefix='payload.')
+
+    def validate(self, data):
+        """Validate a single event dict. Returns a list of error strings (empty when valid)."""
+        start = time.perf_counter_ns()
+        if not isinstance(data, dict):
+            errors = ['Event must be a JSON object']
+        else:
+            errors = self._envelope(data)
+            if not errors:
+                validator = self._payload_validators.get(data['event_type'])
+                if validator is not None:
+                    errors = validator(data['payload'])
+        event_type = data.get('event_type') if isinstance(data, dict) and isinstance(data.get('event_type'), str) else None
+        self._record(event_type, time.perf_counter_ns() - start, bool(errors))
+        return errors
+
+    def validate_many(self, events):
+        """Validate a batch of events. Returns a list of (index, errors) for the invalid ones."""
+        invalid = []
+        for index, data in enumerate(events):
+            errors = self.validate(data)
+            if errors:
+                invalid.append((index, errors))
+        return invalid
+
+    def _record(self, event_type, elapsed_ns, rejected):
+        key = event_type if event_type in self._payload_validators else '_other'
+        with self._lock:
+            stats = self._stats.setdefault(key, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += int(rejected)
+            stats[2] += elapsed_ns
+
+    def stats(self):
+        """Return validation counters per event_type, including mean validation cost in microseconds."""
+        with self._lock:
+            return {
+                event_type: {
+                    'validated': count,
+                    'rejected': rejected,
+                    'total_us': total_ns / 1000.0,
+                    'mean_us': (total_ns / count / 1000.0) if count else 0.0,
+                }
+                for event_type, (count, rejected, total_ns) in self._stats.items()
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# Process-wide registry shared by every ingest path
+event_schemas = EventSchemaRegistry()
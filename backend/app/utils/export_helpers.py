@@ -0,0 +1,125 @@
+"""
+Helpers for streaming large query results out of the database (CSV, NDJSON, gzip/zstd).
+All helpers are generators so rows are encoded and sent as they are fetched.
+"""
+
+import csv
+import datetime
+import io
+import json
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency; zstd is then not offered
+    zstandard = None
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def parse_iso_param(value):
+    """Parse an optional ISO timestamp query parameter. Returns None if value is empty; raises ValueError if invalid."""
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value)
+
+
+def _encode_value(value):
+    """Convert a column value into something csv/json can write."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def iter_query_rows(engine, statement, batch_size):
+    """
+    Execute a Core select on a dedicated connection and yield rows in batches.
+    Uses a server-side cursor (stream_results) so only batch_size rows are held in memory at a time.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+        for partition in result.partitions():
+            yield partition
+
+
+def iter_csv(columns, batches):
+    """Encode row batches as CSV. The header row is yielded before the first batch is fetched."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, (dict, list)) else _encode_value(value)
+                for value in row
+            ])
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(columns, batches):
+    """Encode row batches as newline-delimited JSON, one object per row."""
+    for batch in batches:
+        lines = [
+            json.dumps({column: _encode_value(value) for column, value in zip(columns, row)}, separators=(',', ':'))
+            for row in batch
+        ]
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_gzip(chunks, level=6, flush=False):
+    """
+    Compress a stream of byte chunks into a single gzip stream without buffering the whole body.
+    With flush=True every chunk is sync-flushed so the client can decode it as soon as it arrives.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if flush:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_zstd(chunks, level=3, flush=False):
+    """Compress a stream of byte chunks into a single zstd frame; flush=True ends a block per chunk."""
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if flush:
+            data += compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Content-Encodings the sync routes can produce, most preferred first
+CONTENT_ENCODINGS = ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+_STREAM_COMPRESSORS = {'gzip': iter_gzip, 'zstd': iter_zstd}
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick the Content-Encoding for a request's Accept-Encoding header (werkzeug Accept); None for identity."""
+    best = None
+    for encoding in CONTENT_ENCODINGS:
+        quality = accept_encodings[encoding]
+        if quality and (best is None or quality > accept_encodings[best]):
+            best = encoding
+    return best
+
+
+def compress_body(data, encoding):
+    """Compress a complete response body with the given Content-Encoding."""
+    return b''.join(iter_compressed([data], encoding))
+
+
+def iter_compressed(chunks, encoding, flush=False):
+    """Compress a stream of byte chunks with the given Content-Encoding."""
+    return _STREAM_COMPRESSORS[encoding](chunks, flush=flush)
@@ -0,0 +1,249 @@
+"""
+Minimal in-process metrics registry (counters, gauges, histograms) with Prometheus text exposition.
+Designed to stay on in production: an observation is a bisect plus a couple of additions under a lock.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DEFAULT_SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Return the child metric for a set of label values."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.expose(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def expose(self, name, labelnames, key):
+        return [f'{name}_total{_format_labels(labelnames, key)} {_format_value(self.value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self.callback = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, callback):
+        """Compute the value on each scrape instead of storing it."""
+        self.callback = callback
+
+    def expose(self, name, labelnames, key):
+        value = self.callback() if self.callback else self.value
+        return [f'{name}{_format_labels(labelnames, key)} {_format_value(value)}']
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        """collect (optional) is called on each scrape and returns {label_values_tuple: value} for dynamic label sets."""
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, callback):
+        self._default().set_function(callback)
+
+    def expose(self):
+        if self.collect is not None:
+            values = self.collect()
+            with self._lock:
+                # Label sets that disappeared since the last scrape are dropped
+                self._children = {}
+            for key, value in values.items():
+                self.labels(*key).set(value)
+        return super().expose()
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent requests do not share a start time
+        return _Timer(self.histogram)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager / decorator that observes the elapsed wall time in seconds."""
+        return _Timer(self)
+
+    def expose(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labelnames, key, ("le", _format_value(float(bound))))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}')
+        lines.append(f'{name}_count{_format_labels(labelnames, key)} {cumulative}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-registering (e.g. several create_app() calls in one process) returns the original metric
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        gauge = self._register(Gauge(name, documentation, labelnames, collect))
+        if collect is not None:
+            gauge.collect = collect
+        return gauge
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def expose(self):
+        """Render every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
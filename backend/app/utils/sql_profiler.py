@@ -0,0 +1,124 @@
+"""
+Per-request SQL profiling and N+1 detection.
+
+When SQL_PROFILING is enabled, SQLAlchemy cursor events count and time every statement executed
+while handling an HTTP request or a Socket.IO event. Slow statements are logged with their
+parameters, repeated statements are flagged, and HTTP responses carry a summary header, e.g.
+    X-SQL-Profile: queries=5; total_ms=3.41; slow=0; repeated=1
+Socket.IO handlers (which have no response) log the same summary when the handler finishes.
+"""
+
+import logging
+import time
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('app.sql_profiler')
+
+MAX_PARAM_REPR = 500
+
+
+class SQLProfile:
+    """Statements executed within one request or Socket.IO handler."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slow = []
+        self.by_statement = {}   # statement text -> executions (N+1 shape: same SQL, different params)
+        self.by_call = {}        # (statement, params repr) -> executions (identical repeated query)
+
+    def record(self, statement, params, duration, slow_threshold):
+        params_repr = repr(params)[:MAX_PARAM_REPR]
+        self.count += 1
+        self.total += duration
+        self.by_statement[statement] = self.by_statement.get(statement, 0) + 1
+        key = (statement, params_repr)
+        self.by_call[key] = self.by_call.get(key, 0) + 1
+        if duration >= slow_threshold:
+            self.slow.append((duration, statement, params_repr))
+
+    def repeated(self, threshold):
+        """Statements executed at least `threshold` times, most frequent first."""
+        return sorted(((n, s) for s, n in self.by_statement.items() if n >= threshold), reverse=True)
+
+    def duplicates(self):
+        """Identical statement+parameter executions that could have been reused."""
+        return sorted(((n, s, p) for (s, p), n in self.by_call.items() if n > 1), reverse=True)
+
+    def summary(self, repeat_threshold):
+        return (f'queries={self.count}; total_ms={self.total * 1000:.2f}; slow={len(self.slow)}; '
+                f'repeated={len(self.repeated(repeat_threshold))}; duplicates={len(self.duplicates())}')
+
+
+def current_profile():
+    """The profile of the active request/handler, or None outside a request context."""
+    if not has_request_context():
+        return None
+    return getattr(request, 'sql_profile', None)
+
+
+def _label():
+    socket_event = getattr(request, 'event', None)
+    if socket_event:
+        return f"socket:{socket_event['message']}"
+    return f'{request.method} {request.path}'
+
+
+def _log_profile(app, profile):
+    threshold = app.config['SQL_REPEAT_THRESHOLD']
+    label = _label()
+    for duration, statement, params in profile.slow:
+        logger.warning('Slow query in %s (%.2f ms): %s params=%s', label, duration * 1000, statement, params)
+    for count, statement in profile.repeated(threshold):
+        logger.warning('Possible N+1 in %s: statement executed %d times: %s', label, count, statement)
+    for count, statement, params in profile.duplicates():
+        logger.info('Duplicate query in %s: executed %d times with params=%s: %s', label, count, params, statement)
+    logger.info('SQL profile %s: %s', label, profile.summary(threshold))
+
+
+def init_sql_profiler(app, *engines):
+    """Install the profiler hooks on engines when SQL_PROFILING is enabled. Call inside an app context."""
+    if not app.config['SQL_PROFILING']:
+        return
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('profiler_started')
+        if not stack:
+            return
+        started = stack.pop()
+        if not has_request_context():
+            return
+        profile = getattr(request, 'sql_profile', None)
+        if profile is None:
+            # Socket.IO handlers get their profile lazily on the first query
+            profile = request.sql_profile = SQLProfile()
+        profile.record(statement, parameters, time.perf_counter() - started, app.config['SQL_SLOW_QUERY_MS'] / 1000.0)
+
+    for engine in engines:
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def _start_sql_profile():
+        request.sql_profile = SQLProfile()
+
+    @app.after_request
+    def _attach_sql_profile(response):
+        profile = getattr(request, 'sql_profile', None)
+        if profile is not None:
+            response.headers[app.config['SQL_PROFILE_HEADER']] = profile.summary(app.config['SQL_REPEAT_THRESHOLD'])
+            _log_profile(app, profile)
+            profile.reported = True
+        return response
+
+    @app.teardown_request
+    def _report_socket_profile(exc=None):
+        # Socket.IO handlers have no response; report when their request context is torn down
+        profile = getattr(request, 'sql_profile', None)
+        if profile is not None and not getattr(profile, 'reported', False):
+            _log_profile(app, profile)
+            profile.reported = True
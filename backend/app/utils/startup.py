@@ -0,0 +1,126 @@
+"""
+Cold start profiling and deferred startup work.
+
+StartupProfiler records how long each boot phase took and when milestones (first request,
+first Socket.IO connection, first heartbeat) were reached, measured from the moment the
+process started, so interpreter start-up and imports are included. Work that is not needed to
+accept connections (for example rebuilding the idempotency Bloom filter) is registered as a
+startup task and run in the background once the server is up, or on the first request or
+Socket.IO connection if nothing started it earlier.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('app.startup')
+
+
+def _process_started():
+    """perf_counter() value at which this process started, read from /proc where available."""
+    now = time.perf_counter()
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (after the parenthesised command name) is the start time in clock ticks since boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return now
+    age = uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    return now - max(age, 0.0)
+
+
+class StartupProfiler:
+    def __init__(self, origin=None):
+        """origin is the perf_counter() value treated as time zero (defaults to process start)."""
+        self.origin = _process_started() if origin is None else origin
+        self.phases = []
+        self.milestones = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """Seconds since the process started."""
+        return time.perf_counter() - self.origin
+
+    @contextmanager
+    def phase(self, name):
+        """Time a boot phase; phases may repeat (e.g. one create_app per worker) and are all kept."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'name': name, 'started_s': round(started - self.origin, 6),
+                                'seconds': round(time.perf_counter() - started, 6)})
+
+    def mark(self, name):
+        """Record the first time a milestone is reached; later calls are ignored (cheap on hot paths)."""
+        if name in self.milestones:
+            return
+        with self._lock:
+            if name in self.milestones:
+                return
+            self.milestones[name] = round(self.elapsed(), 6)
+        logger.info('startup milestone %s at %.3fs', name, self.milestones[name])
+
+    def report(self):
+        return {'phases': list(self.phases), 'milestones': dict(self.milestones)}
+
+
+# Process-wide profiler; the clock starts when the process did, not when this module was imported
+startup = StartupProfiler()
+_claim_lock = threading.Lock()
+
+
+def claim_startup_tasks(app):
+    """True for the first caller only: the deferred startup tasks run once per app, whoever starts them."""
+    with _claim_lock:
+        if getattr(app, 'startup_tasks_claimed', False):
+            return False
+        app.startup_tasks_claimed = True
+        return True
+
+
+def run_startup_tasks(app):
+    """Run the app's deferred startup tasks (name, callable) in order, each on the blocking pool."""
+    if not claim_startup_tasks(app):
+        return
+    with app.app_context():
+        for name, task in app.startup_tasks:
+            with startup.phase(f'deferred:{name}'):
+                try:
+                    app.db_offload.run(task)
+                except Exception:
+                    logger.exception('deferred startup task %s failed', name)
+    startup.mark('deferred_tasks_done')
+
+
+def run_when_listening(app, host, port, sleep=time.sleep, timeout=60):
+    """
+    Wait until the server accepts connections on host:port, record the 'listening' milestone,
+    then run the deferred startup tasks. Start it as a background task just before socketio.run().
+    """
+    probe_host = {'0.0.0.0': '127.0.0.1', '::': '::1', '': '127.0.0.1'}.get(host, host)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((probe_host, port), timeout=1).close()
+        except OSError:
+            sleep(0.01)
+            continue
+        startup.mark('listening')
+        break
+    run_startup_tasks(app)
+
+
+def start_startup_tasks(app, start_background_task):
+    """
+    Start the deferred startup tasks in the background unless something already has. Called on
+    the first request and the first Socket.IO connection, so servers that never call
+    run_when_listening (flask run, gunicorn, app.py) still run them.
+    """
+    if not getattr(app, 'startup_tasks_claimed', False):
+        start_background_task(run_startup_tasks, app)
@@ -2,7 +2,23 @@
 Utility functions for sync logic (serialization, validation, etc.).
 """
 
+import datetime
+from app.utils.event_schemas import event_schemas
+
+
 def validate_sync_event(event):
-    """Validate a sync event's structure and required fields."""
-    # TODO: Implement validation logic
-    pass 
\ No newline at end of file
+    """Validate a sync event's structure and required fields. Returns a list of error strings (empty when valid)."""
+    return event_schemas.validate(event)
+
+
+def validate_sync_events(events):
+    """Validate a batch of sync events (bulk ingest). Returns a list of (index, errors) for invalid events."""
+    return event_schemas.validate_many(events)
+
+
+def parse_event_timestamp(data):
+    """Return the event's client timestamp as a datetime, defaulting to now. Assumes the event was validated."""
+    timestamp = data.get('timestamp')
+    if timestamp:
+        return datetime.datetime.fromisoformat(timestamp)
+    return datetime.datetime.utcnow()
@@ -0,0 +1,49 @@
+"""
+Standalone server used by the connection benchmarks: runs the app on an isolated database in the
+requested Socket.IO async mode.
+
+Usage: python -m benchmarks.bench_server --mode gevent --port 5055 --db /tmp/bench.db
+"""
+
+import argparse
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark server')
+    parser.add_argument('--mode', default='threading', choices=('threading', 'gevent', 'eventlet'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--db', required=True, help='SQLite file for this run')
+    parser.add_argument('--eager-startup', action='store_true',
+                        help='run deferred startup tasks inside create_app() instead of after listening')
+    args = parser.parse_args(argv)
+
+    # Monkey patching must happen before the app (and the standard library users it imports) is loaded
+    if args.mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif args.mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+
+    from app import create_app
+    from app.extensions import db, socketio
+    from app.utils.startup import run_when_listening
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(args.db),
+        'SOCKETIO_ASYNC_MODE': args.mode,
+        'DEFER_STARTUP_TASKS': not args.eager_startup,
+    })
+    with app.app_context():
+        db.create_all()
+    socketio.start_background_task(run_when_listening, app, args.host, args.port, socketio.sleep)
+    kwargs = {'allow_unsafe_werkzeug': True} if args.mode == 'threading' else {}
+    socketio.run(app, host=args.host, port=args.port, log_output=False, **kwargs)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Cold start benchmark: boot-to-first-heartbeat time of a freshly started server process.
+
+Each run starts benchmarks.bench_server under `python -X importtime` on a copy of a seeded
+database. A device then connects as soon as the port accepts connections and sends a heartbeat.
+The report covers:
+- client-side time from spawn to listening, to connected and to the first heartbeat_ack
+- the server's own startup phases and milestones (sync_startup_* gauges on /metrics)
+- the packages with the largest import cost
+
+Usage (from the backend directory):
+    python -m benchmarks.cold_start --runs 5 --seed-events 50000
+    python -m benchmarks.cold_start --eager-startup      # compare with startup tasks run inside create_app()
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+from benchmarks.common import environment_info, isolated_app, percentile
+from benchmarks.connection_capacity import _free_port
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+_GAUGE_LINE = re.compile(r'^sync_startup_(phase|milestone)_seconds\{\w+="([^"]+)"\} (\S+)$', re.M)
+
+
+def seed_database(path, events):
+    """Create the schema and `events` keyed SyncEvents so deferred startup work has data to load."""
+    from app.extensions import db
+    from app.models.sync_event import SyncEvent
+
+    with isolated_app() as app:
+        with app.app_context():
+            db.session.execute(SyncEvent.__table__.insert(), [
+                {'event_type': 'sale', 'payload': {'total': i}, 'device_id': f'till{i % 20}',
+                 'status': 'synced', 'idempotency_key': f'seed-{i}'} for i in range(events)])
+            db.session.commit()
+            shutil.copyfile(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):], path)
+
+
+def import_costs(stderr_text, top=10):
+    """Sum `-X importtime` self times by top-level package; returns the `top` most expensive (ms)."""
+    totals = defaultdict(int)
+    for self_us, _, _, module in _IMPORTTIME_LINE.findall(stderr_text):
+        totals[module.split('.')[0]] += int(self_us)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {package: round(us / 1000, 2) for package, us in ranked}
+
+
+def _wait_listening(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Benchmark server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError('Benchmark server did not start listening')
+
+
+def _server_startup_gauges(url):
+    text = urllib.request.urlopen(f'{url}/metrics', timeout=10).read().decode()
+    report = {'phases': {}, 'milestones': {}}
+    for kind, name, value in _GAUGE_LINE.findall(text):
+        report[f'{kind}s'][name] = round(float(value) * 1000, 2)
+    return report
+
+
+def run_once(db_template, mode, eager, timeout=60):
+    """Start one server and return its client-side timings (ms), server-side startup report and import log."""
+    import socketio
+
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}'
+    with tempfile.TemporaryDirectory(prefix='rms-coldstart-') as tmpdir:
+        db_path = os.path.join(tmpdir, 'bench.db')
+        shutil.copyfile(db_template, db_path)
+        stderr_path = os.path.join(tmpdir, 'stderr.log')
+        command = [sys.executable, '-X', 'importtime', '-m', 'benchmarks.bench_server', '--mode', mode,
+                   '--port', str(port), '--db', db_path]
+        if eager:
+            command.append('--eager-startup')
+        with open(stderr_path, 'w') as stderr:
+            started = time.perf_counter()
+            process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=stderr)
+            device = socketio.Client(reconnection=False)
+            try:
+                _wait_listening(port, process, timeout)
+                listening = time.perf_counter()
+                acked = []
+                device.on('heartbeat_ack', lambda data: acked.append(time.perf_counter()))
+                device.connect(url, transports=['websocket'], wait_timeout=timeout)
+                connected = time.perf_counter()
+                device.emit('heartbeat', {'device_id': 'coldstart'})
+                deadline = time.monotonic() + timeout
+                while not acked and time.monotonic() < deadline:
+                    time.sleep(0.001)
+                if not acked:
+                    raise RuntimeError('No heartbeat_ack received')
+                device.disconnect()
+                # Let deferred startup tasks finish so their phase is part of the server report
+                time.sleep(0.5)
+                server = _server_startup_gauges(url)
+            finally:
+                process.terminate()
+                process.wait(10)
+        with open(stderr_path) as f:
+            import_log = f.read()
+    return {
+        'listening_ms': round((listening - started) * 1000, 2),
+        'connected_ms': round((connected - started) * 1000, 2),
+        'first_heartbeat_ms': round((acked[0] - started) * 1000, 2),
+        'server': server,
+    }, import_log
+
+
+def run_benchmark(mode='threading', runs=5, seed_events=10000, eager=False):
+    with tempfile.TemporaryDirectory(prefix='rms-coldstart-seed-') as tmpdir:
+        template = os.path.join(tmpdir, 'seed.db')
+        seed_database(template, seed_events)
+        results = []
+        import_log = ''
+        for _ in range(runs):
+            result, import_log = run_once(template, mode, eager)
+            results.append(result)
+            print(f'  {result["first_heartbeat_ms"]} ms to first heartbeat', file=sys.stderr)
+    summary = {}
+    for key in ('listening_ms', 'connected_ms', 'first_heartbeat_ms'):
+        samples = [r[key] for r in results]
+        summary[key] = {'p50': round(percentile(samples, 50), 2), 'max': max(samples)}
+    return {
+        'summary': summary,
+        'server_startup_ms': results[-1]['server'],
+        'import_cost_ms': import_costs(import_log),
+        'runs': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure server boot-to-first-heartbeat time')
+    parser.add_argument('--mode', default='threading', choices=('threading', 'gevent', 'eventlet'))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed-events', type=int, default=10000,
+                        help='keyed events in the database (loaded by the idempotency index at startup)')
+    parser.add_argument('--eager-startup', action='store_true',
+                        help='run deferred startup tasks inside create_app() for comparison')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    report = {'suite': 'cold_start', 'environment': environment_info(),
+              'parameters': {'mode': args.mode, 'runs': args.runs, 'seed_events': args.seed_events,
+                             'eager_startup': args.eager_startup},
+              'results': run_benchmark(args.mode, args.runs, args.seed_events, args.eager_startup)}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
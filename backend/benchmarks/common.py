@@ -0,0 +1,130 @@
+"""
+Shared helpers for the backend benchmark suites: isolated apps, latency recording,
+percentile reports and baseline storage/comparison.
+"""
+
+import json
+import os
+import platform
+import tempfile
+import time
+from contextlib import contextmanager
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile (0-100) of samples using linear interpolation."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class LatencyRecorder:
+    """Collects per-operation latencies (seconds) and wall time for one workload."""
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.started = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+
+    @contextmanager
+    def measure(self, ops=1):
+        start = time.perf_counter()
+        yield
+        duration = time.perf_counter() - start
+        # Batch operations (e.g. one periodic sync over many events) are recorded per item
+        self.samples.extend([duration / ops] * ops)
+
+    def report(self):
+        ops = len(self.samples)
+        return {
+            'ops': ops,
+            'seconds': round(self.elapsed, 6),
+            'throughput_ops_s': round(ops / self.elapsed, 2) if self.elapsed else 0.0,
+            'mean_ms': round(sum(self.samples) / ops * 1000, 4) if ops else 0.0,
+            'p50_ms': round(percentile(self.samples, 50) * 1000, 4),
+            'p95_ms': round(percentile(self.samples, 95) * 1000, 4),
+            'p99_ms': round(percentile(self.samples, 99) * 1000, 4),
+        }
+
+
+@contextmanager
+def isolated_app(config_overrides=None):
+    """Yield an app (inside an app context) bound to a fresh SQLite file that is deleted afterwards."""
+    from app import create_app
+    from app.extensions import db
+
+    with tempfile.TemporaryDirectory(prefix='rms-bench-') as tmpdir:
+        config = {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmpdir, 'bench.db'),
+        }
+        config.update(config_overrides or {})
+        app = create_app(config)
+        with app.app_context():
+            db.create_all()
+            yield app
+            db.session.remove()
+            db.engine.dispose()
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def save_baseline(name, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_baseline(name):
+    with open(baseline_path(name)) as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, current, tolerance=0.2):
+    """
+    Compare two reports workload by workload.
+    A regression is a p95/p99 latency above baseline * (1 + tolerance) or a throughput
+    below baseline * (1 - tolerance). Returns a list of human-readable regression strings.
+    """
+    regressions = []
+    for workload, result in current['results'].items():
+        base = baseline['results'].get(workload)
+        if not base:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{workload}.{metric}: {result[metric]} > {base[metric]} (+{tolerance:.0%})')
+        if base['throughput_ops_s'] and result['throughput_ops_s'] < base['throughput_ops_s'] * (1 - tolerance):
+            regressions.append(f'{workload}.throughput_ops_s: {result["throughput_ops_s"]} < '
+                               f'{base["throughput_ops_s"]} (-{tolerance:.0%})')
+    return regressions
+
+
+def print_report(report):
+    print(f"{'workload':<16}{'ops':>8}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for workload, result in report['results'].items():
+        print(f"{workload:<16}{result['ops']:>8}{result['throughput_ops_s']:>12}"
+              f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}")
@@ -0,0 +1,178 @@
+"""
+Connection capacity benchmark: threading vs cooperative (gevent/eventlet) server modes.
+
+For each mode a server is started in a subprocess on an isolated database, then idle device
+connections are opened in waves with asyncio Socket.IO clients (python-socketio AsyncClient,
+requires aiohttp). After each wave the server's resident memory and OS thread count are sampled
+from /proc and a probe device measures heartbeat round-trip time and a REST /sync/push under load.
+
+Usage (from the backend directory):
+    python -m benchmarks.connection_capacity --modes threading,gevent --connections 2000 --wave 250
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.common import environment_info, percentile
+
+
+def _proc_status(pid):
+    """Resident memory (KB) and OS thread count of a process, from /proc/<pid>/status."""
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'Threads'):
+                values[key] = int(value.split()[0])
+    return values.get('VmRSS', 0), values.get('Threads', 0)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Benchmark server exited during startup')
+        try:
+            urllib.request.urlopen(f'{url}/metrics', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Benchmark server did not start')
+
+
+def _push_latency(url):
+    body = json.dumps({'event_type': 'sale', 'payload': {'total': 1}, 'device_id': 'probe'}).encode()
+    request = urllib.request.Request(f'{url}/sync/push', data=body, headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    urllib.request.urlopen(request, timeout=30).read()
+    return time.perf_counter() - started
+
+
+async def _probe_heartbeats(url, rounds=20):
+    import socketio
+
+    probe = socketio.AsyncClient(reconnection=False)
+    acked = asyncio.Queue()
+    probe.on('heartbeat_ack', lambda data: acked.put_nowait(time.perf_counter()))
+    await probe.connect(url, transports=['websocket'], wait_timeout=10)
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await probe.emit('heartbeat', {'device_id': 'probe'})
+        samples.append(await asyncio.wait_for(acked.get(), 10) - started)
+    await probe.disconnect()
+    return samples
+
+
+async def _open_connections(url, clients, count, start_index, connect_timeout):
+    import socketio
+
+    async def connect(index):
+        client = socketio.AsyncClient(reconnection=False)
+        try:
+            await client.connect(url, transports=['websocket'], wait_timeout=connect_timeout)
+            await client.emit('register_device', {'device_id': f'idle{index:05d}', 'role': 'client'})
+            clients.append(client)
+            return True
+        except Exception:
+            return False
+
+    results = await asyncio.gather(*(connect(start_index + i) for i in range(count)))
+    return results.count(False)
+
+
+async def _run_mode(url, pid, target, wave, connect_timeout):
+    clients = []
+    waves = []
+    baseline_rss, baseline_threads = _proc_status(pid)
+    failures = 0
+    while len(clients) < target:
+        count = min(wave, target - len(clients))
+        started = time.perf_counter()
+        failed = await _open_connections(url, clients, count, len(clients) + failures, connect_timeout)
+        failures += failed
+        connect_seconds = time.perf_counter() - started
+        await asyncio.sleep(0.5)
+        rss, threads = _proc_status(pid)
+        heartbeats = await _probe_heartbeats(url)
+        push = await asyncio.get_running_loop().run_in_executor(None, _push_latency, url)
+        waves.append({
+            'connections': len(clients),
+            'connect_failures': failed,
+            'connect_seconds': round(connect_seconds, 3),
+            'server_rss_mb': round(rss / 1024, 1),
+            'server_threads': threads,
+            'heartbeat_p50_ms': round(percentile(heartbeats, 50) * 1000, 3),
+            'heartbeat_p99_ms': round(percentile(heartbeats, 99) * 1000, 3),
+            'push_ms': round(push * 1000, 3),
+        })
+        print(f'  {waves[-1]}', file=sys.stderr)
+        if failed == count:
+            break  # server is refusing connections; capacity reached
+    rss, threads = _proc_status(pid)
+    await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+    return {
+        'connections_established': len(clients),
+        'connect_failures': failures,
+        'baseline_rss_mb': round(baseline_rss / 1024, 1),
+        'rss_kb_per_connection': round((rss - baseline_rss) / len(clients), 2) if clients else None,
+        'baseline_threads': baseline_threads,
+        'threads_at_peak': threads,
+        'waves': waves,
+    }
+
+
+def run_mode(mode, target, wave, connect_timeout):
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}'
+    with tempfile.TemporaryDirectory(prefix='rms-capacity-') as tmpdir:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_server', '--mode', mode, '--port', str(port),
+             '--db', os.path.join(tmpdir, 'bench.db')],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_for_server(url, process)
+            return asyncio.run(_run_mode(url, process.pid, target, wave, connect_timeout))
+        finally:
+            process.terminate()
+            process.wait(10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare Socket.IO connection capacity across server modes')
+    parser.add_argument('--modes', default='threading,gevent')
+    parser.add_argument('--connections', type=int, default=1000, help='target idle connections per mode')
+    parser.add_argument('--wave', type=int, default=250, help='connections opened per wave')
+    parser.add_argument('--connect-timeout', type=float, default=10.0)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    report = {'suite': 'connection_capacity', 'environment': environment_info(),
+              'parameters': {'connections': args.connections, 'wave': args.wave}, 'results': {}}
+    for mode in [m for m in args.modes.split(',') if m]:
+        print(f'mode={mode}', file=sys.stderr)
+        report['results'][mode] = run_mode(mode, args.connections, args.wave, args.connect_timeout)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
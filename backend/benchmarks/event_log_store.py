@@ -0,0 +1,94 @@
+"""
+Sync pipeline on sync_events alone versus the append-only event log (EVENT_LOG).
+
+For each store the benchmark seeds a pending backlog, then times:
+- the first pull, which for the log includes copying the backlog into its segment files
+- /sync/pull for every device, with new pushes between rounds
+- immediate_sync status changes, one event at a time
+- one periodic sync of the remaining backlog, reported per event
+
+Usage (from the backend directory):
+    python -m benchmarks.event_log_store --devices 50 --events-per-device 400 --immediate 500
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.common import LatencyRecorder, environment_info, isolated_app
+from benchmarks.sync_bench import _device_ids, _seed_events
+
+STORES = ('sqlite', 'log')
+
+
+def run_store(store, devices, events_per_device, rounds, immediate):
+    from app.extensions import db, socketio
+    from app.models.sync_event import SyncEvent
+    from app.sync.manager import SyncManager
+
+    with tempfile.TemporaryDirectory(prefix='rms-event-log-') as log_dir, \
+            isolated_app({'EVENT_LOG': store == 'log', 'EVENT_LOG_DIR': log_dir}) as app:
+        _seed_events(app, devices, events_per_device, seed=11)
+        client = app.test_client()
+        device_ids = _device_ids(devices)
+        started = time.perf_counter()
+        assert client.get(f'/sync/pull?device_id={device_ids[0]}').status_code == 200
+        first_pull_ms = (time.perf_counter() - started) * 1000
+
+        with LatencyRecorder('pull') as pulls:
+            for round_ in range(rounds):
+                for device_id in device_ids:
+                    with pulls.measure():
+                        response = client.get(f'/sync/pull?device_id={device_id}')
+                    assert response.status_code == 200
+                client.post('/sync/push', json={'event_type': 'sale', 'device_id': device_ids[0],
+                                                'payload': {'product_id': 1, 'qty': 1, 'round': round_}})
+
+        manager = SyncManager()
+        socketio.server.manager.emit = lambda *args, **kwargs: None   # time the store, not the fan-out
+        events = db.session.execute(db.select(SyncEvent).where(SyncEvent.status == 'pending')
+                                    .order_by(SyncEvent.id).limit(immediate)).scalars().all()
+        with LatencyRecorder('immediate_sync') as marks:
+            for event in events:
+                with marks.measure():
+                    manager.immediate_sync(event)
+
+        remaining = db.session.execute(db.select(db.func.count()).select_from(SyncEvent)
+                                       .where(SyncEvent.status == 'pending')).scalar() - len(events)
+        with LatencyRecorder('periodic_sync') as periodic:
+            with periodic.measure(ops=max(1, remaining)):
+                manager.periodic_sync()
+        if app.event_log is not None:
+            app.event_log.checkpoint(force=True)
+        return {'first_pull_ms': round(first_pull_ms, 2), 'pull': pulls.report(),
+                'immediate_sync': marks.report(), 'periodic_sync': periodic.report()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sync pipeline on sync_events versus the event log')
+    parser.add_argument('--stores', default=','.join(STORES), help='comma-separated: sqlite, log')
+    parser.add_argument('--devices', type=int, default=50)
+    parser.add_argument('--events-per-device', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--immediate', type=int, default=300)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    results = {'environment': environment_info(), 'stores': {}}
+    for store in args.stores.split(','):
+        results['stores'][store] = result = run_store(
+            store, args.devices, args.events_per_device, args.rounds, args.immediate)
+        print(f'{store:>6}: first pull {result["first_pull_ms"]:.1f} ms, '
+              f'pull p50 {result["pull"]["p50_ms"]:.2f} / p99 {result["pull"]["p99_ms"]:.2f} ms, '
+              f'immediate_sync p50 {result["immediate_sync"]["p50_ms"]:.2f} ms, '
+              f'periodic_sync {result["periodic_sync"]["p50_ms"]:.3f} ms/event')
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Concurrent /sync/push throughput with and without group commit.
+
+Each run starts --threads request threads that push --events events each against a fresh
+SQLite database. With PUSH_GROUP_COMMIT=1 every push is committed by the group-commit writer.
+With 0, each request commits its own transactions.
+
+Usage (from the backend directory):
+    python -m benchmarks.push_concurrency --threads 32 --events 100
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from benchmarks.common import environment_info, isolated_app, percentile
+
+
+def _pusher(app, thread_id, events, latencies, failures, start):
+    client = app.test_client()
+    start.wait()
+    for seq in range(events):
+        body = {'event_type': 'sale', 'device_id': f'till{thread_id:03d}', 'idempotency_key': f'{thread_id}-{seq}',
+                'payload': {'product_id': seq % 50, 'qty': 1}}
+        started = time.perf_counter()
+        try:
+            ok = client.post('/sync/push', json=body).status_code == 200
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        failures.append(not ok)
+
+
+def run(group_commit, threads, events):
+    with isolated_app({'PUSH_GROUP_COMMIT': group_commit}) as app:
+        app.idempotency_index.rebuild()
+        latencies, failures, start = [], [], threading.Event()
+        workers = [threading.Thread(target=_pusher, args=(app, i, events, latencies, failures, start))
+                   for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        started = time.perf_counter()
+        start.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        report = {
+            'pushes': len(latencies),
+            'failed': sum(failures),
+            'seconds': round(elapsed, 3),
+            'pushes_per_s': round((len(latencies) - sum(failures)) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+        if app.push_writer is not None:
+            stats = app.push_writer.stats
+            report['commits'] = stats['batches']
+            report['mean_batch'] = round(stats['events'] / max(1, stats['batches']), 1)
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent push throughput with and without group commit')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--events', type=int, default=100, help='pushes per thread')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    results = {'environment': environment_info()}
+    for label, group_commit in (('per_request', False), ('group_commit', True)):
+        results[label] = report = run(group_commit, args.threads, args.events)
+        print(f'{label:>12}: {report["pushes_per_s"]:8.1f} pushes/s, p50 {report["p50_ms"]:.2f} ms, '
+              f'p99 {report["p99_ms"]:.2f} ms, {report["failed"]} failed'
+              + (f', {report["commits"]} commits (mean batch {report["mean_batch"]})' if 'commits' in report else ''))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
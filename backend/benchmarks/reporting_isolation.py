@@ -0,0 +1,99 @@
+"""
+Push latency while large reports run: compares the reporting connection modes.
+
+For each REPORTING_DB_MODE the benchmark seeds a backlog of events, then times /sync/push
+once on an idle server and once while reporter threads repeatedly stream the full event
+export and page through /sync/status. With 'primary' the reports share the rollback-journal
+database with the writers. With 'snapshot' and 'replica' they read WAL snapshots or a backup
+copy on their own connections.
+
+Usage (from the backend directory):
+    python -m benchmarks.reporting_isolation --seed-events 50000 --pushes 300 --reporters 2
+"""
+
+import argparse
+import json
+import sys
+import threading
+
+from benchmarks.common import LatencyRecorder, environment_info, isolated_app
+from benchmarks.sync_bench import _seed_events
+
+MODES = ('primary', 'snapshot', 'replica')
+
+
+def _reporter(app, stop, outcomes):
+    client = app.test_client()
+    while not stop.is_set():
+        try:
+            export = client.get('/sync/export/events?format=ndjson')
+            status = client.get('/sync/status?user_id=cashier1&limit=500')
+            outcomes.append(export.status_code == 200 and status.status_code == 200)
+        except Exception:
+            # e.g. 'database is locked' when a report waits behind a writer on the shared database
+            outcomes.append(False)
+
+
+def _push_latency(app, pushes, label):
+    """Time `pushes` pushes; returns the recorder and the number that failed (e.g. 'database is locked')."""
+    client = app.test_client()
+    failed = 0
+    with LatencyRecorder(label) as recorder:
+        for seq in range(pushes):
+            body = {'event_type': 'sale', 'device_id': 'till-push', 'payload': {'product_id': 1, 'qty': 1, 'seq': seq}}
+            with recorder.measure():
+                try:
+                    ok = client.post('/sync/push', json=body).status_code == 200
+                except Exception:
+                    ok = False
+            failed += not ok
+    return recorder, failed
+
+
+def run_mode(mode, seed_events, pushes, reporters):
+    with isolated_app({'REPORTING_DB_MODE': mode, 'REPORTING_REPLICA_MAX_AGE': 1}) as app:
+        _seed_events(app, 100, max(1, seed_events // 100), seed=7)
+        idle = _push_latency(app, pushes, 'idle')[0].report()
+        stop, outcomes = threading.Event(), []
+        threads = [threading.Thread(target=_reporter, args=(app, stop, outcomes), daemon=True)
+                   for _ in range(reporters)]
+        for thread in threads:
+            thread.start()
+        try:
+            loaded, failed_pushes = _push_latency(app, pushes, 'reporting')
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        report = loaded.report()
+        report['max_ms'] = round(max(loaded.samples) * 1000, 4)
+        report['failed'] = failed_pushes
+        return {'idle': idle, 'while_reporting': report,
+                'reports_completed': sum(outcomes), 'reports_failed': len(outcomes) - sum(outcomes)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Push latency under concurrent reporting load')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated REPORTING_DB_MODE values')
+    parser.add_argument('--seed-events', type=int, default=20000)
+    parser.add_argument('--pushes', type=int, default=200)
+    parser.add_argument('--reporters', type=int, default=2)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    results = {'environment': environment_info(), 'modes': {}}
+    for mode in args.modes.split(','):
+        results['modes'][mode] = result = run_mode(mode, args.seed_events, args.pushes, args.reporters)
+        idle, loaded = result['idle'], result['while_reporting']
+        print(f'{mode:>9}: push p50 {idle["p50_ms"]:.2f} -> {loaded["p50_ms"]:.2f} ms, '
+              f'p99 {idle["p99_ms"]:.2f} -> {loaded["p99_ms"]:.2f} ms, max {loaded["max_ms"]:.2f} ms, '
+              f'{loaded["failed"]} pushes failed '
+              f'({result["reports_completed"]} reports, {result["reports_failed"]} failed)')
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
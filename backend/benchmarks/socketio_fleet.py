@@ -0,0 +1,231 @@
+"""
+Simulated Socket.IO fleet load generator for broadcast fan-out latency.
+
+Starts hundreds of simulated devices that register, send heartbeats and emit critical events,
+then reports emit-to-receive latency distributions for `critical_event` and `sync_update`
+broadcasts plus server CPU time per delivered message.
+
+Two modes:
+    in-process (default): Flask-SocketIO test clients against an isolated app; server CPU is
+        this process's CPU time (includes the simulated clients' bookkeeping).
+    --url: real python-socketio clients against a running local server, e.g. `python run.py`;
+        pass --server-pid to sample the server's CPU time from /proc (or psutil if installed).
+
+Usage (from the backend directory):
+    python -m benchmarks.socketio_fleet --devices 300 --emitters 10 --events 5
+    python -m benchmarks.socketio_fleet --url http://127.0.0.1:5000 --server-pid 4242 --devices 200
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import environment_info, percentile
+
+
+def _process_cpu_seconds(pid=None):
+    """User+system CPU seconds of a process (this process when pid is None)."""
+    if pid is None:
+        return time.process_time()
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except ImportError:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat (11 and 12 after the command name)
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _distribution(samples):
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+        'max_ms': round(max(samples) * 1000, 4) if samples else 0.0,
+    }
+
+
+class _StampedQueue(list):
+    """Replacement for a test client's packet queue that records when each packet was delivered."""
+    def append(self, item):
+        item['received_at'] = time.perf_counter()
+        super().append(item)
+
+
+def _drain(client, name):
+    """Remove and return packets of the given event name from a test client's queue."""
+    matched = [packet for packet in client.queue if packet['name'] == name]
+    client.queue[:] = [packet for packet in client.queue if packet['name'] != name]
+    return matched
+
+
+def run_in_process(devices, emitters, events_per_emitter, heartbeats, sync_events):
+    """Drive the fleet with Flask-SocketIO test clients against an isolated app."""
+    from benchmarks.common import isolated_app
+    from app.extensions import db, socketio
+    from app.models.sync_event import SyncEvent
+    from app.sync.manager import SyncManager
+
+    with isolated_app() as app:
+        fleet = []
+        for i in range(devices):
+            client = socketio.test_client(app)
+            client.queue = _StampedQueue()
+            fleet.append((f'till{i:04d}', client))
+        for device_id, client in fleet:
+            client.emit('register_device', {'device_id': device_id, 'role': 'client'})
+            client.queue.clear()
+
+        latencies = {'heartbeat_ack': [], 'critical_event': [], 'sync_update': []}
+        cpu_start = _process_cpu_seconds()
+        delivered = 0
+
+        for _ in range(heartbeats):
+            for device_id, client in fleet:
+                sent_at = time.perf_counter()
+                client.emit('heartbeat', {'device_id': device_id})
+                for packet in _drain(client, 'heartbeat_ack'):
+                    latencies['heartbeat_ack'].append(packet['received_at'] - sent_at)
+                    delivered += 1
+
+        for seq in range(events_per_emitter):
+            for device_id, client in fleet[:emitters]:
+                sent_at = time.perf_counter()
+                client.emit('critical_event', {
+                    'event_type': 'stock_update',
+                    'payload': {'product_id': seq, 'new_stock': 0},
+                    'device_id': device_id,
+                })
+                for _, receiver in fleet:
+                    for packet in _drain(receiver, 'critical_event'):
+                        latencies['critical_event'].append(packet['received_at'] - sent_at)
+                        delivered += 1
+
+        if sync_events:
+            db.session.add_all([SyncEvent(event_type='price_change', payload={'product_id': i}, device_id='bench')
+                                for i in range(sync_events)])
+            db.session.commit()
+            started = time.perf_counter()
+            SyncManager().periodic_sync()
+            for _, receiver in fleet:
+                for packet in _drain(receiver, 'sync_update'):
+                    latencies['sync_update'].append(packet['received_at'] - started)
+                    delivered += 1
+
+        cpu_seconds = _process_cpu_seconds() - cpu_start
+        for _, client in fleet:
+            client.disconnect()
+    return latencies, delivered, cpu_seconds
+
+
+def run_remote(url, server_pid, devices, emitters, events_per_emitter, heartbeats, settle_timeout):
+    """Drive the fleet with real python-socketio clients against a running server."""
+    import socketio as socketio_client
+
+    latencies = {'heartbeat_ack': [], 'critical_event': []}
+    lock = threading.Lock()
+    expected = devices * heartbeats + devices * emitters * events_per_emitter
+    received = [0]
+    done = threading.Event()
+    heartbeat_sent = {}
+
+    def record(kind, latency):
+        with lock:
+            latencies[kind].append(latency)
+            received[0] += 1
+            if received[0] >= expected:
+                done.set()
+
+    fleet = []
+    for i in range(devices):
+        device_id = f'till{i:04d}'
+        client = socketio_client.Client(reconnection=False)
+
+        @client.on('critical_event')
+        def on_critical(data):
+            # sent_at uses time.time() so it is comparable across client threads
+            record('critical_event', time.time() - data['payload']['sent_at'])
+
+        @client.on('heartbeat_ack')
+        def on_heartbeat_ack(data):
+            record('heartbeat_ack', time.time() - heartbeat_sent[data['device_id']])
+
+        client.connect(url, transports=['websocket'], wait_timeout=10)
+        client.emit('register_device', {'device_id': device_id, 'role': 'client'})
+        fleet.append((device_id, client))
+
+    cpu_start = _process_cpu_seconds(server_pid) if server_pid else None
+    for _ in range(heartbeats):
+        for device_id, client in fleet:
+            heartbeat_sent[device_id] = time.time()
+            client.emit('heartbeat', {'device_id': device_id})
+    for seq in range(events_per_emitter):
+        for device_id, client in fleet[:emitters]:
+            client.emit('critical_event', {
+                'event_type': 'stock_update',
+                'payload': {'product_id': seq, 'new_stock': 0, 'sent_at': time.time()},
+                'device_id': device_id,
+            })
+    done.wait(settle_timeout)
+    cpu_seconds = (_process_cpu_seconds(server_pid) - cpu_start) if server_pid else None
+    # Disconnecting waits for each client's background threads; do it concurrently
+    closers = [threading.Thread(target=client.disconnect) for _, client in fleet]
+    for closer in closers:
+        closer.start()
+    for closer in closers:
+        closer.join()
+    return latencies, received[0], cpu_seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Socket.IO fleet fan-out load generator')
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--emitters', type=int, default=5, help='devices that emit critical events')
+    parser.add_argument('--events', type=int, default=5, help='critical events per emitter')
+    parser.add_argument('--heartbeats', type=int, default=2, help='heartbeat rounds per device')
+    parser.add_argument('--sync-events', type=int, default=20, help='pending events fanned out by one periodic sync (in-process only)')
+    parser.add_argument('--url', help='connect real clients to a running server instead of running in-process')
+    parser.add_argument('--server-pid', type=int, help='server process id for CPU sampling in --url mode')
+    parser.add_argument('--settle-timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.url:
+        latencies, delivered, cpu_seconds = run_remote(
+            args.url, args.server_pid, args.devices, args.emitters, args.events, args.heartbeats, args.settle_timeout)
+    else:
+        # Handlers print every broadcast; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, delivered, cpu_seconds = run_in_process(
+                args.devices, args.emitters, args.events, args.heartbeats, args.sync_events)
+
+    report = {
+        'suite': 'socketio_fleet',
+        'mode': 'remote' if args.url else 'in_process',
+        'parameters': {'devices': args.devices, 'emitters': args.emitters, 'events_per_emitter': args.events,
+                       'heartbeats': args.heartbeats, 'sync_events': 0 if args.url else args.sync_events},
+        'environment': environment_info(),
+        'wall_seconds': round(time.perf_counter() - started, 3),
+        'messages_delivered': delivered,
+        'server_cpu_seconds': round(cpu_seconds, 4) if cpu_seconds is not None else None,
+        'server_cpu_us_per_message': round(cpu_seconds / delivered * 1e6, 2) if cpu_seconds and delivered else None,
+        'latency': {kind: _distribution(samples) for kind, samples in latencies.items()},
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Reproducible throughput/latency benchmark for the sync hot paths.
+
+Each workload runs against its own isolated SQLite database created through create_app(),
+with N simulated devices driving the REST routes and the sync services in a fixed, seeded order.
+
+Usage (from the backend directory):
+    python -m benchmarks.sync_bench --devices 20 --events 50
+    python -m benchmarks.sync_bench --save-baseline local
+    python -m benchmarks.sync_bench --compare local --tolerance 0.25
+"""
+
+import argparse
+import datetime
+import json
+import random
+import sys
+
+from benchmarks.common import (LatencyRecorder, compare_reports, environment_info, isolated_app,
+                               load_baseline, print_report, save_baseline)
+
+WORKLOADS = ('push', 'pull', 'status', 'periodic_sync', 'conflict')
+
+
+def _device_ids(devices):
+    return [f'till{i:03d}' for i in range(devices)]
+
+
+def _event(rng, device_id, seq):
+    return {
+        'event_type': rng.choice(['sale', 'stock_update', 'price_change']),
+        'payload': {'product_id': rng.randint(1, 500), 'qty': rng.randint(-3, 20), 'seq': seq},
+        'device_id': device_id,
+        'user_id': f'cashier{rng.randint(1, 10)}',
+    }
+
+
+def _seed_events(app, devices, events_per_device, seed):
+    """Insert events directly (not timed) so read workloads have realistic backlogs."""
+    from app.extensions import db
+    from app.models.sync_event import SyncEvent
+
+    rng = random.Random(seed)
+    base = datetime.datetime(2025, 7, 1, 8, 0, 0)
+    rows = []
+    for seq in range(events_per_device):
+        for device_id in _device_ids(devices):
+            data = _event(rng, device_id, seq)
+            rows.append(SyncEvent(timestamp=base + datetime.timedelta(seconds=len(rows)), status='pending', **data))
+    db.session.add_all(rows)
+    db.session.commit()
+
+
+def bench_push(devices, events_per_device, seed):
+    rng = random.Random(seed)
+    with isolated_app() as app:
+        client = app.test_client()
+        with LatencyRecorder('push') as recorder:
+            for seq in range(events_per_device):
+                for device_id in _device_ids(devices):
+                    body = _event(rng, device_id, seq)
+                    with recorder.measure():
+                        response = client.post('/sync/push', json=body)
+                    assert response.status_code == 200, response.get_data(as_text=True)
+    return recorder.report()
+
+
+def bench_pull(devices, events_per_device, seed):
+    with isolated_app() as app:
+        _seed_events(app, devices, events_per_device, seed)
+        client = app.test_client()
+        with LatencyRecorder('pull') as recorder:
+            for device_id in _device_ids(devices):
+                with recorder.measure():
+                    response = client.get(f'/sync/pull?device_id={device_id}')
+                assert response.status_code == 200
+    return recorder.report()
+
+
+def bench_status(devices, events_per_device, seed):
+    with isolated_app() as app:
+        _seed_events(app, devices, events_per_device, seed)
+        client = app.test_client()
+        with LatencyRecorder('status') as recorder:
+            for _ in range(3):
+                for device_id in _device_ids(devices):
+                    with recorder.measure():
+                        response = client.get(f'/sync/status?device_id={device_id}&limit=20')
+                    assert response.status_code == 200
+    return recorder.report()
+
+
+def bench_periodic_sync(devices, events_per_device, seed):
+    from app.sync.manager import SyncManager
+
+    with isolated_app() as app:
+        _seed_events(app, devices, events_per_device, seed)
+        manager = SyncManager()
+        with LatencyRecorder('periodic_sync') as recorder:
+            # One periodic sync broadcasts the whole pending backlog; latency is reported per event
+            with recorder.measure(ops=devices * events_per_device):
+                manager.periodic_sync()
+    return recorder.report()
+
+
+def bench_conflict(devices, events_per_device, seed):
+    from app.extensions import db
+    from app.models.sync_event import SyncEvent
+    from app.services.conflict_resolver import ConflictResolver
+
+    with isolated_app() as app:
+        _seed_events(app, devices, events_per_device, seed)
+        resolver = ConflictResolver()
+        rng = random.Random(seed)
+        events = db.session.query(SyncEvent).order_by(SyncEvent.id).all()
+        pairs = [(rng.choice(events), rng.choice(events)) for _ in range(devices * 5)]
+        with LatencyRecorder('conflict') as recorder:
+            for event_a, event_b in pairs:
+                with recorder.measure():
+                    resolver.resolve(event_a, event_b)
+    return recorder.report()
+
+
+BENCHMARKS = {
+    'push': bench_push,
+    'pull': bench_pull,
+    'status': bench_status,
+    'periodic_sync': bench_periodic_sync,
+    'conflict': bench_conflict,
+}
+
+
+def run_suite(devices=10, events_per_device=20, workloads=WORKLOADS, seed=1234):
+    """Run the selected workloads and return a JSON-serializable report."""
+    results = {}
+    for name in workloads:
+        results[name] = BENCHMARKS[name](devices, events_per_device, seed)
+    return {
+        'suite': 'sync',
+        'parameters': {'devices': devices, 'events_per_device': events_per_device, 'seed': seed},
+        'environment': environment_info(),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sync hot-path throughput and latency benchmark')
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--events', type=int, default=20, help='events per device')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--save-baseline', metavar='NAME', help='store the report as benchmarks/baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare against a stored baseline; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    workloads = [w for w in args.workloads.split(',') if w]
+    unknown = set(workloads) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'Unknown workloads: {", ".join(sorted(unknown))}')
+
+    report = run_suite(args.devices, args.events, workloads, args.seed)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, report)
+    if args.compare:
+        regressions = compare_reports(load_baseline(args.compare), report, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
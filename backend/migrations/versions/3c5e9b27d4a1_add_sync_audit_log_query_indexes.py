@@ -0,0 +1,52 @@
+"""Add sync_audit_logs table and composite query indexes
+
+Revision ID: 3c5e9b27d4a1
+Revises: 8a1213f04992
+Create Date: 2025-08-04 10:12:45.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e9b27d4a1'
+down_revision = '8a1213f04992'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sync_audit_logs was created with db.create_all() on existing installs, so only create it when missing
+    inspector = sa.inspect(op.get_bind())
+    if 'sync_audit_logs' not in inspector.get_table_names():
+        op.create_table('sync_audit_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=True),
+        sa.Column('operation', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=True),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('details', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('sync_audit_logs', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_sync_audit_logs_timestamp'), ['timestamp'], unique=False)
+
+    with op.batch_alter_table('sync_audit_logs', schema=None) as batch_op:
+        batch_op.create_index('ix_sync_audit_logs_device_ts', ['device_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_sync_audit_logs_user_ts', ['user_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_sync_audit_logs_op_status_ts', ['operation', 'status', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    # 8a1213f04992 has no sync_audit_logs table, so it goes too (whether upgrade() or db.create_all() made it);
+    # back up the audit log before downgrading past this revision
+    with op.batch_alter_table('sync_audit_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_sync_audit_logs_op_status_ts')
+        batch_op.drop_index('ix_sync_audit_logs_user_ts')
+        batch_op.drop_index('ix_sync_audit_logs_device_ts')
+        batch_op.drop_index(batch_op.f('ix_sync_audit_logs_timestamp'))
+
+    op.drop_table('sync_audit_logs')
@@ -0,0 +1,28 @@
+"""Add idempotency_key to sync_events
+
+Revision ID: b71f04c2e9d8
+Revises: 3c5e9b27d4a1
+Create Date: 2025-08-06 15:27:03.482911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71f04c2e9d8'
+down_revision = '3c5e9b27d4a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sync_events', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(), nullable=True))
+        batch_op.create_index('ux_sync_events_idempotency_key', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sync_events', schema=None) as batch_op:
+        batch_op.drop_index('ux_sync_events_idempotency_key')
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,30 @@
+import os
+
+# Cooperative modes must monkey patch the standard library before anything else is imported
+ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from app import create_app
+from app.extensions import socketio
+from app.utils.startup import run_when_listening
+
+# Merge worker processes (app/services/merge.py) import this module as __mp_main__ and need no app
+if __name__ != '__mp_main__':
+    app = create_app()
+
+if __name__ == "__main__":
+    host = os.environ.get('HOST', '127.0.0.1')
+    port = int(os.environ.get('PORT', 5000))
+    # Deferred startup work runs once the server accepts connections (in the debug reloader's
+    # serving child only, not in the parent process that watches files)
+    if ASYNC_MODE != 'threading' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        socketio.start_background_task(run_when_listening, app, host, port, socketio.sleep)
+    if ASYNC_MODE == 'threading':
+        socketio.run(app, host=host, port=port, debug=True, allow_unsafe_werkzeug=True)
+    else:
+        socketio.run(app, host=host, port=port)
@@ -0,0 +1,53 @@
+"""
+Shared pytest fixtures: an application bound to an isolated, temporary SQLite database.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Ensure the backend/app directory is in the Python path regardless of working directory
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from app import create_app, db
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    Factory for applications with config overrides, e.g. make_app(SQL_PROFILING=True). Each one is
+    bound to its own temporary SQLite database with the schema created, and its app context stays
+    pushed until the test ends.
+    """
+    contexts = []
+
+    def make(**overrides):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / f'test{len(contexts) or ""}.db'),
+            **overrides,
+        })
+        context = app.app_context()
+        context.push()
+        contexts.append(context)
+        db.create_all()
+        return app
+
+    yield make
+    for context in reversed(contexts):
+        db.session.remove()
+        db.drop_all()
+        context.pop()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
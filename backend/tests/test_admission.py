@@ -0,0 +1,118 @@
+"""
+Test cases for token-bucket admission control on the sync routes and Socket.IO handlers.
+"""
+
+import pytest
+
+from app.extensions import db, socketio
+from app.models.sync_event import SyncEvent
+from app.services.admission import BULK, INTERACTIVE, AdmissionController
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _sale(device_id):
+    return {'event_type': 'sale', 'device_id': device_id, 'payload': {'product_id': 1, 'qty': 1}}
+
+
+def _last(client, name):
+    return [m for m in client.get_received() if m['name'] == name][-1]['args'][0]
+
+
+@pytest.fixture
+def limited_app(make_app):
+    return make_app(ADMISSION_CONTROL=True, ADMISSION_DEVICE_RATE=0.01, ADMISSION_DEVICE_BURST=3,
+                    ADMISSION_GLOBAL_RATE=0.01, ADMISSION_GLOBAL_BURST=8)
+
+
+def test_device_bucket_refills_over_time():
+    clock = _Clock()
+    controller = AdmissionController(global_rate=100, global_burst=100, device_rate=2, device_burst=2,
+                                     min_retry=0, retry_jitter=0, clock=clock)
+    assert controller.admit('till1') is None
+    assert controller.admit('till1') is None
+    assert controller.admit('till1') == ('device', 0.5)
+    assert controller.admit('till2') is None    # other devices keep their own budget
+    clock.now += 0.5
+    assert controller.admit('till1') is None
+    assert controller.stats == {'admitted': 4, 'rejected_device': 1, 'rejected_global': 0}
+
+
+def test_bulk_traffic_leaves_the_reserve_to_interactive_traffic():
+    clock = _Clock()
+    controller = AdmissionController(global_rate=1, global_burst=8, device_rate=100, device_burst=100,
+                                     bulk_reserve=0.5, clock=clock)
+    admitted_bulk = sum(controller.admit(f'till{i}', BULK) is None for i in range(8))
+    assert admitted_bulk == 4
+    assert controller.admit('till9', BULK)[0] == 'global'
+    # The reserved half of the burst still serves interactive requests
+    assert all(controller.admit(f'till{i}', INTERACTIVE) is None for i in range(4))
+    assert controller.admit('till5', INTERACTIVE)[0] == 'global'
+
+
+def test_retry_hints_are_jittered():
+    controller = AdmissionController(device_rate=1, device_burst=1, min_retry=1.0, retry_jitter=0.5)
+    controller.admit('till1')
+    hints = [controller.admit('till1')[1] for _ in range(50)]
+    assert all(1.0 <= hint <= 1.5 for hint in hints)
+    assert len(set(hints)) > 40
+
+
+def test_device_buckets_are_bounded():
+    controller = AdmissionController(max_devices=3)
+    for i in range(10):
+        controller.admit(f'till{i}')
+    assert list(controller._devices) == ['till7', 'till8', 'till9']
+
+
+def test_refused_push_gets_a_retry_hint_and_touches_nothing(limited_app):
+    client = limited_app.test_client()
+    assert [client.post('/sync/push', json=_sale('till1')).status_code for _ in range(3)] == [200] * 3
+    refused = client.post('/sync/push', json=_sale('till1'))
+    assert refused.status_code == 429
+    assert int(refused.headers['Retry-After']) >= 1
+    assert refused.get_json()['retry_after'] >= 1.0
+    assert db.session.execute(db.select(db.func.count()).select_from(SyncEvent)).scalar() == 3
+    # The device limit is per device; a pull from another till is still admitted
+    assert client.get('/sync/pull?device_id=till2').status_code == 200
+    assert client.get('/metrics').status_code == 200   # not under admission control
+
+
+def test_global_limit_answers_503(limited_app):
+    client = limited_app.test_client()
+    statuses = [client.get(f'/sync/pull?device_id=till{i}').status_code for i in range(10)]
+    assert statuses == [200] * 8 + [503] * 2
+    assert limited_app.admission.stats['rejected_global'] == 2
+    text = limited_app.test_client().get('/metrics').get_data(as_text=True)
+    assert '# TYPE sync_admission_rejected counter' in text
+    assert 'sync_admission_rejected_total{traffic="interactive",limit="global"}' in text
+
+
+def test_socket_handlers_are_refused_with_retry_hints(limited_app):
+    till = socketio.test_client(limited_app, query_string='device_id=till1')
+    till.emit('register_device', {'device_id': 'till1'})
+    till.emit('flush_begin', {'device_id': 'till1'})
+    assert _last(till, 'flush_credit')['credits'] > 0
+    # connect, register_device and flush_begin used till1's burst of 3
+    till.emit('flush_batch', {'batch_id': 7, 'events': [_sale('till1')]})
+    ack = _last(till, 'flush_ack')
+    assert ack['batch_id'] == 7 and ack['error'] == 'Server busy' and ack['retry_after'] >= 1.0
+    till.emit('register_device', {'device_id': 'till1'})
+    assert _last(till, 'overloaded')['event'] == 'register_device'
+    till.emit('heartbeat', {'device_id': 'till1'})
+    assert _last(till, 'heartbeat_ack') == {'device_id': 'till1'}   # heartbeats are never refused
+    till.disconnect()
+
+
+def test_connect_is_refused_during_a_reconnect_storm(limited_app):
+    clients = [socketio.test_client(limited_app, query_string=f'device_id=till{i}') for i in range(10)]
+    connected = [client.is_connected() for client in clients]
+    assert connected == [True] * 8 + [False] * 2
+    for client in clients[:8]:
+        client.disconnect()
@@ -0,0 +1,87 @@
+"""
+Test cases for the keyset-paginated audit log query API.
+"""
+
+import datetime
+
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+
+
+def _seed_logs():
+    base = datetime.datetime(2025, 7, 1, 9, 0, 0)
+    for i in range(30):
+        db.session.add(SyncAuditLog(
+            event_type='sync',
+            operation='push' if i % 3 else 'pull',
+            status='error' if i % 10 == 0 else 'success',
+            device_id=f'till{i % 2}',
+            user_id='cashier1',
+            # Pairs of rows share a timestamp so the id tiebreak is exercised
+            timestamp=base + datetime.timedelta(seconds=i // 2),
+            details=f'log {i}'
+        ))
+    db.session.commit()
+
+
+def test_audit_query_pages_through_device_history(client):
+    _seed_logs()
+    seen = []
+    cursor = None
+    while True:
+        url = '/sync/audit?device_id=till0&limit=4'
+        if cursor:
+            url += f'&cursor={cursor}'
+        data = client.get(url).get_json()
+        seen.extend(data['logs'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == 15
+    assert all(log['device_id'] == 'till0' for log in seen)
+    keys = [(log['timestamp'], log['id']) for log in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert len(set(keys)) == 15
+
+
+def test_audit_query_pages_past_rows_without_timestamp(client):
+    for i in range(5):
+        db.session.add(SyncAuditLog(operation='push', status='success', device_id='till9', details=f'log {i}',
+                                    timestamp=datetime.datetime(2025, 7, 1, 9, i)))
+    db.session.commit()
+    # Rows written before the column had a default (the ORM fills it in on insert)
+    db.session.execute(text("UPDATE sync_audit_logs SET timestamp = NULL WHERE details IN ('log 0', 'log 2', 'log 4')"))
+    db.session.commit()
+    seen, cursor = [], None
+    while True:
+        data = client.get('/sync/audit?device_id=till9&limit=2' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen.extend(log['details'] for log in data['logs'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    # Timestamped rows newest first, then the rows without a timestamp by id
+    assert seen == ['log 3', 'log 1', 'log 4', 'log 2', 'log 0']
+
+
+def test_audit_query_filters(client):
+    _seed_logs()
+    data = client.get('/sync/audit?operation=pull&status=error'
+                      '&since=2025-07-01T09:00:00&until=2025-07-01T09:00:10').get_json()
+    assert [log['details'] for log in data['logs']] == ['log 0']
+    assert data['next_cursor'] is None
+
+
+def test_audit_query_rejects_bad_cursor(client):
+    assert client.get('/sync/audit?cursor=not-a-cursor').status_code == 400
+
+
+def test_audit_query_uses_composite_index(app):
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM sync_audit_logs WHERE device_id = 'till0' "
+        "ORDER BY timestamp DESC, id DESC LIMIT 5"
+    )).fetchall()
+    detail = ' '.join(row[-1] for row in plan)
+    assert 'ix_sync_audit_logs_device_ts' in detail
+    assert 'TEMP B-TREE' not in detail
@@ -0,0 +1,43 @@
+"""
+Test cases for the benchmark suite helpers (a tiny smoke run, not a performance check).
+"""
+
+from benchmarks.common import compare_reports, percentile
+from benchmarks.sync_bench import WORKLOADS, run_suite
+
+
+def test_percentile_interpolates():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50.5
+    assert percentile(samples, 99) == 99.01
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_reports_flags_regressions():
+    baseline = {'results': {'push': {'p95_ms': 5.0, 'p99_ms': 8.0, 'throughput_ops_s': 200.0}}}
+    current = {'results': {'push': {'p95_ms': 7.0, 'p99_ms': 8.5, 'throughput_ops_s': 150.0}}}
+    regressions = compare_reports(baseline, current, tolerance=0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('push.p95_ms')
+    assert compare_reports(baseline, baseline) == []
+
+
+def test_suite_smoke_run():
+    report = run_suite(devices=2, events_per_device=3)
+    assert set(report['results']) == set(WORKLOADS)
+    assert report['results']['push']['ops'] == 6
+    assert report['results']['periodic_sync']['ops'] == 6
+    assert all(result['p99_ms'] >= result['p50_ms'] for result in report['results'].values())
+
+
+def test_fleet_in_process_smoke_run(capsys):
+    from benchmarks.socketio_fleet import run_in_process
+
+    latencies, delivered, cpu_seconds = run_in_process(
+        devices=5, emitters=2, events_per_emitter=2, heartbeats=1, sync_events=3)
+    assert len(latencies['heartbeat_ack']) == 5
+    # Every critical event is broadcast to every device, including the sender
+    assert len(latencies['critical_event']) == 2 * 2 * 5
+    assert len(latencies['sync_update']) == 3 * 5
+    assert delivered == 5 + 20 + 15
+    assert cpu_seconds > 0
@@ -0,0 +1,48 @@
+"""
+Test cases for blocking-work offloading used by the cooperative server modes.
+"""
+
+import threading
+
+import pytest
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.utils.db_offload import BlockingPool, OffloadedWSGI
+
+
+def test_threading_mode_runs_inline(app):
+    pool = BlockingPool('threading')
+    assert not pool.cooperative
+    assert pool.run(threading.get_ident) == threading.get_ident()
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        BlockingPool('asyncio')
+
+
+def test_gevent_pool_runs_db_work_on_worker_thread(app):
+    pytest.importorskip('gevent')
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1'))
+    db.session.commit()
+    pool = BlockingPool('gevent', max_workers=2)
+
+    def count_events():
+        return threading.get_ident(), SyncEvent.query.count()
+
+    worker_thread, count = pool.run(count_events)
+    assert count == 1
+    assert worker_thread != threading.get_ident()
+
+
+def test_offloaded_wsgi_serves_rest_routes_through_pool(app):
+    pytest.importorskip('gevent')
+    original = app.wsgi_app
+    app.wsgi_app = OffloadedWSGI(original, BlockingPool('gevent', max_workers=2))
+    try:
+        response = app.test_client().get('/sync/status?device_id=till1')
+        assert response.status_code == 200
+        assert response.get_json()['summary']['total'] == 0
+    finally:
+        app.wsgi_app = original
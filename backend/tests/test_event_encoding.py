@@ -0,0 +1,117 @@
+"""
+Test cases for the column-projected event encoding used by /sync/pull, /sync/status and SyncManager broadcasts.
+"""
+
+import datetime
+import json
+
+from sqlalchemy import event
+
+from app.extensions import db, socketio
+from app.models.sync_event import SyncEvent
+from app.sync.manager import SYNCED_UPDATE_CHUNK, SyncManager
+from app.utils.event_encoding import (EncodedEvent, SocketIOJSON, encode_event, encode_event_list, event_row,
+                                      select_events)
+
+
+def _add(device_id, status='pending', payload=None, minutes=0, user_id=None):
+    event = SyncEvent(event_type='stock_update', payload=payload or {'product_id': 1, 'new_stock': 3},
+                      device_id=device_id, user_id=user_id, status=status,
+                      timestamp=datetime.datetime(2024, 5, 1, 12, 0) + datetime.timedelta(minutes=minutes))
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def _as_dict(event):
+    return {'id': event.id, 'event_type': event.event_type, 'payload': event.payload,
+            'timestamp': event.timestamp.isoformat(), 'status': event.status,
+            'device_id': event.device_id, 'user_id': event.user_id}
+
+
+def test_projected_row_encodes_like_the_orm_object(app):
+    event = _add('till1', payload={'name': 'Café crème', 'lines': [{'qty': 2}], 'note': None}, user_id='u1')
+    row = db.session.execute(select_events(SyncEvent.id == event.id)).one()
+    # The stored payload text is spliced in without being parsed
+    assert isinstance(row.payload, str)
+    assert json.loads(encode_event(row)) == _as_dict(event)
+    assert json.loads(encode_event(event_row(event))) == _as_dict(event)
+    assert encode_event_list([]) == b'[]'
+
+
+def test_pull_returns_pending_events_from_other_devices(client):
+    mine = _add('till1')
+    theirs = [_add('till2', minutes=2), _add('till3', minutes=1)]
+    _add('till2', status='synced')
+    response = client.get('/sync/pull?device_id=till1')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    events = response.get_json()['events']
+    assert [e['id'] for e in events] == [theirs[1].id, theirs[0].id]
+    assert events[0] == _as_dict(theirs[1])
+    assert mine.id not in [e['id'] for e in events]
+    since = client.get('/sync/pull?device_id=till1&since=2024-05-01T12:01:00').get_json()['events']
+    assert [e['id'] for e in since] == [theirs[0].id]
+
+
+def test_status_summarizes_with_history_limit(client):
+    for minutes, status in enumerate(('pending', 'synced', 'synced', 'failed')):
+        _add('till1', status=status, minutes=minutes, user_id='u1')
+    _add('till2', user_id='u1')
+    body = client.get('/sync/status?device_id=till1&limit=2').get_json()
+    assert body['summary'] == {'total': 4, 'pending': 1, 'synced': 2, 'failed': 1}
+    assert [e['status'] for e in body['history']] == ['failed', 'synced']
+    assert client.get('/sync/status?user_id=u1').get_json()['summary']['total'] == 5
+
+
+def test_periodic_sync_broadcasts_pre_encoded_events_and_marks_them_synced(app):
+    events = [_add('till1'), _add('till2', minutes=1)]
+    expected = [_as_dict(e) for e in events]
+    device = socketio.test_client(app)
+    device.get_received()
+    SyncManager().periodic_sync()
+    received = [packet['args'][0] for packet in device.get_received() if packet['name'] == 'sync_update']
+    assert sorted(received, key=lambda e: e['id']) == expected
+    statuses = db.session.execute(db.select(SyncEvent.status)).scalars().all()
+    assert statuses == ['synced', 'synced']
+    device.disconnect()
+
+
+def test_periodic_sync_marks_large_backlogs_synced_in_chunks(app):
+    db.session.execute(db.insert(SyncEvent), [
+        {'event_type': 'sale', 'payload': {'qty': 1}, 'device_id': 'till1', 'status': 'pending'} for _ in range(1200)])
+    db.session.commit()
+    updates = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE sync_events'):
+            updates.append(len(parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        SyncManager().periodic_sync()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert len(updates) == 3 and max(updates) <= SYNCED_UPDATE_CHUNK + 1
+    assert db.session.query(SyncEvent).filter_by(status='synced').count() == 1200
+
+
+def test_immediate_sync_broadcasts_the_event(app):
+    event = _add('till1')
+    device = socketio.test_client(app)
+    device.get_received()
+    SyncManager().immediate_sync(event)
+    received = [packet['args'][0] for packet in device.get_received() if packet['name'] == 'critical_event']
+    assert received[0]['payload'] == {'product_id': 1, 'new_stock': 3}
+    assert db.session.get(SyncEvent, event.id).status == 'synced'
+    device.disconnect()
+
+
+def test_socketio_json_splices_encoded_events_and_decodes_them_when_nested(app):
+    event = _add('till1')
+    encoded = EncodedEvent(event_row(event))
+    packet = SocketIOJSON.dumps(['sync_update', encoded])
+    assert SocketIOJSON.loads(packet) == ['sync_update', _as_dict(event)]
+    # A message bus envelope carries the event inside a dict and is encoded normally
+    envelope = SocketIOJSON.loads(SocketIOJSON.dumps({'method': 'emit', 'data': [encoded]}))
+    assert envelope['data'] == [_as_dict(event)]
@@ -0,0 +1,145 @@
+"""
+Test cases for the append-only event log (EVENT_LOG) behind /sync/pull and SyncManager broadcasts.
+"""
+
+import datetime
+import json
+import os
+
+import pytest
+
+from app.extensions import db, socketio
+from app.models.sync_event import SyncEvent
+from app.services.event_log import INDEX_ENTRY, EventLog, EventLogStore, timestamp_micros
+from app.sync.manager import SyncManager
+
+T0 = datetime.datetime(2024, 5, 1, 12, 0)
+
+
+def _row(event_id, device_id='till1', status='pending', minutes=0):
+    return (event_id, 'sale', json.dumps({'product_id': event_id}), T0 + datetime.timedelta(minutes=minutes),
+            status, device_id, None)
+
+
+def _ids(pending):
+    return [event_id for event_id, _, _ in pending]
+
+
+@pytest.fixture
+def log_app(make_app, tmp_path):
+    return make_app(EVENT_LOG=True, EVENT_LOG_DIR=str(tmp_path / 'event_log'), EVENT_LOG_SEGMENT_BYTES=4096,
+                    EVENT_LOG_FSYNC=False, EVENT_LOG_CHECKPOINT_SECONDS=3600)
+
+
+def _add(device_id, minutes=0, product_id=1):
+    event = SyncEvent(event_type='stock_update', payload={'product_id': product_id}, device_id=device_id,
+                      timestamp=T0 + datetime.timedelta(minutes=minutes))
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def test_pending_events_are_found_through_the_status_and_offset_indexes(tmp_path):
+    log = EventLog(str(tmp_path), fsync=False)
+    log.append([_row(1, 'till1'), _row(2, 'till2', minutes=1), _row(3, 'till2', 'synced'), _row(5, 'till3', minutes=2)])
+    assert json.loads(log.read(2))['payload'] == {'product_id': 2}
+    assert log.read(4) is None   # ids may have gaps
+    assert _ids(log.pending()) == [1, 2, 5]
+    assert _ids(log.pending(exclude_device='till2')) == [1, 5]
+    assert _ids(log.pending(since=timestamp_micros(T0))) == [2, 5]
+    assert log.mark([1, 3, 4], 'synced') == [1]
+    assert _ids(log.pending()) == [2, 5]
+    assert [event_id for event_id, _ in log.read_range(1, 10)] == [2, 3, 5]
+    with pytest.raises(ValueError):
+        log.append([_row(5)])
+
+
+def test_log_and_status_survive_a_restart(tmp_path):
+    log = EventLog(str(tmp_path), segment_bytes=1024, fsync=False)
+    log.append([_row(i) for i in range(1, 41)])
+    log.mark(range(1, 31), 'synced')
+    log.close()
+    reopened = EventLog(str(tmp_path), segment_bytes=1024, fsync=False)
+    assert reopened.stats['recovered'] == 40
+    assert reopened.last_id == 40
+    assert _ids(reopened.pending()) == list(range(31, 41))
+    reopened.append([_row(41)])
+    assert _ids(reopened.pending())[-1] == 41
+
+
+def test_torn_tail_and_lost_index_entries_are_repaired(tmp_path):
+    log = EventLog(str(tmp_path), fsync=False)
+    log.append([_row(1), _row(2, 'till2', minutes=3)])
+    segment = log._segments[0]
+    # Crash after event 2's record was written but before its offset index entry and status byte
+    segment.index.mm[INDEX_ENTRY.size:2 * INDEX_ENTRY.size] = bytes(INDEX_ENTRY.size)
+    log.status.mm[2] = 0
+    # ... and in the middle of writing event 3: its index entries landed, its record did not
+    segment.index.put(2, segment.records.end, 0, 0)
+    log.status.mm[3] = 1
+    segment.records.mm[segment.records.end:segment.records.end + 8] = b'\x20\0\0\0\x01\x02\x03\x04'
+    log.close()
+    reopened = EventLog(str(tmp_path), fsync=False)
+    assert reopened.stats['torn_records'] == 1
+    assert reopened.last_id == 2
+    assert _ids(reopened.pending(exclude_device='till1')) == [2]
+    assert _ids(reopened.pending(since=timestamp_micros(T0 + datetime.timedelta(minutes=1)))) == [2]
+    reopened.append([_row(3)])
+    assert _ids(reopened.pending()) == [1, 2, 3]
+
+
+def test_compaction_drops_segments_without_pending_events(tmp_path):
+    log = EventLog(str(tmp_path), segment_bytes=4096, segment_events=8, fsync=False)
+    log.append([_row(i) for i in range(1, 31)])
+    assert log._bases == [1, 9, 17, 25]
+    log.mark(range(1, 20), 'synced')
+    assert log.compact() == 2   # ids 1-16; the segment holding 17-24 still has pending events
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.log')]) == 2
+    assert _ids(log.pending()) == list(range(20, 31))
+    assert log.read(3) is None
+
+
+def test_pull_is_served_from_the_log(log_app):
+    client = log_app.test_client()
+    _add('till2', minutes=2, product_id=1)
+    _add('till1', product_id=2)
+    _add('till3', minutes=1, product_id=3)
+    body = client.get('/sync/pull?device_id=till1').get_json()
+    assert [e['payload']['product_id'] for e in body['events']] == [3, 1]   # oldest first
+    assert body['events'][0]['status'] == 'pending'
+    since = client.get('/sync/pull?device_id=till1&since=2024-05-01T12:01:00').get_json()
+    assert [e['payload']['product_id'] for e in since['events']] == [1]
+    lines = client.get('/sync/pull?device_id=till1&format=ndjson').get_data().splitlines()
+    assert [json.loads(line)['payload']['product_id'] for line in lines] == [3, 1]
+    assert log_app.event_log.log.last_id == 3
+
+
+def test_broadcast_status_lives_in_the_log_until_the_checkpoint(log_app):
+    client = log_app.test_client()
+    ids = [_add('till2'), _add('till3', minutes=1)]
+    device = socketio.test_client(log_app)
+    device.get_received()
+    etag = client.get('/sync/pull?device_id=till1').headers['ETag']
+    SyncManager().periodic_sync()
+    received = [packet['args'][0]['id'] for packet in device.get_received() if packet['name'] == 'sync_update']
+    assert sorted(received) == ids
+    # Pull sees the change at once (and its ETag moves), though sync_events has not been written yet
+    pulled = client.get('/sync/pull?device_id=till1', headers={'If-None-Match': etag})
+    assert pulled.status_code == 200 and pulled.get_json()['events'] == []
+    assert db.session.execute(db.select(SyncEvent.status)).scalars().all() == ['pending', 'pending']
+    assert log_app.event_log.checkpoint(force=True) == 2
+    assert db.session.execute(db.select(SyncEvent.status)).scalars().all() == ['synced', 'synced']
+    device.disconnect()
+
+
+def test_status_changes_not_checkpointed_before_a_restart_are_written_later(log_app):
+    event_id = _add('till2')
+    SyncManager().immediate_sync(db.session.get(SyncEvent, event_id))
+    assert db.session.get(SyncEvent, event_id).status == 'pending'
+    log_app.event_log.log.close()
+    # A new process opens the same log and finds the change sync_events is missing
+    store = EventLogStore(log_app.config['EVENT_LOG_DIR'], fsync=False)
+    store.catch_up()
+    assert store.checkpoint(force=True) == 1
+    db.session.expire_all()
+    assert db.session.get(SyncEvent, event_id).status == 'synced'
@@ -0,0 +1,128 @@
+"""
+Test cases for time-partitioned sync_events history (rollover, pruning, retention).
+"""
+
+import datetime
+import json
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.event_partitions import partition_start
+
+NOW = datetime.datetime(2024, 6, 20, 12, 0)   # a Thursday
+
+
+def _add(device_id, days_ago, status='synced', user_id=None, idempotency_key=None):
+    event = SyncEvent(event_type='stock_update', payload={'product_id': days_ago, 'new_stock': 1},
+                      device_id=device_id, user_id=user_id, status=status, idempotency_key=idempotency_key,
+                      timestamp=NOW - datetime.timedelta(days=days_ago))
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def _enable(app, interval_days=7, retention_days=None):
+    partitions = app.event_partitions
+    partitions.enabled = True
+    partitions.interval_days = interval_days
+    partitions.retention_days = retention_days
+    return partitions
+
+
+def test_partition_start_aligns_days_and_weeks():
+    assert partition_start(NOW, 7) == datetime.date(2024, 6, 17)
+    assert partition_start(NOW, 1) == datetime.date(2024, 6, 20)
+
+
+def test_rollover_moves_old_settled_events_into_weekly_partitions(app):
+    for device_id, days_ago in (('till1', 30), ('till1', 20), ('till2', 10)):
+        _add(device_id, days_ago)
+    pending = _add('till1', 40, status='pending')
+    recent = _add('till1', 1)
+    moved = _enable(app).rollover(NOW)
+    assert moved == {'sync_events_p20240520_7d': 1, 'sync_events_p20240527_7d': 1, 'sync_events_p20240610_7d': 1}
+    hot_ids = db.session.execute(db.select(SyncEvent.id).order_by(SyncEvent.id)).scalars().all()
+    assert hot_ids == [pending, recent]
+    assert [p.name for p in app.event_partitions.partitions()] == sorted(moved)
+    # A second run finds nothing left to move
+    assert app.event_partitions.rollover(NOW) == {}
+
+
+def test_rollover_keeps_the_newest_row_so_ids_are_not_reused(app):
+    first = _add('till1', 30)
+    last = _add('till1', 20)
+    assert _enable(app).rollover(NOW) == {'sync_events_p20240520_7d': 1}
+    assert _add('till1', 0) > last > first
+
+
+def test_status_and_export_read_across_partitions(app, client):
+    for days_ago in (30, 20, 10, 1):
+        _add('till1', days_ago, user_id='u1')
+    _add('till1', 0, status='pending', user_id='u1')
+    _enable(app).rollover(NOW)
+    body = client.get('/sync/status?device_id=till1&limit=3').get_json()
+    assert body['summary'] == {'total': 5, 'pending': 1, 'synced': 4, 'failed': 0}
+    assert [e['payload']['product_id'] for e in body['history']] == [0, 1, 10]
+    lines = client.get('/sync/export/events?user_id=u1').data.splitlines()
+    assert [json.loads(line)['payload']['product_id'] for line in lines] == [30, 20, 10, 1, 0]
+
+
+def test_sources_prune_partitions_outside_the_range(app):
+    for days_ago in (30, 20, 10):
+        _add('till1', days_ago)
+    _add('till1', 0)
+    partitions = _enable(app)
+    partitions.rollover(NOW)
+    names = [t.name for t in partitions.sources(since=datetime.datetime(2024, 6, 3))]
+    assert names == ['sync_events', 'sync_events_p20240610_7d']
+    names = [t.name for t in partitions.sources(until=datetime.datetime(2024, 5, 27))]
+    assert names == ['sync_events', 'sync_events_p20240520_7d']
+
+
+def test_retention_drops_whole_partitions(app):
+    for days_ago in (30, 20, 10):
+        _add('till1', days_ago)
+    _add('till1', 0)
+    partitions = _enable(app, interval_days=1, retention_days=14)
+    result = partitions.maintain(NOW)
+    assert sorted(result['moved']) == ['sync_events_p20240521_1d', 'sync_events_p20240531_1d',
+                                       'sync_events_p20240610_1d']
+    assert result['dropped'] == ['sync_events_p20240521_1d', 'sync_events_p20240531_1d']
+    assert [p.name for p in partitions.partitions()] == ['sync_events_p20240610_1d']
+
+
+def test_idempotency_keys_of_moved_events_are_still_found(app):
+    moved = _add('till1', 30, idempotency_key='till1:7')
+    _add('till1', 0, idempotency_key='till1:8')
+    _enable(app).rollover(NOW)
+    index = app.idempotency_index
+    assert index.rebuild()
+    assert 'till1:7' in index.bloom
+    assert index.lookup('till1:7') == moved
+    assert index.lookup('till1:9') is None
+
+
+def test_dropping_partitions_expires_cached_status(app, client):
+    for days_ago in (30, 0):
+        _add('till1', days_ago)
+    partitions = _enable(app, interval_days=1, retention_days=14)
+    partitions.rollover(NOW)
+    assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 2
+    assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 2
+    assert partitions.apply_retention(NOW) == ['sync_events_p20240521_1d']
+    assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 1
+
+
+def test_partitioning_disabled_keeps_everything_in_the_hot_table(app):
+    _add('till1', 30)
+    _add('till1', 0)
+    assert app.event_partitions.maintain(NOW) == {'moved': {}, 'dropped': []}
+    assert [t.name for t in app.event_partitions.sources()] == ['sync_events']
+
+
+def test_maintain_cli_command(app):
+    _add('till1', 30)
+    _add('till1', 0)
+    _enable(app)
+    output = app.test_cli_runner().invoke(args=['events', 'maintain']).output
+    assert 'moved 1 events' in output
@@ -0,0 +1,74 @@
+"""
+Test cases for schema-driven sync event validation.
+"""
+
+from app.extensions import db, socketio
+from app.models.sync_event import SyncEvent
+from app.utils.event_schemas import EventSchemaRegistry, compile_schema
+
+
+def test_compiled_schema_reports_all_errors():
+    validate = compile_schema({
+        'sku': {'type': str, 'required': True, 'min_length': 3},
+        'qty': {'type': int, 'required': True, 'min': 0},
+        'unit': {'type': str, 'choices': ['each', 'kg']},
+    })
+    assert validate({'sku': 'ABC1', 'qty': 2, 'unit': 'kg'}) == []
+    errors = validate({'sku': 'A', 'qty': True, 'unit': 'box'})
+    assert 'Field sku must have length >= 3' in errors
+    assert 'Field qty must be of type int' in errors
+    assert 'Field unit must be one of: each, kg' in errors
+    assert validate({}) == ['Missing fields: sku, qty']
+
+
+def test_registry_validates_payload_and_tracks_cost():
+    registry = EventSchemaRegistry()
+    valid = {'event_type': 'stock_update', 'payload': {'product_id': 1, 'new_stock': 0}, 'device_id': 'dev1'}
+    assert registry.validate(valid) == []
+    assert registry.validate({**valid, 'payload': {'product_id': [1], 'new_stock': -1}}) == [
+        'Field payload.product_id must be of type int or str', 'Field payload.new_stock must be >= 0']
+    assert registry.validate({**valid, 'event_type': 'custom', 'payload': {'anything': 1}}) == []
+    assert registry.validate({**valid, 'timestamp': 'yesterday'}) == ['Field timestamp has invalid format']
+    assert registry.validate(['not', 'an', 'event']) == ['Event must be a JSON object']
+    assert registry.validate_many([valid, {}]) == [(1, ['Missing fields: event_type, payload, device_id'])]
+
+    stats = registry.stats()
+    assert stats['stock_update']['validated'] == 4
+    assert stats['stock_update']['rejected'] == 2
+    assert stats['stock_update']['mean_us'] > 0
+
+
+def test_push_rejects_malformed_event_before_database(client):
+    response = client.post('/sync/push', json={'event_type': 'stock_update', 'payload': {'product_id': {'id': 1}},
+                                               'device_id': 'dev1'})
+    assert response.status_code == 400
+    assert 'payload.product_id' in response.get_json()['error']
+    assert client.post('/sync/push', data='not json').status_code == 400
+    assert SyncEvent.query.count() == 0
+
+
+def test_stock_update_without_product_id_is_still_accepted(client):
+    # Accepted before payloads were validated; tills in the field still send these
+    response = client.post('/sync/push', json={'event_type': 'stock_update', 'payload': {'qty': 1}, 'device_id': 'dev1'})
+    assert response.status_code == 200
+    assert db.session.get(SyncEvent, response.get_json()['event_id']).payload == {'qty': 1}
+
+
+def test_push_accepts_iso_timestamp(client):
+    response = client.post('/sync/push', json={
+        'event_type': 'stock_update', 'payload': {'product_id': 1, 'qty': 5},
+        'device_id': 'dev1', 'timestamp': '2025-07-25T12:00:00'})
+    assert response.status_code == 200
+    event = db.session.get(SyncEvent, response.get_json()['event_id'])
+    assert event.timestamp.isoformat() == '2025-07-25T12:00:00'
+    assert client.get('/sync/validation/stats').get_json()['validation']['stock_update']['validated'] >= 1
+
+
+def test_critical_event_rejects_invalid_payload(app):
+    sio = socketio.test_client(app)
+    sio.get_received()
+    sio.emit('critical_event', {'event_type': 'stock_update', 'payload': {'new_stock': -5}, 'device_id': 'dev1'})
+    received = sio.get_received()
+    assert received[0]['name'] == 'error'
+    assert 'payload.new_stock' in received[0]['args'][0]['error']
+    sio.disconnect()
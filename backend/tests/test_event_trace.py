@@ -0,0 +1,104 @@
+"""
+Test cases for sampled end-to-end latency tracing of sync events.
+"""
+
+import pytest
+
+from app.extensions import db, socketio
+from app.models.sync_event import SyncEvent
+from app.services.event_trace import EventTracer
+from app.sync.manager import SyncManager
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def traced_app(make_app):
+    return make_app(EVENT_TRACE_SAMPLE_RATE=1.0)
+
+
+def test_stage_latencies_per_event_type_and_path():
+    clock = _Clock()
+    tracer = EventTracer(sample_rate=1.0, clock=clock)
+    for event_id, event_type, path in ((1, 'sale', 'periodic'), (2, 'sale', 'periodic'), (3, 'stock_update', 'immediate')):
+        tracer.persisted(event_id, event_type, received_at=0.0, persisted_at=0.002 * event_id)
+        tracer.broadcast(event_id, path, started=1.0, finished=1.0 + 0.001 * event_id)
+        clock.now = 1.5
+        tracer.acknowledged(event_id)
+    tracer.acknowledged(1)   # a second till: only the first acknowledgement counts
+    stages = tracer.summary()['stages']
+    assert stages['persist']['all'] == {'count': 3, 'p50': 4.0, 'p90': 6.0, 'p99': 6.0, 'max': 6.0}
+    assert stages['persist']['event_types']['sale'] == {'count': 2, 'p50': 2.0, 'p90': 4.0, 'p99': 4.0, 'max': 4.0}
+    assert stages['fanout']['paths']['immediate']['max'] == 3.0
+    assert stages['end_to_end']['all']['p50'] == 1500.0
+    assert tracer.stats == {'traced': 3, 'overwritten': 0, 'acks': 4}
+
+
+def test_sampling_is_decided_by_event_id():
+    tracer = EventTracer(sample_rate=0.1)
+    sampled = [event_id for event_id in range(1, 10001) if tracer.sampled(event_id)]
+    assert 900 < len(sampled) < 1100
+    assert sampled == [event_id for event_id in range(1, 10001) if EventTracer(sample_rate=0.1).sampled(event_id)]
+    assert not any(EventTracer(sample_rate=0).sampled(event_id) for event_id in range(1, 1000))
+
+
+def test_oldest_traces_are_overwritten():
+    tracer = EventTracer(sample_rate=1.0, capacity=4)
+    for event_id in range(1, 7):
+        tracer.persisted(event_id, 'sale', 0.0, 0.001)
+    assert [tracer.tracing(event_id) for event_id in range(1, 7)] == [False, False, True, True, True, True]
+    summary = tracer.summary()
+    assert summary['traces'] == 4 and summary['overwritten'] == 2
+    assert summary['stages']['persist']['all']['count'] == 4
+    assert summary['stages']['ack']['all'] == {'count': 0}
+
+
+def test_push_broadcast_and_ack_are_traced_end_to_end(traced_app):
+    client = traced_app.test_client()
+    till = socketio.test_client(traced_app)
+    event_id = client.post('/sync/push', json={'event_type': 'sale', 'device_id': 'till1',
+                                               'payload': {'product_id': 1, 'qty': 1}}).get_json()['event_id']
+    critical = SyncEvent(event_type='stock_update', payload={'product_id': 1, 'new_stock': 0}, device_id='till1')
+    db.session.add(critical)
+    db.session.commit()
+    traced_app.event_tracer.persisted(critical.id, 'stock_update', traced_app.event_tracer.clock())
+    SyncManager().immediate_sync(critical)
+    SyncManager().periodic_sync()
+    till.emit('acknowledge', {'id': event_id})
+    till.emit('acknowledge', {'event_id': critical.id})
+    stages = client.get('/sync/trace/stats').get_json()['event_trace']['stages']
+    assert stages['end_to_end']['all']['count'] == 2
+    assert stages['schedule']['paths']['periodic']['count'] == 1
+    assert stages['fanout']['event_types']['stock_update']['count'] == 1
+    assert stages['ack']['paths'].keys() == {'periodic', 'immediate'}
+    assert 'sync_event_stage_seconds_count{stage="end_to_end",event_type="sale"}' in \
+        client.get('/metrics').get_data(as_text=True)
+    till.disconnect()
+
+
+def test_critical_events_are_traced_on_the_immediate_path(traced_app):
+    sender = socketio.test_client(traced_app)
+    till = socketio.test_client(traced_app)
+    till.get_received()
+    sender.emit('critical_event', {'event_type': 'stock_update', 'device_id': 'till1', 'idempotency_key': 'till1:c1',
+                                   'payload': {'product_id': 1, 'new_stock': 0}})
+    assert [packet['name'] for packet in till.get_received()] == ['critical_event']
+    till.emit('acknowledge', {'idempotency_key': 'till1:c1'})
+    stages = traced_app.event_tracer.summary()['stages']
+    assert stages['fanout']['paths'].keys() == {'immediate'}
+    assert stages['end_to_end']['paths']['immediate']['count'] == 1
+    assert stages['end_to_end']['event_types'].keys() == {'stock_update'}
+    sender.disconnect()
+    till.disconnect()
+
+
+def test_tracing_can_be_turned_off(make_app):
+    app = make_app(EVENT_TRACE_SAMPLE_RATE=0)
+    assert app.event_tracer is None
+    assert app.test_client().get('/sync/trace/stats').get_json() == {'event_trace': None}
@@ -0,0 +1,66 @@
+"""
+Test cases for the streaming export endpoints.
+"""
+
+import csv
+import datetime
+import gzip
+import io
+import json
+
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+
+
+def _seed_events(count, device_id='dev1'):
+    base = datetime.datetime(2025, 7, 1, 12, 0, 0)
+    for i in range(count):
+        db.session.add(SyncEvent(
+            event_type='stock_update',
+            payload={'product_id': i, 'qty': i % 5},
+            device_id=device_id,
+            timestamp=base + datetime.timedelta(minutes=i),
+        ))
+    db.session.commit()
+
+
+def test_export_events_ndjson_streams_all_rows(app, client):
+    app.config['EXPORT_BATCH_SIZE'] = 7
+    _seed_events(25)
+    response = client.get('/sync/export/events?format=ndjson')
+    assert response.status_code == 200
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 25
+    first = json.loads(lines[0])
+    assert first['payload'] == {'product_id': 0, 'qty': 0}
+    assert first['timestamp'] == '2025-07-01T12:00:00'
+
+
+def test_export_events_csv_filters_by_device_and_range(client):
+    _seed_events(10, device_id='dev1')
+    _seed_events(3, device_id='dev2')
+    response = client.get('/sync/export/events?format=csv&device_id=dev1'
+                          '&since=2025-07-01T12:02:00&until=2025-07-01T12:05:00')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][0] == 'id'
+    assert len(rows) == 1 + 3
+    assert all(row[5] == 'dev1' for row in rows[1:])
+    assert json.loads(rows[1][2]) == {'product_id': 2, 'qty': 2}
+
+
+def test_export_audit_gzip(client):
+    for i in range(5):
+        db.session.add(SyncAuditLog(operation='push', status='success', device_id='dev1', details=f'Event {i} pushed'))
+    db.session.commit()
+    response = client.get('/sync/export/audit?format=ndjson&gzip=1')
+    assert response.mimetype == 'application/gzip'
+    assert 'sync_audit_logs.ndjson.gz' in response.headers['Content-Disposition']
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert [json.loads(line)['details'] for line in lines] == [f'Event {i} pushed' for i in range(5)]
+
+
+def test_export_rejects_bad_parameters(client):
+    assert client.get('/sync/export/events?format=xml').status_code == 400
+    assert client.get('/sync/export/audit?since=yesterday').status_code == 400
@@ -0,0 +1,105 @@
+"""
+Test cases for the credit-based offline queue flush protocol.
+"""
+
+from app.extensions import db, socketio
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+from app.services.event_ingest import ingest_events
+from app.services.flow_control import FlushController
+
+
+def _events(device_id, start, count):
+    return [{'event_type': 'sale', 'payload': {'n': i}, 'device_id': device_id,
+             'idempotency_key': f'{device_id}-{i}'} for i in range(start, start + count)]
+
+
+def _last(client, name):
+    return [m for m in client.get_received() if m['name'] == name][-1]['args'][0]
+
+
+def test_controller_bounds_credits_across_devices():
+    controller = FlushController(global_credits=100, max_window=60, min_window=10)
+    assert controller.begin('a', 'till-a') == 60
+    # Only 40 credits are left in the pool for the second device
+    assert controller.begin('b', 'till-b') == 40
+    assert controller.begin('c', 'till-c') == 0
+    assert controller.in_flight() == 100
+    assert controller.reserve('c', 1).startswith('Batch of 1 events exceeds')
+    assert controller.reserve('a', 60) is None
+    # After the batch is acknowledged, freed credits go to the waiting device too
+    credits, regrants = controller.complete('a', 60, {'accepted': [1] * 60, 'duplicates': [], 'rejected': []})
+    assert credits + sum(c for _, c in regrants) <= 60
+    assert ('c', 0) not in regrants and any(sid == 'c' for sid, _ in regrants)
+    summary, _ = controller.end('a')
+    assert summary['accepted'] == 60
+    controller.end('b')
+    controller.end('c')
+    assert controller.in_flight() == 0
+
+
+def test_windowed_flush_over_socket(app):
+    app.flush_controller.max_window = 25
+    till = socketio.test_client(app)
+    till.get_received()
+    till.emit('flush_begin', {'device_id': 'till1'})
+    credits = _last(till, 'flush_credit')['credits']
+    assert credits == 25
+
+    queue = _events('till1', 0, 60)
+    batch_id = 0
+    while queue:
+        batch, queue = queue[:credits], queue[credits:]
+        till.emit('flush_batch', {'batch_id': batch_id, 'events': batch})
+        ack = _last(till, 'flush_ack')
+        assert ack['batch_id'] == batch_id and len(ack['accepted']) == len(batch)
+        credits = ack['credits']
+        batch_id += 1
+
+    # Resending part of the queue after a reconnect is acknowledged without new rows
+    till.emit('flush_batch', {'batch_id': batch_id, 'events': _events('till1', 0, 5) + [{'event_type': 'sale'}]})
+    ack = _last(till, 'flush_ack')
+    assert len(ack['duplicates']) == 5 and ack['rejected'][0]['index'] == 5
+
+    till.emit('flush_end')
+    summary = _last(till, 'flush_complete')
+    assert summary == {'device_id': 'till1', 'batches': 4, 'accepted': 60, 'duplicates': 5, 'rejected': 1}
+    assert SyncEvent.query.count() == 60
+    assert app.flush_controller.in_flight() == 0
+    till.disconnect()
+
+
+def test_batch_over_credit_is_refused(app):
+    app.flush_controller.max_window = 5
+    till = socketio.test_client(app)
+    till.emit('flush_begin', {'device_id': 'till2'})
+    till.emit('flush_batch', {'batch_id': 'b1', 'events': _events('till2', 0, 6)})
+    assert 'exceeds granted credits' in _last(till, 'flush_ack')['error']
+    assert SyncEvent.query.count() == 0
+    till.disconnect()
+    assert app.flush_controller.in_flight() == 0
+
+
+def test_flush_takes_only_events_of_the_flushing_device(app):
+    till = socketio.test_client(app)
+    till.emit('flush_batch', {'batch_id': 'b0', 'events': _events('till1', 0, 1)})
+    assert _last(till, 'flush_ack')['error'] == 'No flush in progress; send flush_begin first'
+    till.emit('flush_begin', {'device_id': 'till1'})
+    till.emit('flush_batch', {'batch_id': 'b1', 'events': _events('till1', 0, 2) + _events('till2', 2, 1)})
+    ack = _last(till, 'flush_ack')
+    assert len(ack['accepted']) == 2
+    assert ack['rejected'] == [{'index': 2, 'errors': ['Field device_id must be till1 (the sending device)']}]
+    assert {event.device_id for event in SyncEvent.query} == {'till1'}
+    till.disconnect()
+
+
+def test_unique_key_race_is_stored_one_by_one_and_audited(app):
+    app.idempotency_index.rebuild()
+    # Stored by another worker after this one built its Bloom filter
+    db.session.add(SyncEvent(event_type='sale', payload={'n': 1}, device_id='till1', idempotency_key='till1-1'))
+    db.session.commit()
+    result = ingest_events(_events('till1', 0, 3), app.idempotency_index, operation='flush', device_id='till1')
+    assert [item['index'] for item in result['accepted']] == [0, 2]
+    assert [item['index'] for item in result['duplicates']] == [1]
+    log = SyncAuditLog.query.filter_by(operation='flush').one()
+    assert log.details.startswith('2 events ingested one by one')
@@ -0,0 +1,132 @@
+"""
+Test cases for the group-commit writer behind /sync/push.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+from app.services.group_commit import GroupCommitWriter
+
+
+def _event(device_id='till1', key=None, product_id=1):
+    data = {'event_type': 'sale', 'device_id': device_id, 'payload': {'product_id': product_id, 'qty': 1}}
+    if key:
+        data['idempotency_key'] = key
+    return data
+
+
+def test_push_is_committed_by_the_writer(app, client):
+    response = client.post('/sync/push', json=_event())
+    assert response.status_code == 200
+    event_id = response.get_json()['event_id']
+    assert db.session.get(SyncEvent, event_id).status == 'pending'
+    audit = db.session.execute(db.select(SyncAuditLog.details).where(SyncAuditLog.operation == 'push')).scalar()
+    assert audit == f'Event {event_id} pushed'
+    assert app.push_writer.stats['events'] == 1
+
+
+def test_concurrent_pushes_share_commits(app):
+    def push(i):
+        response = app.test_client().post('/sync/push', json=_event(device_id=f'till{i % 8}', product_id=i))
+        assert response.status_code == 200
+        return response.get_json()['event_id']
+
+    with ThreadPoolExecutor(16) as pool:
+        ids = list(pool.map(push, range(200)))
+    assert len(set(ids)) == 200
+    assert db.session.execute(db.select(db.func.count()).select_from(SyncEvent)).scalar() == 200
+    stats = app.push_writer.stats
+    assert stats['events'] == 200
+    assert stats['batches'] < 200
+
+
+def test_batch_resolves_each_caller_with_its_own_event(app):
+    writer = GroupCommitWriter(app)
+    batch = [(_event(product_id=i, key=f'k{i}'), Future()) for i in range(4)]
+    batch.append((_event(product_id=9, key='k2'), Future()))   # same key as an earlier push in the batch
+    writer._commit(batch)
+    results = [future.result(0) for _, future in batch]
+    assert [db.session.get(SyncEvent, event_id).payload['product_id'] for event_id, _ in results[:4]] == [0, 1, 2, 3]
+    assert [duplicate for _, duplicate in results] == [False] * 4 + [True]
+    assert results[4][0] == results[2][0]
+    assert writer.stats == {'batches': 1, 'events': 5, 'largest_batch': 5, 'fallbacks': 0}
+    assert db.session.execute(db.select(db.func.count()).select_from(SyncAuditLog)).scalar() == 4
+
+
+def test_retry_of_a_stored_key_is_acknowledged_as_duplicate(app, client):
+    first = client.post('/sync/push', json=_event(key='abc')).get_json()
+    again = client.post('/sync/push', json=_event(key='abc'))
+    assert again.status_code == 200
+    assert again.get_json() == {'message': 'Event already received', 'event_id': first['event_id'], 'duplicate': True}
+
+
+def test_key_race_falls_back_to_per_event_inserts(app):
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till9', idempotency_key='raced'))
+    db.session.commit()
+    stored_id = db.session.execute(db.select(SyncEvent.id)).scalar()
+    # The handler's lookup missed the key (e.g. stored by another worker after the Bloom filter check)
+    result = app.push_writer.submit(_event(key='raced')).result(5)
+    fresh = app.push_writer.submit(_event(key='fresh')).result(5)
+    assert result == (stored_id, True)
+    assert fresh[1] is False
+    assert app.push_writer.stats['fallbacks'] == 1
+
+
+def test_failed_batch_is_reported_to_every_caller(app, client, monkeypatch):
+    def broken(batch):
+        raise RuntimeError('disk I/O error')
+
+    monkeypatch.setattr(app.push_writer, '_insert', broken)
+    response = client.post('/sync/push', json=_event())
+    assert response.status_code == 500
+    assert 'disk I/O error' in response.get_json()['error']
+    with pytest.raises(RuntimeError):
+        app.push_writer.submit(_event()).result(5)
+
+
+def test_group_commit_can_be_disabled(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'off.db'),
+                      'PUSH_GROUP_COMMIT': False})
+    with app.app_context():
+        db.create_all()
+        assert app.push_writer is None
+        assert app.test_client().post('/sync/push', json=_event()).status_code == 200
+        db.session.remove()
+
+
+def test_timed_out_pushes_are_withdrawn_or_reported_as_unknown(app):
+    app.config['PUSH_GROUP_COMMIT_TIMEOUT'] = 0.1
+    writer = app.push_writer
+    taken, release = threading.Event(), threading.Event()
+    insert = writer._insert
+
+    def slow_insert(batch):
+        taken.set()
+        release.wait(5)
+        return insert(batch)
+
+    writer._insert = slow_insert
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(lambda: app.test_client().post('/sync/push', json=_event(product_id=1)))
+        assert taken.wait(5)
+        # The writer is busy: the second push times out while still queued and is withdrawn
+        second = app.test_client().post('/sync/push', json=_event(product_id=2))
+        assert second.status_code == 503 and second.get_json()['outcome'] == 'not_stored'
+        # The first push was already taken: its outcome is unknown, not a failure
+        response = first.result(5)
+        assert response.status_code == 504 and response.get_json()['outcome'] == 'unknown'
+        release.set()
+    deadline = time.monotonic() + 5
+    while writer.stats['events'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    db.session.expire_all()
+    stored = [event.payload['product_id'] for event in SyncEvent.query.all()]
+    assert stored == [1]
+    assert not SyncAuditLog.query.filter_by(status='error').count()
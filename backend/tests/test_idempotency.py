@@ -0,0 +1,114 @@
+"""
+Test cases for idempotent ingest (idempotency keys + Bloom filter front).
+"""
+
+import threading
+import time
+
+from app.extensions import db, socketio
+from app.models.sync_event import SyncEvent
+from app.services.idempotency import IdempotencyIndex
+from app.utils.bloom_filter import BloomFilter
+
+
+def _event(key=None):
+    data = {'event_type': 'sale', 'payload': {'total': 10}, 'device_id': 'till1'}
+    if key:
+        data['idempotency_key'] = key
+    return data
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [f'till1-{i}' for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_retried_push_is_acknowledged_not_inserted(client):
+    first = client.post('/sync/push', json=_event('till1-0001'))
+    retry = client.post('/sync/push', json=_event('till1-0001'))
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_json() == {'message': 'Event already received', 'event_id': first.get_json()['event_id'], 'duplicate': True}
+    assert SyncEvent.query.count() == 1
+
+    header_retry = client.post('/sync/push', json=_event(), headers={'Idempotency-Key': 'till1-0001'})
+    assert header_retry.get_json()['duplicate'] is True
+    # Events without a key are never deduplicated
+    client.post('/sync/push', json=_event())
+    client.post('/sync/push', json=_event())
+    assert SyncEvent.query.count() == 3
+
+
+def test_index_rebuilds_from_database_and_skips_probes(app):
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1', idempotency_key='stored-key'))
+    db.session.commit()
+    index = IdempotencyIndex(capacity=100)
+    assert index.rebuild()
+    assert index.lookup('stored-key') is not None
+    assert index.lookup('never-seen') is None
+    assert index.stats['bloom_negative'] >= 1
+    assert index.stats['duplicates'] == 1
+
+
+def test_filter_grows_in_the_background_and_keeps_late_keys(app):
+    index = IdempotencyIndex(capacity=10)
+    assert index.rebuild()
+    started, release = threading.Event(), threading.Event()
+    read_tables = index._tables
+
+    def slow_tables(conn):
+        if threading.current_thread().name == 'idempotency-rebuild':
+            started.set()
+            release.wait(5)
+        return read_tables(conn)
+
+    index._tables = slow_tables
+    for i in range(11):
+        db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1', idempotency_key=f'k{i}'))
+        db.session.commit()
+        index.add(f'k{i}')
+    assert started.wait(5)
+    # The growing rebuild is still reading: lookups are served from the current filter
+    assert index.lookup('k3') is not None and index.bloom.capacity == 10
+    index.add('late')
+    release.set()
+    deadline = time.monotonic() + 5
+    while index._growing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.bloom.capacity == 22
+    assert all(key in index.bloom for key in ['late'] + [f'k{i}' for i in range(11)])
+
+
+def test_counters_are_exact_under_concurrent_lookups(app):
+    index = IdempotencyIndex(capacity=100)
+    assert index.rebuild()
+
+    def look_up(worker):
+        for i in range(500):
+            index.lookup(f'new-{worker}-{i}')
+
+    threads = [threading.Thread(target=look_up, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert index.stats['bloom_negative'] == 4000   # the filter is empty: every lookup is a negative
+
+
+def test_retried_critical_event_is_not_rebroadcast(app):
+    sender = socketio.test_client(app)
+    listener = socketio.test_client(app)
+    event = {'event_type': 'stock_update', 'payload': {'product_id': 1, 'new_stock': 0},
+             'device_id': 'till1', 'idempotency_key': 'till1-crit-1'}
+    sender.emit('critical_event', event)
+    sender.emit('critical_event', event)
+    broadcasts = [m for m in listener.get_received() if m['name'] == 'critical_event']
+    assert len(broadcasts) == 1
+    acks = [m for m in sender.get_received() if m['name'] == 'acknowledged']
+    assert acks[0]['args'][0]['duplicate'] is True
+    sender.disconnect()
+    listener.disconnect()
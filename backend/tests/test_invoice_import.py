@@ -0,0 +1,138 @@
+"""
+Test cases for the streaming supplier invoice import.
+"""
+
+import datetime
+import io
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+from app.services.invoice_import import InvoiceImporter, read_invoice_lines
+
+HEADER = 'invoice_number,supplier_id,product_id,quantity,cost_price,batch_number,expiry_date\n'
+
+
+def _csv(count, invoice='INV-1', start=0):
+    return ''.join(f'{invoice},3,{i},{i % 5 + 1},2.5,B{i // 10},2027-01-01\n' for i in range(start, start + count))
+
+
+def _events():
+    return SyncEvent.query.filter_by(event_type='invoice_batch').order_by(SyncEvent.id).all()
+
+
+def test_csv_lines_are_grouped_into_batch_events(app):
+    progress = []
+    importer = InvoiceImporter(app.idempotency_index, batch_lines=4, batches_per_transaction=2,
+                               progress=progress.append)
+    result = importer.run(read_invoice_lines(io.StringIO(HEADER + _csv(10)), 'csv'))
+    assert result['lines'] == result['accepted_lines'] == 10
+    assert (result['events'], result['transactions']) == (3, 2)
+    assert [update['accepted_lines'] for update in progress] == [8, 10]
+    events = _events()
+    assert [len(event.payload['lines']) for event in events] == [4, 4, 2]
+    assert events[1].payload['first_line'] == 5 and events[1].idempotency_key.startswith('invoice:3:INV-1:5:')
+    assert events[0].payload['lines'][1] == {'product_id': 1, 'quantity': 2, 'cost_price': 2.5,
+                                             'batch_number': 'B0', 'expiry_date': '2027-01-01'}
+    assert SyncAuditLog.query.filter_by(operation='invoice_import').count() == 2
+
+
+def test_invalid_lines_are_reported_and_skipped(app):
+    body = HEADER + 'INV-1,3,1,2,2.5,,\nINV-1,3,2,two,2.5,,\nINV-1,3,3,1,-1,,2027-13-01\n,3,4,1,1,,\n'
+    result = InvoiceImporter(app.idempotency_index).run(read_invoice_lines(io.StringIO(body), 'csv'))
+    assert (result['accepted_lines'], result['rejected_lines']) == (1, 3)
+    assert result['errors'][0] == {'line': 2, 'errors': ['Field quantity must be of type int or float']}
+    assert result['errors'][1]['errors'] == ['Field cost_price must be >= 0', 'Field expiry_date has invalid format']
+    assert result['errors'][2]['errors'] == ['Field invoice_number must not be null']
+
+
+def test_json_arrays_and_ndjson_are_read_in_chunks():
+    lines = [{'product_id': i, 'quantity': 1, 'cost_price': 0.5, 'note': 'x' * i} for i in range(50)]
+    array = io.StringIO(' [\n' + ',\n'.join(json.dumps(line) for line in lines) + ']\n')
+    assert [record for _, record in read_invoice_lines(array, 'json', chunk_size=16)] == lines
+    ndjson = io.StringIO(''.join(json.dumps(line) + '\n' for line in lines) + '42\n')
+    assert [record for _, record in read_invoice_lines(ndjson, 'ndjson', chunk_size=7)] == lines + [42]
+    with pytest.raises(ValueError):
+        list(read_invoice_lines(io.StringIO('[{"product_id": 1}, {"product_id": '), 'json', chunk_size=8))
+
+
+def test_import_endpoint_streams_progress_and_skips_reimports(app, client):
+    app.config['INVOICE_IMPORT_BATCH_LINES'] = 100
+    app.config['INVOICE_IMPORT_TRANSACTION_BATCHES'] = 5
+    body = HEADER + _csv(1200) + _csv(30, invoice='INV-2')
+    response = client.post('/sync/import/invoices?device_id=backoffice', data=body, content_type='text/csv')
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    updates = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [update['progress']['accepted_lines'] for update in updates[:-1]] == [500, 1000, 1230]
+    assert updates[-1]['result']['events'] == 13
+    assert {event.device_id for event in _events()} == {'backoffice'}
+    # The same delivery again, with another batch size: every line is recognised as stored
+    app.config['INVOICE_IMPORT_BATCH_LINES'] = 64
+    again = client.post('/sync/import/invoices', data=body, content_type='text/csv').get_data(as_text=True)
+    result = json.loads(again.splitlines()[-1])['result']
+    assert (result['events'], result['duplicate_lines']) == (0, 1230)
+    assert db.session.query(SyncEvent).count() == 13
+
+
+def test_reimporting_a_fixed_file_stores_only_the_missing_lines(app):
+    def run(body):
+        importer = InvoiceImporter(app.idempotency_index, batch_lines=2)
+        return importer.run(read_invoice_lines(io.StringIO(HEADER + body), 'csv'))
+
+    broken = _csv(1, start=1) + 'INV-1,3,2,two,2.5,,\n' + _csv(2, start=3)
+    assert run(broken)['accepted_lines'] == 3
+    result = run(_csv(4, start=1))
+    assert (result['accepted_lines'], result['duplicate_lines'], result['events']) == (1, 3, 1)
+    stored = sorted(line['product_id'] for event in _events() for line in event.payload['lines'])
+    assert stored == [1, 2, 3, 4]
+    # A repeated line in a later delivery of the same invoice is a new line, not a duplicate
+    assert run(_csv(4, start=1) + _csv(1, start=1))['accepted_lines'] == 1
+
+
+def test_stored_lines_are_found_by_key_range_in_every_partition(app):
+    InvoiceImporter(app.idempotency_index, batch_lines=2).run(read_invoice_lines(io.StringIO(HEADER + _csv(4)), 'csv'))
+    db.session.execute(db.update(SyncEvent).values(status='synced'))
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1', status='synced'))
+    db.session.commit()
+    partitions = app.event_partitions
+    partitions.enabled = True
+    assert partitions.rollover(datetime.datetime.utcnow() + datetime.timedelta(days=30))
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'idempotency_key >=' in statement:
+            queries.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        importer = InvoiceImporter(app.idempotency_index, partitions=partitions)
+        result = importer.run(read_invoice_lines(io.StringIO(HEADER + _csv(5)), 'csv'))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert (result['accepted_lines'], result['duplicate_lines']) == (1, 4)
+    assert len(queries) == 2   # the hot table and the partition
+    connection = db.session.connection().connection
+    for statement, parameters in queries:
+        plan = ' '.join(row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters))
+        assert 'idempotency_key' in plan and 'SCAN' not in plan
+
+
+def test_json_lines_take_invoice_fields_from_the_query(client):
+    body = json.dumps([{'product_id': 'P-1', 'quantity': 1.5, 'cost_price': 4}])
+    response = client.post('/sync/import/invoices?supplier_id=9&invoice_number=A-77', data=body,
+                           content_type='application/json')
+    assert json.loads(response.get_data(as_text=True).splitlines()[-1])['result']['accepted_lines'] == 1
+    payload = _events()[0].payload
+    assert (payload['supplier_id'], payload['invoice_number']) == (9, 'A-77')
+    assert payload['lines'] == [{'product_id': 'P-1', 'quantity': 1.5, 'cost_price': 4}]
+
+
+def test_cli_import(app, tmp_path):
+    path = tmp_path / 'delivery.csv'
+    path.write_text(HEADER + _csv(3))
+    output = app.test_cli_runner().invoke(args=['invoices', 'import', str(path)]).output
+    assert 'Imported 3 of 3 lines as 1 events (0 already imported, 0 rejected)' in output
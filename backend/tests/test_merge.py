@@ -0,0 +1,112 @@
+"""
+Test cases for field-level three-way merges of concurrently edited records.
+"""
+
+import datetime
+
+import pytest
+
+from app.extensions import db
+from app.models.sync_audit_log import SyncAuditLog
+from app.models.sync_event import SyncEvent
+from app.services.conflict_resolver import ConflictResolver
+from app.services.merge import MISSING, MergeEngine, three_way_merge
+from app.sync.services import SyncService
+
+BASE = {'sku': 'A1', 'name': 'Cola', 'price': 1.0, 'tax': {'rate': 0.2, 'code': 'S'}, 'tags': ['drink']}
+
+
+def test_edits_to_different_fields_are_all_kept():
+    ours = {**BASE, 'price': 1.2, 'tax': {'rate': 0.2, 'code': 'R'}}
+    theirs = {**BASE, 'name': 'Cola 330ml', 'tax': {'rate': 0.1, 'code': 'S'}, 'tags': ['drink', 'can']}
+    merged, conflicts = three_way_merge(BASE, ours, theirs)
+    assert merged == {'sku': 'A1', 'name': 'Cola 330ml', 'price': 1.2, 'tax': {'rate': 0.1, 'code': 'R'},
+                      'tags': ['drink', 'can']}
+    assert conflicts == []
+
+
+def test_conflicting_edits_go_to_the_preferred_side_and_are_reported():
+    ours = {**BASE, 'price': 1.2, 'tags': ['soda']}
+    theirs = {**BASE, 'price': 1.5, 'tags': ['soda']}
+    merged, conflicts = three_way_merge(BASE, ours, theirs, prefer='theirs')
+    assert merged['price'] == 1.5 and merged['tags'] == ['soda']   # identical changes are not conflicts
+    assert [(c.path, c.base, c.ours, c.theirs, c.resolved) for c in conflicts] == [(('price',), 1.0, 1.2, 1.5, 1.5)]
+    with pytest.raises(ValueError):
+        three_way_merge(BASE, ours, theirs, prefer='newest')
+
+
+def test_additions_and_deletions():
+    ours = {key: value for key, value in BASE.items() if key != 'tags'}
+    theirs = {**BASE, 'barcode': '5000'}
+    merged, conflicts = three_way_merge(BASE, ours, theirs)
+    assert 'tags' not in merged and merged['barcode'] == '5000' and conflicts == []
+    # Deleted on one side, changed on the other
+    merged, conflicts = three_way_merge(BASE, ours, {**BASE, 'tags': ['can']}, prefer='theirs')
+    assert merged['tags'] == ['can'] and conflicts[0].ours is MISSING
+
+
+def test_additive_counters_apply_both_changes():
+    base = {'product_id': 7, 'new_stock': 20}
+    merged, conflicts = three_way_merge(base, {'product_id': 7, 'new_stock': 18},
+                                        {'product_id': 7, 'new_stock': 15}, additive=('new_stock',))
+    assert merged['new_stock'] == 13 and conflicts == []
+
+
+def test_parallel_batches_match_inline_merges():
+    items = [(dict(BASE, price=i), dict(BASE, price=i + 1, name=f'n{i}'), dict(BASE, price=i + 2))
+             for i in range(60)]
+    engine = MergeEngine(workers=2, parallel_threshold=50, chunk_size=16)
+    try:
+        results = engine.merge_many(items)
+        assert results == [three_way_merge(*item) for item in items]
+        assert results[3].conflicts[0].base == 3
+        assert engine.stats['parallel_batches'] == 1 and engine.stats['conflicts'] == 60
+    finally:
+        engine.close()
+
+
+def test_sync_service_merges_batches_against_local_data():
+    local = [dict(BASE, price=2.0), None]
+    incoming = [dict(BASE, name='Cola Zero'), {'sku': 'B2', 'price': 3.0}]
+    results = SyncService().merge_data(incoming, local, [BASE, None])
+    assert results[0].merged == dict(BASE, price=2.0, name='Cola Zero')
+    assert results[1].merged == {'sku': 'B2', 'price': 3.0}   # no local version: taken as it comes
+
+
+def test_merge_endpoint(client):
+    response = client.post('/sync/merge', json={'prefer': 'incoming', 'records': [
+        {'base': BASE, 'local': dict(BASE, price=1.2, name='Cola Classic'), 'incoming': dict(BASE, price=0.9)}]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['merged'] == [dict(BASE, price=0.9, name='Cola Classic')]
+    assert body['conflicts'] == [[{'field': 'price', 'base': 1.0, 'local': 1.2, 'incoming': 0.9, 'resolved': 0.9}]]
+    assert client.post('/sync/merge', json={'records': [{'base': BASE}]}).status_code == 400
+
+
+def test_merge_endpoint_rejects_malformed_additive_and_versions(client):
+    record = {'base': BASE, 'local': dict(BASE, price=1.2), 'incoming': dict(BASE, price=0.9)}
+    for body in ({'records': [record], 'additive': 5}, {'records': [record], 'additive': 'qty'},
+                 {'records': [record], 'additive': ['qty', 1]}, {'records': [dict(record, local='oops')]},
+                 {'records': [dict(record, base=[1])]}):
+        response = client.post('/sync/merge', json=body)
+        assert response.status_code == 400, body
+    assert client.post('/sync/merge', json={'records': [dict(record, local=None)], 'additive': ['qty']}).status_code == 200
+
+
+def test_conflict_resolver_merges_against_the_common_ancestor(app):
+    def event(payload, minute, device_id):
+        row = SyncEvent(event_type='product_update', payload=payload, device_id=device_id,
+                        timestamp=datetime.datetime(2024, 1, 1, 12, minute))
+        db.session.add(row)
+        db.session.commit()
+        return row
+
+    base = event({'product_id': 7, 'price': 1.0, 'new_stock': 20}, 0, 'master')
+    later = event({'product_id': 7, 'price': 1.5, 'new_stock': 15}, 9, 'till2')
+    earlier = event({'product_id': 7, 'price': 1.2, 'new_stock': 18}, 5, 'till1')
+    merged, conflicts = ConflictResolver().merge(base, later, earlier, additive=('new_stock',))
+    assert merged == {'product_id': 7, 'price': 1.2, 'new_stock': 13}   # the earlier price wins
+    assert [c.path for c in conflicts] == [('price',)]
+    log = SyncAuditLog.query.filter_by(operation='merge').one()
+    assert log.status == 'merged_with_conflicts' and log.device_id == 'till2'
+    assert log.details == f'{earlier.id} + {later.id} on base {base.id}; {earlier.id} kept for: price'
@@ -0,0 +1,92 @@
+"""
+Test cases for the local message bus and the shared device registry used by multi-worker deployments.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from app import create_app
+from app.extensions import socketio
+from app.services.device_registry import DeviceRegistry, SQLiteDeviceRegistry
+from app.services.message_bus import SQLiteMessageBus, bus_path
+
+
+def test_bus_url_must_name_a_sqlite_file():
+    assert bus_path('sqlite:////tmp/bus.db') == '/tmp/bus.db'
+    for url in ('redis://localhost', 'sqlite:///', 'bus.db'):
+        with pytest.raises(ValueError):
+            bus_path(url)
+
+
+def test_emit_from_another_process_reaches_listener(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'bus.db')
+    listener = SQLiteMessageBus(url, poll_interval=0.01)
+    messages = listener._listen()
+    # Publish from a separate worker process, as an emit made there would be
+    script = ('from app.services.message_bus import SQLiteMessageBus;'
+              f'SQLiteMessageBus({url!r}, write_only=True).emit("sync_update", {{"id": 7}}, namespace="/")')
+    subprocess.run([sys.executable, '-c', script], check=True, cwd=str(tmp_path.parent), env={
+        'PYTHONPATH': ':'.join(sys.path)})
+    message = json.loads(next(messages))
+    assert message['method'] == 'emit'
+    assert message['event'] == 'sync_update'
+    assert message['data'] == [{'id': 7}]
+    assert message['host_id'] != listener.host_id
+
+
+def test_listener_only_sees_messages_published_after_it_started(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'bus.db')
+    publisher = SQLiteMessageBus(url, write_only=True)
+    publisher._publish({'method': 'emit', 'event': 'old'})
+    messages = SQLiteMessageBus(url)._listen()
+    publisher._publish({'method': 'emit', 'event': 'new'})
+    assert json.loads(next(messages))['event'] == 'new'
+
+
+def test_sqlite_registry_is_shared_between_workers(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'bus.db')
+    worker_a, worker_b = SQLiteDeviceRegistry(url), SQLiteDeviceRegistry(url)
+    worker_a.register('till1', 'sid-a', 'master')
+    worker_b.register('till2', 'sid-b')
+    assert worker_b.master_device_id == 'till1'
+    assert worker_b.get('till1') == {'sid': 'sid-a', 'role': 'master'}
+    assert set(worker_a.devices()) == {'till1', 'till2'}
+    worker_a.set_master('till2')
+    assert worker_b.master_device_id == 'till2'
+    assert worker_b.unregister_sid('sid-a') == ['till1']
+    assert worker_a.count() == 1
+
+
+def test_devices_of_workers_that_stopped_beating_are_dropped(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'bus.db')
+    clock = [1000.0]
+    crashed = SQLiteDeviceRegistry(url, heartbeat_interval=10, clock=lambda: clock[0])
+    crashed.register('till1', 'sid-a')
+    survivor = SQLiteDeviceRegistry(url, heartbeat_interval=10, clock=lambda: clock[0])
+    survivor.register('till2', 'sid-b')
+    clock[0] += 25
+    assert survivor.heartbeat() == 0   # still within 3 intervals of the crashed worker's last beat
+    clock[0] += 10
+    assert survivor.heartbeat() == 1
+    assert set(survivor.devices()) == {'till2'}
+
+
+def test_app_without_bus_keeps_state_in_process(app):
+    assert type(app.device_registry) is DeviceRegistry
+    assert not isinstance(socketio.server.manager, SQLiteMessageBus)
+
+
+def test_app_with_bus_uses_shared_manager_and_registry(tmp_path):
+    bus_app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'MESSAGE_BUS_URL': 'sqlite:///' + str(tmp_path / 'bus.db'),
+    })
+    assert isinstance(socketio.server.manager, SQLiteMessageBus)
+    assert isinstance(bus_app.device_registry, SQLiteDeviceRegistry)
+    # Later apps built without a bus must not inherit the shared manager
+    create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'plain.db')})
+    assert not isinstance(socketio.server.manager, SQLiteMessageBus)
@@ -0,0 +1,56 @@
+"""
+Test cases for the metrics registry and the /metrics endpoint.
+"""
+
+from app.extensions import socketio
+from app.utils.metrics import MetricsRegistry
+
+
+def test_histogram_exposition_is_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('op_seconds', 'Operation time', ('op',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.labels('push').observe(value)
+    registry.counter('ops', 'Operations').inc(3)
+    gauge = registry.gauge('depth', 'Queue depth')
+    gauge.set_function(lambda: 7)
+    text = registry.expose()
+    assert 'op_seconds_bucket{op="push",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{op="push",le="1"} 3' in text
+    assert 'op_seconds_bucket{op="push",le="+Inf"} 4' in text
+    assert 'op_seconds_count{op="push"} 4' in text
+    assert 'ops_total 3' in text
+    assert 'depth 7' in text
+    assert '# TYPE op_seconds histogram' in text
+
+
+def test_timer_decorator_observes_each_call():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('call_seconds', 'Call time')
+
+    @histogram.time()
+    def work():
+        return 42
+
+    assert work() == 42 and work() == 42
+    assert 'call_seconds_count 2' in registry.expose()
+
+
+def test_metrics_endpoint_reports_sync_hot_paths(app, client):
+    client.post('/sync/push', json={'event_type': 'sale', 'payload': {'total': 1}, 'device_id': 'till1'})
+    client.get('/sync/pull?device_id=till2')
+    device = socketio.test_client(app)
+    device.emit('register_device', {'device_id': 'till1'})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    for line in ('sync_push_latency_seconds_count', 'sync_pull_latency_seconds_count',
+                 'sync_db_commit_seconds_count', 'sync_db_transaction_seconds_count',
+                 'sync_payload_bytes_bucket{route="push"', 'sync_events{status="pending"} 1',
+                 'sync_events{status="queued"} 0', 'sync_connected_devices 1',
+                 'sync_flush_credits_in_flight 0', 'sync_validation_mean_seconds{event_type="_other"}'):
+        assert line in text
+    device.disconnect()
+    assert 'sync_connected_devices 0' in client.get('/metrics').get_data(as_text=True)
@@ -0,0 +1,153 @@
+"""
+Test cases for the durable offline queue behind SyncManager.queue_event / perform_periodic_sync.
+"""
+
+import os
+import subprocess
+import sys
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.offline_queue import RECORD_HEADER, OfflineQueue
+from app.services.sync_manager import RejectedEvent, SyncManager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sale(i):
+    return {'event_type': 'sale', 'device_id': 'till1', 'payload': {'product_id': i, 'qty': 1}}
+
+
+def _drain(queue, batch=7):
+    seen = []
+    while True:
+        items = queue.peek(batch)
+        if not items:
+            return seen
+        seen.extend(record['payload']['product_id'] for _, record in items)
+        queue.ack(items[-1][0])
+
+
+def _segments(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.seg'))
+
+
+def test_drains_in_order_and_only_unacked_events_survive_a_restart(tmp_path):
+    queue = OfflineQueue(str(tmp_path), fsync=False)
+    seqs = [queue.append(_sale(i)) for i in range(5)]
+    assert seqs == [1, 2, 3, 4, 5]
+    first = queue.peek(2)
+    queue.ack(first[-1][0])
+    queue.close()
+    reopened = OfflineQueue(str(tmp_path), fsync=False)
+    assert len(reopened) == 3
+    assert _drain(reopened) == [2, 3, 4]
+    assert reopened.append(_sale(5)) == 6   # sequence numbers keep rising after a restart
+
+
+def test_events_beyond_the_memory_budget_spill_to_the_log(tmp_path):
+    queue = OfflineQueue(str(tmp_path), memory_bytes=1024, memory_events=8, segment_bytes=2048, fsync=False)
+    for i in range(300):
+        queue.append(_sale(i))
+    assert len(queue) == 300
+    assert queue.memory_bytes <= 1024
+    assert queue.stats['spilled'] >= 292
+    assert len(_segments(tmp_path)) > 1
+    assert _drain(queue) == list(range(300))
+    # A drained queue leaves no segment files behind
+    assert _segments(tmp_path) == []
+
+
+def test_appends_while_draining_keep_their_order(tmp_path):
+    queue = OfflineQueue(str(tmp_path), memory_events=4, segment_bytes=512, fsync=False)
+    for i in range(10):
+        queue.append(_sale(i))
+    queue.ack(queue.peek(3)[-1][0])
+    for i in range(10, 15):
+        queue.append(_sale(i))
+    assert _drain(queue, batch=2) == list(range(3, 15))
+
+
+def test_queue_survives_a_crashed_process(tmp_path):
+    script = (
+        'import os, sys\n'
+        'from app.services.offline_queue import OfflineQueue\n'
+        f'queue = OfflineQueue({str(tmp_path)!r}, memory_events=16, segment_bytes=4096)\n'
+        'for i in range(200):\n'
+        '    queue.append({"event_type": "sale", "device_id": "till1", "payload": {"product_id": i, "qty": 1}})\n'
+        'os._exit(1)\n'   # no close(), no cleanup
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, check=False)
+    queue = OfflineQueue(str(tmp_path), memory_events=16, fsync=False)
+    assert queue.stats['recovered'] == 200
+    assert _drain(queue) == list(range(200))
+
+
+def test_torn_tail_record_is_discarded(tmp_path):
+    queue = OfflineQueue(str(tmp_path), fsync=False)
+    for i in range(3):
+        queue.append(_sale(i))
+    queue.close()
+    # Simulate a crash halfway through writing a fourth record: a header whose payload never landed
+    path = os.path.join(str(tmp_path), _segments(tmp_path)[0])
+    with open(path, 'r+b') as fh:
+        data = fh.read()
+        end = data.index(b'}}', data.index(b'"product_id":2')) + 2
+        fh.seek(end)
+        fh.write(RECORD_HEADER.pack(50, 12345, 4))
+    queue = OfflineQueue(str(tmp_path), fsync=False)
+    assert queue.stats['torn_records'] == 1
+    assert queue.append(_sale(3)) == 4
+    assert _drain(queue) == [0, 1, 2, 3]
+
+
+def test_periodic_sync_resumes_after_an_outage(app, tmp_path):
+    client = app.test_client()
+    online = {'up': False}
+
+    def transport(event):
+        if not online['up']:
+            raise ConnectionError('router unreachable')
+        response = client.post('/sync/push', json=event)
+        assert response.status_code == 200
+
+    manager = SyncManager(str(tmp_path / 'queue'), transport, memory_events=4, segment_bytes=1024, fsync=False)
+    keys = [manager.queue_event(_sale(i)) for i in range(20)]
+    assert len(set(keys)) == 20
+    assert manager.perform_periodic_sync() == {'sent': 0, 'rejected': 0, 'remaining': 20,
+                                               'error': 'router unreachable'}
+    online['up'] = True
+    assert manager.perform_periodic_sync()['sent'] == 20
+    products = db.session.execute(db.select(SyncEvent.payload).order_by(SyncEvent.id)).scalars().all()
+    assert [p['product_id'] for p in products] == list(range(20))
+
+
+def test_event_resent_after_a_lost_acknowledgement_is_not_stored_twice(app, tmp_path):
+    client = app.test_client()
+    calls = []
+
+    def flaky(event):
+        client.post('/sync/push', json=event)
+        calls.append(event['idempotency_key'])
+        if len(calls) == 2:
+            raise TimeoutError('response lost')
+
+    manager = SyncManager(str(tmp_path / 'queue'), flaky, fsync=False)
+    for i in range(3):
+        manager.queue_event(_sale(i))
+    assert manager.perform_periodic_sync()['remaining'] == 2
+    assert manager.perform_periodic_sync() == {'sent': 2, 'rejected': 0, 'remaining': 0, 'error': None}
+    assert db.session.execute(db.select(db.func.count()).select_from(SyncEvent)).scalar() == 3
+
+
+def test_rejected_events_are_set_aside(tmp_path):
+    def transport(event):
+        if event['payload']['product_id'] == 1:
+            raise RejectedEvent('invalid payload')
+
+    manager = SyncManager(str(tmp_path), transport, fsync=False)
+    for i in range(3):
+        manager.queue_event(_sale(i))
+    assert manager.perform_periodic_sync() == {'sent': 2, 'rejected': 1, 'remaining': 0, 'error': None}
+    with open(tmp_path / 'rejected.ndjson') as fh:
+        assert '"product_id":1' in fh.read().replace(' ', '')
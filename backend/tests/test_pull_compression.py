@@ -0,0 +1,105 @@
+"""
+Test cases for negotiated compression and the streamed NDJSON variant of /sync/pull.
+"""
+
+import gzip
+import json
+import zlib
+
+import pytest
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.utils.export_helpers import iter_gzip, negotiate_encoding
+from werkzeug.http import parse_accept_header
+
+
+def _seed(count, device_id='till2'):
+    db.session.add_all([SyncEvent(event_type='stock_update', device_id=device_id,
+                                  payload={'product_id': i, 'new_stock': i % 7, 'name': f'Product {i}'})
+                        for i in range(count)])
+    db.session.commit()
+
+
+def test_accept_encoding_negotiation():
+    assert negotiate_encoding(parse_accept_header('gzip, deflate')) == 'gzip'
+    assert negotiate_encoding(parse_accept_header('identity')) is None
+    assert negotiate_encoding(parse_accept_header('')) is None
+
+
+def test_gzip_response_for_large_pull(app, client):
+    _seed(50)
+    plain = client.get('/sync/pull?device_id=till1')
+    compressed = client.get('/sync/pull?device_id=till1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert len(compressed.data) < len(plain.data)
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    # Each representation has its own ETag, and each revalidates on its own
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    again = client.get('/sync/pull?device_id=till1', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_zstd_preferred_when_available(app, client):
+    zstandard = pytest.importorskip('zstandard')
+    _seed(50)
+    response = client.get('/sync/pull?device_id=till1', headers={'Accept-Encoding': 'gzip, zstd'})
+    assert response.headers['Content-Encoding'] == 'zstd'
+    body = zstandard.ZstdDecompressor().decompressobj().decompress(response.data)
+    assert len(json.loads(body)['events']) == 50
+
+
+def test_small_pull_is_not_compressed(app, client):
+    _seed(1)
+    response = client.get('/sync/pull?device_id=till1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_json()['events']) == 1
+
+
+def test_ndjson_streams_one_event_per_line(app, client):
+    app.config['PULL_STREAM_BATCH_SIZE'] = 7
+    _seed(20)
+    _seed(3, device_id='till1')
+    response = client.get('/sync/pull?device_id=till1&format=ndjson')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    events = [json.loads(line) for line in response.data.splitlines()]
+    assert [e['payload']['product_id'] for e in events] == list(range(20))
+    assert all(e['device_id'] == 'till2' for e in events)
+    assert response.headers['ETag']
+
+
+def test_compressed_ndjson_stream_decodes_batch_by_batch(app, client):
+    app.config['PULL_STREAM_BATCH_SIZE'] = 5
+    _seed(12)
+    response = client.get('/sync/pull?device_id=till1&format=ndjson', headers={'Accept-Encoding': 'gzip'},
+                          buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    first = decompressor.decompress(next(response.response))
+    # The first chunk is decodable on its own and carries the whole first batch
+    assert len(first.splitlines()) == 5
+    rest = b''.join(decompressor.decompress(chunk) for chunk in response.response)
+    assert len((first + rest).splitlines()) == 12
+    response.close()
+
+
+def test_ndjson_long_poll_times_out_with_empty_body(client):
+    response = client.get('/sync/pull?device_id=till1&format=ndjson&wait=0.2')
+    assert response.status_code == 200
+    assert response.data == b''
+
+
+def test_unsupported_pull_format_is_rejected(client):
+    assert client.get('/sync/pull?device_id=till1&format=xml').status_code == 400
+
+
+def test_gzip_flush_makes_every_chunk_decodable():
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = iter_gzip([b'a' * 100, b'b' * 100], flush=True)
+    assert decompressor.decompress(next(chunks)) == b'a' * 100
+    assert decompressor.decompress(next(chunks)) == b'b' * 100
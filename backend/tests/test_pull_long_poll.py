@@ -0,0 +1,125 @@
+"""
+Test cases for ETag revalidation and long-polling on /sync/pull.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.event_watermark import SQLiteEventWatermark
+from app.sync.manager import SyncManager
+
+
+def _push(client, device_id, product_id=1):
+    response = client.post('/sync/push', json={'event_type': 'stock_update', 'device_id': device_id,
+                                               'payload': {'product_id': product_id, 'new_stock': 5}})
+    assert response.status_code == 200
+    return response.get_json()['event_id']
+
+
+def _count_queries(app):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def test_matching_etag_returns_304_without_a_query(app, client):
+    _push(client, 'till2')
+    first = client.get('/sync/pull?device_id=till1')
+    assert first.status_code == 200 and first.headers['ETag']
+    statements, stop = _count_queries(app)
+    try:
+        again = client.get('/sync/pull?device_id=till1', headers={'If-None-Match': first.headers['ETag']})
+    finally:
+        stop()
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert statements == []
+    # The ETag also depends on the query parameters
+    other = client.get('/sync/pull?device_id=till3', headers={'If-None-Match': first.headers['ETag']})
+    assert other.status_code == 200
+
+
+def test_etag_changes_on_insert_and_status_change(app, client):
+    etag = client.get('/sync/pull?device_id=till1').headers['ETag']
+    event_id = _push(client, 'till2')
+    response = client.get('/sync/pull?device_id=till1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [e['id'] for e in response.get_json()['events']] == [event_id]
+    SyncManager().periodic_sync()
+    response = client.get('/sync/pull?device_id=till1', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200 and response.get_json()['events'] == []
+
+
+def test_long_poll_returns_when_an_event_for_the_device_arrives(app, client):
+    etag = client.get('/sync/pull?device_id=till1').headers['ETag']
+    result = {}
+
+    def poll():
+        started = time.monotonic()
+        result['response'] = app.test_client().get('/sync/pull?device_id=till1&wait=10',
+                                                   headers={'If-None-Match': etag})
+        result['seconds'] = time.monotonic() - started
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    time.sleep(0.2)
+    _push(client, 'till1')   # the device's own event does not end the wait
+    time.sleep(0.2)
+    assert poller.is_alive()
+    event_id = _push(client, 'till2')
+    poller.join(5)
+    assert not poller.is_alive()
+    assert result['response'].status_code == 200
+    assert [e['id'] for e in result['response'].get_json()['events']] == [event_id]
+    assert result['seconds'] < 5
+    assert app.event_watermark.waiters == 0
+
+
+def test_long_poll_times_out_with_304(client):
+    etag = client.get('/sync/pull?device_id=till1').headers['ETag']
+    started = time.monotonic()
+    response = client.get('/sync/pull?device_id=till1&wait=0.3', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert time.monotonic() - started >= 0.3
+
+
+def test_long_poll_without_etag_returns_empty_list_on_timeout(client):
+    response = client.get('/sync/pull?device_id=till1&wait=0.2')
+    assert response.status_code == 200
+    assert response.get_json() == {'events': []}
+
+
+def test_requests_beyond_the_waiter_limit_do_not_wait(app, client):
+    etag = client.get('/sync/pull?device_id=till1').headers['ETag']
+    app.event_watermark.max_waiters = 0
+    started = time.monotonic()
+    response = client.get('/sync/pull?device_id=till1&wait=5', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert time.monotonic() - started < 1
+
+
+def test_invalid_wait_is_rejected(client):
+    assert client.get('/sync/pull?device_id=till1&wait=soon').status_code == 400
+
+
+def test_rolled_back_changes_do_not_move_the_watermark(app):
+    version = app.event_watermark.version
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1'))
+    db.session.flush()
+    db.session.rollback()
+    assert app.event_watermark.version == version
+
+
+def test_sqlite_watermark_is_shared_between_workers(tmp_path):
+    url = 'sqlite:///' + str(tmp_path / 'bus.db')
+    worker_a, worker_b = SQLiteEventWatermark(url, poll_interval=0.01), SQLiteEventWatermark(url)
+    assert worker_a.epoch == worker_b.epoch
+    version = worker_a.version
+    threading.Timer(0.1, worker_b.bump).start()
+    assert worker_a.wait_for_change(version, 5) == version + 1
+    assert worker_a.wait_for_change(version + 1, 0.05) == version + 1
@@ -0,0 +1,76 @@
+"""
+Test cases for the read-only reporting connections used by status, export and audit queries.
+"""
+
+import time
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.reporting_db import ReportingDatabase
+
+
+def _push(client, device_id='till1'):
+    response = client.post('/sync/push', json={'event_type': 'sale', 'device_id': device_id,
+                                               'payload': {'product_id': 1, 'qty': 1}})
+    assert response.status_code == 200
+    return response.get_json()['event_id']
+
+
+def test_primary_database_uses_wal_and_reporting_connections_are_read_only(app):
+    assert app.reporting_db.mode == 'snapshot'
+    assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+    with app.reporting_db.session() as session:
+        assert session.execute(select(SyncEvent.id)).all() == []
+        with pytest.raises(OperationalError):
+            session.execute(text("DELETE FROM sync_events"))
+
+
+def test_open_report_does_not_block_push(app, client):
+    first = _push(client)
+    with app.reporting_db.session() as session:
+        # A report in the middle of its read transaction holds a snapshot of the database
+        assert session.execute(select(SyncEvent.id)).scalars().all() == [first]
+        started = time.monotonic()
+        second = _push(client)
+        assert time.monotonic() - started < 1
+        assert session.execute(select(SyncEvent.id)).scalars().all() == [first]
+    assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 2
+    assert second > first
+
+
+def test_replica_mode_reads_a_periodically_refreshed_copy(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'primary.db'),
+        'REPORTING_DB_MODE': 'replica',
+        'REPORTING_REPLICA_MAX_AGE': 3600,
+    })
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        _push(client)
+        assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 1
+        assert (tmp_path / 'primary.db.replica').exists()
+        _push(client)
+        # Still within REPORTING_REPLICA_MAX_AGE: the copy lags the primary
+        assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 1
+        app.reporting_db.refresh()
+        assert client.get('/sync/status?device_id=till1').get_json()['summary']['total'] == 2
+        assert len(client.get('/sync/export/events').data.splitlines()) == 2
+        assert app.reporting_db.refreshes == 2
+        db.session.remove()
+
+
+def test_in_memory_database_falls_back_to_the_primary_session():
+    reporting = ReportingDatabase('sqlite://', 'snapshot')
+    assert reporting.mode == 'primary' and not reporting.isolated
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ReportingDatabase('sqlite:////tmp/x.db', 'mirror')
@@ -0,0 +1,52 @@
+"""
+Test cases for the per-request SQL profiling mode.
+"""
+
+import logging
+
+import pytest
+
+from app.extensions import socketio
+
+
+@pytest.fixture
+def profiled_app(make_app):
+    return make_app(SQL_PROFILING=True, SQL_REPEAT_THRESHOLD=3)
+
+
+def _parse(header):
+    return dict(part.split('=') for part in header.split('; '))
+
+
+def test_profile_header_counts_queries(profiled_app):
+    client = profiled_app.test_client()
+    summary = _parse(client.get('/sync/status?device_id=till1').headers['X-SQL-Profile'])
+    # One history query plus one grouped count query
+    assert summary['queries'] == '2'
+    assert float(summary['total_ms']) >= 0
+
+
+def test_profiling_disabled_by_default(client):
+    assert 'X-SQL-Profile' not in client.get('/sync/status?device_id=till1').headers
+
+
+def test_socket_handler_repeated_statements_are_flagged(profiled_app, caplog):
+    events = [{'event_type': 'sale', 'payload': {}, 'device_id': 'till1', 'idempotency_key': f'k{i}'} for i in range(4)]
+    till = socketio.test_client(profiled_app)
+    till.emit('flush_begin', {'device_id': 'till1'})
+    till.emit('flush_batch', {'batch_id': 1, 'events': events})
+    with caplog.at_level(logging.INFO, logger='app.sql_profiler'):
+        # Every key is now in the Bloom filter, so each retried event costs one index probe
+        till.emit('flush_batch', {'batch_id': 2, 'events': events})
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(m.startswith('Possible N+1 in socket:flush_batch: statement executed 4 times') for m in messages)
+    assert any(m.startswith('SQL profile socket:flush_batch: queries=') for m in messages)
+    till.disconnect()
+
+
+def test_slow_queries_are_logged_with_parameters(profiled_app, caplog):
+    profiled_app.config['SQL_SLOW_QUERY_MS'] = 0
+    client = profiled_app.test_client()
+    with caplog.at_level(logging.WARNING, logger='app.sql_profiler'):
+        client.get('/sync/pull?device_id=till9')
+    assert any('Slow query in GET /sync/pull' in r.getMessage() and 'till9' in r.getMessage() for r in caplog.records)
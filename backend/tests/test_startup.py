@@ -0,0 +1,98 @@
+"""
+Test cases for cold start profiling, deferred startup tasks and lazily loaded extensions.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from app import create_app, db
+from app.models.sync_event import SyncEvent
+from app.utils.startup import StartupProfiler, run_startup_tasks, run_when_listening, startup
+
+
+def test_profiler_records_phases_and_first_milestone_only():
+    profiler = StartupProfiler(origin=time.perf_counter())
+    with profiler.phase('config'):
+        pass
+    profiler.mark('first_heartbeat')
+    first = profiler.milestones['first_heartbeat']
+    time.sleep(0.01)
+    profiler.mark('first_heartbeat')
+    report = profiler.report()
+    assert report['milestones'] == {'first_heartbeat': first}
+    assert report['phases'][0]['name'] == 'config' and report['phases'][0]['seconds'] >= 0
+
+
+def test_process_start_origin_includes_time_before_import():
+    # The global profiler's clock starts with the process, so the app was imported at a positive offset
+    assert startup.milestones['app_imported'] > 0
+    assert startup.elapsed() > startup.milestones['app_imported']
+
+
+def test_index_rebuild_is_deferred_until_startup_tasks_run(app):
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1', idempotency_key='k1'))
+    db.session.commit()
+    assert not app.idempotency_index.built
+    run_startup_tasks(app)
+    assert app.idempotency_index.built
+    assert 'k1' in app.idempotency_index.bloom
+    assert any(p['name'] == 'deferred:idempotency_rebuild' for p in startup.phases)
+
+
+def test_eager_startup_runs_tasks_in_create_app(app):
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1', idempotency_key='k1'))
+    db.session.commit()
+    eager = create_app({'TESTING': True, 'DEFER_STARTUP_TASKS': False,
+                        'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI']})
+    assert eager.idempotency_index.built
+    assert 'k1' in eager.idempotency_index.bloom
+
+
+def test_run_when_listening_waits_for_the_port(app):
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    try:
+        run_when_listening(app, '0.0.0.0', server.getsockname()[1], timeout=5)
+    finally:
+        server.close()
+    assert 'listening' in startup.milestones
+    assert app.idempotency_index.built
+
+
+def test_first_request_starts_deferred_tasks_once(app, client):
+    def rebuilds():
+        return sum(phase['name'] == 'deferred:idempotency_rebuild' for phase in startup.phases)
+
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till1', idempotency_key='k1'))
+    db.session.commit()
+    before = rebuilds()
+    client.get('/metrics')
+    deadline = time.monotonic() + 5
+    while rebuilds() == before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert app.idempotency_index.built and 'k1' in app.idempotency_index.bloom
+    # Already claimed: neither a later request nor run_when_listening runs them again
+    client.get('/metrics')
+    run_startup_tasks(app)
+    time.sleep(0.05)
+    assert rebuilds() == before + 1
+
+
+def test_startup_gauges_are_exported(client):
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'sync_startup_phase_seconds{phase="services"}' in text
+    assert 'sync_startup_milestone_seconds{milestone="app_imported"}' in text
+
+
+def test_alembic_is_not_imported_until_db_command_is_used(app):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = 'import sys; from app import create_app; create_app(); print("alembic" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', script], cwd=backend_dir, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
+    result = app.test_cli_runner().invoke(args=['db', '--help'])
+    assert result.exit_code == 0
+    assert 'upgrade' in result.output
@@ -0,0 +1,91 @@
+"""
+Test cases for the /sync/status response cache and its write-driven invalidation.
+"""
+
+import datetime
+
+from app.extensions import db
+from app.models.sync_event import SyncEvent
+from app.services.status_cache import ALL, StatusCache
+from app.sync.manager import SyncManager
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _push(client, device_id, user_id=None):
+    response = client.post('/sync/push', json={'event_type': 'sale', 'device_id': device_id, 'user_id': user_id,
+                                               'payload': {'product_id': 1, 'qty': 1}})
+    assert response.status_code == 200
+
+
+def _status(client, query):
+    response = client.get(f'/sync/status?{query}')
+    assert response.status_code == 200
+    return response.headers['X-Cache'], response.get_json()['summary']
+
+
+def test_repeated_status_queries_are_served_from_the_cache(app, client):
+    _push(client, 'till1')
+    assert _status(client, 'device_id=till1') == ('miss', {'total': 1, 'pending': 1, 'synced': 0, 'failed': 0})
+    assert _status(client, 'device_id=till1')[0] == 'hit'
+    assert _status(client, 'device_id=till1&limit=5')[0] == 'miss'   # limit is part of the key
+    stats = client.get('/sync/cache/stats').get_json()['status_cache']
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['entries'] == 2
+    assert stats['hit_rate'] == 0.3333
+    assert 'sync_status_cache_hit_ratio 0.3333' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_a_push_invalidates_only_its_device_and_user(app, client):
+    _push(client, 'till1', 'alice')
+    _push(client, 'till2', 'bob')
+    for query in ('device_id=till1', 'device_id=till2', 'user_id=alice', 'user_id=bob'):
+        _status(client, query)
+    _push(client, 'till3', 'alice')
+    assert _status(client, 'device_id=till1')[0] == 'hit'
+    assert _status(client, 'device_id=till2')[0] == 'hit'
+    assert _status(client, 'user_id=bob')[0] == 'hit'
+    assert _status(client, 'user_id=alice') == ('miss', {'total': 2, 'pending': 2, 'synced': 0, 'failed': 0})
+
+
+def test_status_changes_from_a_bulk_update_invalidate_their_devices(app, client):
+    _push(client, 'till1')
+    db.session.add(SyncEvent(event_type='sale', payload={}, device_id='till2', status='synced',
+                             timestamp=datetime.datetime(2024, 1, 1)))
+    db.session.commit()
+    _status(client, 'device_id=till1')
+    _status(client, 'device_id=till2')
+    SyncManager().periodic_sync()   # one UPDATE ... WHERE id IN (...) for till1's event
+    assert _status(client, 'device_id=till1') == ('miss', {'total': 1, 'pending': 0, 'synced': 1, 'failed': 0})
+    assert _status(client, 'device_id=till2')[0] == 'hit'
+
+
+def test_a_result_read_before_a_write_is_not_stored():
+    cache = StatusCache()
+    token = cache.begin()
+    cache.invalidate({('device', 'till1')})   # a commit lands while the response is being computed
+    cache.put(('till1', None, 20), b'old', token)
+    assert cache.get(('till1', None, 20)) is None
+    cache.put(('till2', None, 20), b'fine', token)   # other tags were not written
+    assert cache.get(('till2', None, 20)) == b'fine'
+    assert cache.stats['discarded_fills'] == 1
+
+
+def test_entries_expire_and_the_least_recently_used_are_evicted():
+    clock = _Clock()
+    cache = StatusCache(max_entries=2, ttl=10, clock=clock)
+    for device_id in ('a', 'b'):
+        cache.put((device_id, None, 20), device_id.encode(), cache.begin())
+    cache.get(('a', None, 20))
+    cache.put(('c', None, 20), b'c', cache.begin())
+    assert cache.get(('b', None, 20)) is None and cache.stats['evictions'] == 1
+    clock.now = 11
+    assert cache.get(('a', None, 20)) is None
+    cache.put(('d', None, 20), b'd', cache.begin())
+    cache.invalidate({ALL})
+    assert len(cache) == 0